@@ -0,0 +1,74 @@
+import hashlib
+import os
+import shutil
+import threading
+from itertools import count, islice
+
+# Crash-safe output files. Lines are streamed from a generator into a temporary file
+# next to the target, which is renamed over the target only once it is complete, so
+# the target always holds either the old or the new content, never a truncated mix.
+# When the new content hashes the same as the existing file, the temporary file is
+# dropped and the target keeps its modification time.
+
+WRITE_BATCH_LINES = 4096 # Lines joined and encoded per write
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_temp_counter = count()
+_temp_counter_lock = threading.Lock()
+
+
+def file_digest(path):
+    # BLAKE2b digest of a file's bytes, or None when it does not exist
+    digest = hashlib.blake2b()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.digest()
+
+
+def _temp_path(path):
+    # Same folder, so the final rename never crosses file systems
+    directory, name = os.path.split(os.path.abspath(path))
+    with _temp_counter_lock:
+        number = next(_temp_counter)
+    return os.path.join(directory, f".{name}.{os.getpid()}.{number}.tmp")
+
+
+def write_lines_atomically(path, lines, skip_unchanged=True):
+    # Writes the str lines (with their line endings) to path as UTF-8, translating "\n"
+    # like a text-mode file. Returns (written, num_bytes): written is False when
+    # skip_unchanged found path already holding exactly these bytes.
+    temp_path = _temp_path(path)
+    digest = hashlib.blake2b() if skip_unchanged else None
+    num_bytes = 0
+    try:
+        with open(temp_path, 'xb') as f: # Created with the usual permissions, unlike mkstemp()
+            lines = iter(lines)
+            while True:
+                text = "".join(islice(lines, WRITE_BATCH_LINES))
+                if not text:
+                    break
+                if os.linesep != "\n":
+                    text = text.replace("\n", os.linesep)
+                chunk = text.encode('utf-8')
+                if digest is not None:
+                    digest.update(chunk)
+                f.write(chunk)
+                num_bytes += len(chunk)
+            f.flush()
+            os.fsync(f.fileno()) # On disk before it can replace the old file
+        if skip_unchanged and os.path.isfile(path) and os.path.getsize(path) == num_bytes \
+                and file_digest(path) == digest.digest():
+            os.remove(temp_path)
+            return False, num_bytes
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True, num_bytes
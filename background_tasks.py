@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+from collections import deque
+
+from comparer_engine import OperationCancelled
+
+# Runs GUI actions on a worker thread. Jobs are executed one at a time in the order
+# they were submitted; everything that touches Tk widgets (progress, results, errors)
+# is handed back through a queue that the Tk main loop polls with after().
+
+POLL_INTERVAL_MS = 50
+PROGRESS_MIN_INTERVAL_SECONDS = 0.05 # Progress updates sent more often than this are dropped
+
+
+class _Job:
+    def __init__(self, description, work, on_done, on_error):
+        self.description = description
+        self.work = work
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancel_event = threading.Event()
+        self.last_progress_time = 0.0
+
+
+class BackgroundTaskRunner:
+    def __init__(self, master, on_progress, on_state_change):
+        # on_progress(description, label, done, total) and on_state_change(running_description, num_queued)
+        # are called on the Tk main thread.
+        self.master = master
+        self.on_progress = on_progress
+        self.on_state_change = on_state_change
+        self._jobs = queue.Queue()
+        self._events = queue.Queue()
+        self._current_job = None
+        self._unfinished_jobs = deque() # Submitted and not yet done, the running one first
+        self._num_queued = 0
+        self._worker = threading.Thread(target=self._worker_loop, name="comparer-worker", daemon=True)
+        self._worker.start()
+        self.master.after(POLL_INTERVAL_MS, self._poll_events)
+
+    def submit(self, description, work, on_done, on_error):
+        # work(progress) runs on the worker thread and returns the result passed to
+        # on_done(result); on_error(description, exception) gets failures and cancellations.
+        job = _Job(description, work, on_done, on_error)
+        self._num_queued += 1
+        self._unfinished_jobs.append(job)
+        self._jobs.put(job)
+        self._notify_state()
+
+    def cancel_current(self):
+        # The running job, or the next one when the worker has not reported it started
+        # yet; the worker checks the flag before starting a job
+        if self._unfinished_jobs:
+            self._unfinished_jobs[0].cancel_event.set()
+
+    def is_busy(self):
+        return self._current_job is not None or self._num_queued > 0
+
+    def _worker_loop(self):
+        while True:
+            job = self._jobs.get()
+            self._events.put(("started", job, None))
+            try:
+                if job.cancel_event.is_set():
+                    raise OperationCancelled(job.description)
+                result = job.work(lambda label, done, total: self._report_progress(job, label, done, total))
+            except BaseException as e:
+                self._events.put(("error", job, e))
+            else:
+                self._events.put(("done", job, result))
+
+    def _report_progress(self, job, label, done, total):
+        # Called from the worker thread by the engine; this is also where cancellation lands
+        if job.cancel_event.is_set():
+            raise OperationCancelled(job.description)
+        now = time.monotonic()
+        if now - job.last_progress_time < PROGRESS_MIN_INTERVAL_SECONDS and (total is None or done < total):
+            return
+        job.last_progress_time = now
+        self._events.put(("progress", job, (label, done, total)))
+
+    def _poll_events(self):
+        try:
+            while True:
+                kind, job, payload = self._events.get_nowait()
+                if kind == "started":
+                    self._num_queued -= 1
+                    self._current_job = job
+                    self._notify_state()
+                elif kind == "progress":
+                    if job is self._current_job and not job.cancel_event.is_set():
+                        self.on_progress(job.description, *payload)
+                else:
+                    self._current_job = None
+                    self._unfinished_jobs.popleft()
+                    self._notify_state()
+                    if kind == "done":
+                        job.on_done(payload)
+                    else:
+                        job.on_error(job.description, payload)
+        except queue.Empty:
+            pass
+        self.master.after(POLL_INTERVAL_MS, self._poll_events)
+
+    def _notify_state(self):
+        running_description = self._current_job.description if self._current_job is not None else None
+        self.on_state_change(running_description, self._num_queued)
@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import comparer_engine as engine
+import report_writers
+import run_stats
+from tagging_log import LOG_LEVEL_BY_NAME, LOG_LEVEL_NAMES, LOG_OFF, TaggingLog
+
+# Command-line batch mode: walks a directory tree, finds every folder holding a
+# bilingual/English pair and runs the three operations on each pair in a process pool.
+
+EXIT_OK = 0
+EXIT_ISSUES_FOUND = 1 # Differences, unmatched paragraphs or broken line pairs in at least one pair
+EXIT_ERRORS = 2 # At least one pair could not be processed
+
+# Machine-readable reports are written next to the pair's files under these names
+# plus the format's extension (see report_writers.py)
+WORD_REPORT_NAME = "word_differences"
+PUNCTUATION_REPORT_NAME = "punctuation_differences"
+TAGGING_REPORT_NAME = "paragraph_tagging"
+TAGGING_LOG_NAME = "tagging_log.txt.gz"
+
+
+def find_pairs(root_dir, bilingual_name=engine.BILINGUAL_DEFAULT_NAME, english_name=engine.ENGLISH_DEFAULT_NAME):
+    pairs = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        if bilingual_name in filenames and english_name in filenames:
+            pairs.append((os.path.join(dirpath, bilingual_name), os.path.join(dirpath, english_name)))
+    return pairs
+
+
+def process_pair(bilingual_path, english_path, run_words=True, run_punctuation=True, run_tagging=True,
+                 word_diff_mode=engine.WORD_DIFF_ALIGN, punctuation_class=engine.PUNCTUATION_ASCII,
+                 collect_stats=False, report_format=None, profile_path=None, align_jobs=1,
+                 match_mode=engine.MATCH_EXACT, fuzzy_tolerance=engine.FUZZY_TOLERANCE, log_level=LOG_OFF):
+    # With collect_stats, summary["stats"] holds the per-stage timings and counters of
+    # each operation; with report_format, every difference and tagging step is streamed
+    # to a report file in the pair's folder; with profile_path, the whole pair is run
+    # under cProfile. align_jobs > 1 aligns the words of this pair in that many processes.
+    # match_mode and fuzzy_tolerance select how reference paragraphs are matched for tagging;
+    # with a log_level the tagging log is written, compressed, to the pair's folder.
+    if profile_path is not None:
+        return run_stats.profile_call(profile_path, process_pair, bilingual_path, english_path, run_words, run_punctuation,
+                                      run_tagging, word_diff_mode, punctuation_class, collect_stats, report_format,
+                                      align_jobs=align_jobs, match_mode=match_mode, fuzzy_tolerance=fuzzy_tolerance,
+                                      log_level=log_level)
+    new_stats = (lambda operation: engine.RunStats(operation)) if collect_stats else (lambda operation: None)
+    folder = os.path.dirname(bilingual_path)
+    open_report = lambda report_name: _open_pair_report(folder, report_name, report_format)
+    operation_stats = []
+    summary = {
+        "folder": folder,
+        "word_differences": None,
+        "punctuation_differences": None,
+        "tags_added": None,
+        "unmatched_paragraphs": None,
+        "pairing_issues": None,
+        "tagged_output": None,
+        "tagged_output_unchanged": None,
+        "error": None,
+    }
+    try:
+        if run_words:
+            stats = new_stats("Compare English Words")
+            with open_report(WORD_REPORT_NAME) as record_writer:
+                word_result = engine.run_word_comparison(bilingual_path, english_path, mode=word_diff_mode, stats=stats,
+                                                         record_writer=record_writer, align_jobs=align_jobs)
+            operation_stats.append(stats)
+            summary["word_differences"] = word_result["num_differences"]
+            if word_result["bilingual_word_count"] != word_result["english_word_count"] and not word_result["num_differences"]:
+                # One side is empty; the index comparison is skipped for that case
+                summary["word_differences"] = abs(word_result["bilingual_word_count"] - word_result["english_word_count"])
+        if run_punctuation:
+            stats = new_stats("Compare Punctuation")
+            with open_report(PUNCTUATION_REPORT_NAME) as record_writer:
+                punctuation_result = engine.run_punctuation_comparison(bilingual_path, english_path, punctuation_class=punctuation_class,
+                                                                       stats=stats, record_writer=record_writer)
+            operation_stats.append(stats)
+            summary["punctuation_differences"] = punctuation_result["num_differences"]
+        if run_tagging:
+            stats = new_stats("Tag Paragraphs")
+            # Only the counts are printed, so nothing of the log is kept in memory
+            spill_path = os.path.join(folder, TAGGING_LOG_NAME) if log_level != LOG_OFF else None
+            with open_report(TAGGING_REPORT_NAME) as record_writer, TaggingLog(log_level, 0, spill_path) as log:
+                tagging_result = engine.plan_paragraph_tagging(bilingual_path, english_path, stats=stats,
+                                                               record_writer=record_writer, match_mode=match_mode,
+                                                               fuzzy_tolerance=fuzzy_tolerance, log=log)
+            summary["tagged_output_unchanged"] = not engine.write_tagged_file(tagging_result, stats)
+            operation_stats.append(stats)
+            summary["tags_added"] = tagging_result["num_tags_added"]
+            summary["unmatched_paragraphs"] = tagging_result["num_unmatched_ref_paras"]
+            summary["pairing_issues"] = tagging_result["pairing"].num_issues()
+            summary["tagged_output"] = tagging_result["output_filepath"]
+    except Exception as e:
+        summary["error"] = str(e)
+    if collect_stats:
+        summary["stats"] = [stats.as_dict() for stats in operation_stats]
+    return summary
+
+
+def _open_pair_report(folder, report_name, report_format):
+    if report_format is None:
+        return nullcontext(None)
+    report_path = os.path.join(folder, report_name + report_writers.REPORT_EXTENSIONS[report_format])
+    return report_writers.open_report_writer(report_path, report_format)
+
+
+def pair_has_issues(summary):
+    return any(summary[key] for key in ("word_differences", "punctuation_differences", "unmatched_paragraphs", "pairing_issues"))
+
+
+def format_pair_summary(summary):
+    if summary["error"] is not None:
+        return f"ERROR  {summary['folder']}: {summary['error']}"
+
+    status = "DIFF " if pair_has_issues(summary) else "OK   "
+    parts = []
+    if summary["word_differences"] is not None:
+        parts.append(f"word differences: {summary['word_differences']}")
+    if summary["punctuation_differences"] is not None:
+        parts.append(f"punctuation differences: {summary['punctuation_differences']}")
+    if summary["tags_added"] is not None:
+        parts.append(f"tags added: {summary['tags_added']}{' (tagged file unchanged)' if summary['tagged_output_unchanged'] else ''}")
+        parts.append(f"unmatched paragraphs: {summary['unmatched_paragraphs']}")
+        if summary["pairing_issues"]:
+            parts.append(f"line pairing issues: {summary['pairing_issues']}")
+    return f"{status}{summary['folder']}: " + ", ".join(parts)
+
+
+def combined_exit_status(summaries):
+    if any(summary["error"] is not None for summary in summaries):
+        return EXIT_ERRORS
+    if any(pair_has_issues(summary) for summary in summaries):
+        return EXIT_ISSUES_FOUND
+    return EXIT_OK
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Compare every bilingual/English text pair found under a directory tree."
+    )
+    parser.add_argument("root", help="Directory to search for text pairs")
+    parser.add_argument("--bilingual-name", default=engine.BILINGUAL_DEFAULT_NAME,
+                        help=f"File name of the bilingual text in each folder (default: {engine.BILINGUAL_DEFAULT_NAME})")
+    parser.add_argument("--english-name", default=engine.ENGLISH_DEFAULT_NAME,
+                        help=f"File name of the English reference text in each folder (default: {engine.ENGLISH_DEFAULT_NAME})")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: all cores)")
+    parser.add_argument("--align-jobs", type=int, default=1,
+                        help="Worker processes aligning the words of each pair, for very large texts (default: 1)")
+    parser.add_argument("--word-diff", choices=engine.WORD_DIFF_MODES, default=engine.WORD_DIFF_ALIGN,
+                        help="Word comparison mode: 'align' reports real insertions/deletions/substitutions, "
+                             "'index' compares word i with word i (default: align)")
+    parser.add_argument("--punctuation-class", choices=engine.PUNCTUATION_CLASSES, default=engine.PUNCTUATION_ASCII,
+                        help="Characters treated as punctuation: 'ascii', 'unicode' (all Unicode punctuation) "
+                             "or 'cjk' (ASCII plus curly quotes, dashes and full-width marks) (default: ascii)")
+    parser.add_argument("--match", choices=engine.MATCH_MODES, default=engine.MATCH_EXACT,
+                        help="Paragraph matching for tagging: 'exact' needs the same word count and last word, "
+                             "'fuzzy' also accepts blocks whose words differ from the paragraph by at most the "
+                             "fuzzy tolerance (default: exact)")
+    parser.add_argument("--fuzzy-tolerance", type=float, default=engine.FUZZY_TOLERANCE,
+                        help=f"Share of a paragraph's words that may differ in fuzzy matching (default: {engine.FUZZY_TOLERANCE})")
+    parser.add_argument("--tagging-log", choices=tuple(LOG_LEVEL_NAMES.values()),
+                        help=f"Write the tagging log at this level of detail to {TAGGING_LOG_NAME} in each pair's folder: "
+                             "'summary', 'paragraph' (one outcome per reference paragraph) or 'candidate' (also every "
+                             "block turned down)")
+    parser.add_argument("--no-words", action="store_true", help="Skip the word comparison")
+    parser.add_argument("--no-punctuation", action="store_true", help="Skip the punctuation comparison")
+    parser.add_argument("--no-tagging", action="store_true", help="Skip paragraph tagging (no tagged files are written)")
+    parser.add_argument("--report-format", choices=report_writers.REPORT_FORMATS,
+                        help="Also stream every difference and tagging step to machine-readable reports in each pair's "
+                             f"folder ({WORD_REPORT_NAME}, {PUNCTUATION_REPORT_NAME}, {TAGGING_REPORT_NAME}): "
+                             "JSON Lines or a compact indexed binary format")
+    parser.add_argument("--stats-json", metavar="FILE",
+                        help="Write per-stage timings and counters of every operation of every pair to FILE as JSON")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Run the first pair under cProfile and save the profile to FILE (view with pstats or snakeviz)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        print(f"Not a directory: {args.root}", file=sys.stderr)
+        return EXIT_ERRORS
+
+    pairs = find_pairs(args.root, args.bilingual_name, args.english_name)
+    if not pairs:
+        print(f"No {args.bilingual_name}/{args.english_name} pairs found under {args.root}")
+        return EXIT_OK
+
+    run_options = (not args.no_words, not args.no_punctuation, not args.no_tagging, args.word_diff, args.punctuation_class,
+                   args.stats_json is not None, args.report_format)
+    summaries = []
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs or 1)) as executor:
+        futures = [executor.submit(process_pair, bilingual_path, english_path, *run_options,
+                                   profile_path=args.profile if pair_idx == 0 else None, align_jobs=args.align_jobs,
+                                   match_mode=args.match, fuzzy_tolerance=args.fuzzy_tolerance,
+                                   log_level=LOG_LEVEL_BY_NAME.get(args.tagging_log, LOG_OFF))
+                   for pair_idx, (bilingual_path, english_path) in enumerate(pairs)]
+        # Report in directory order so runs are easy to diff against each other
+        for future in futures:
+            summary = future.result()
+            summaries.append(summary)
+            print(format_pair_summary(summary), flush=True)
+
+    num_errors = sum(1 for summary in summaries if summary["error"] is not None)
+    num_with_issues = sum(1 for summary in summaries if summary["error"] is None and pair_has_issues(summary))
+    print(f"\nProcessed {len(summaries)} pairs: {len(summaries) - num_errors - num_with_issues} clean, "
+          f"{num_with_issues} with differences, {num_errors} failed.")
+    if args.stats_json:
+        with open(args.stats_json, 'w', encoding='utf-8') as f:
+            json.dump([{"folder": summary["folder"], "operations": summary["stats"]} for summary in summaries], f, indent=2)
+        print(f"Stage timings written to {args.stats_json}")
+    if args.profile:
+        print(f"Profile of {summaries[0]['folder']} written to {args.profile}")
+    return combined_exit_status(summaries)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
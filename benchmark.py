@@ -0,0 +1,208 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import benchmark_corpus
+import comparer_engine as engine
+
+try:
+    import resource # Unix only; peak memory is reported as None elsewhere
+except ImportError:
+    resource = None
+
+# Benchmark suite: generates synthetic corpora of increasing size (benchmark_corpus.py)
+# and times each operation on them separately. Every run happens in a fresh process so
+# its peak resident memory is its own. Results go to a JSON file; passing an earlier
+# file as --baseline reports operations that got slower.
+
+RESULTS_FORMAT_VERSION = 1
+DEFAULT_SIZES = ("10KB", "100KB", "1MB", "10MB")
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_TOLERANCE = 0.25 # Slowdown (fraction) allowed before a result counts as a regression
+EXIT_OK = 0
+EXIT_REGRESSIONS = 1
+
+OP_WORDS_ALIGN = "words_align"
+OP_WORDS_ALIGN_PARALLEL = "words_align_parallel" # Alignment with one worker process per core
+OP_WORDS_INDEX = "words_index"
+OP_PUNCTUATION = "punctuation"
+OP_TAGGING = "tagging" # Reading and matching; writing the tagged file is timed as write_seconds
+OPERATIONS = (OP_WORDS_ALIGN, OP_WORDS_ALIGN_PARALLEL, OP_WORDS_INDEX, OP_PUNCTUATION, OP_TAGGING)
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Linux reports KiB
+
+
+def _run_operation(operation, bilingual_path, english_path):
+    if operation in (OP_WORDS_ALIGN, OP_WORDS_ALIGN_PARALLEL, OP_WORDS_INDEX):
+        mode = engine.WORD_DIFF_INDEX if operation == OP_WORDS_INDEX else engine.WORD_DIFF_ALIGN
+        align_jobs = (os.cpu_count() or 1) if operation == OP_WORDS_ALIGN_PARALLEL else 1
+        result = engine.run_word_comparison(bilingual_path, english_path, mode=mode, align_jobs=align_jobs)
+        return {
+            "bilingual_words": result["bilingual_word_count"],
+            "english_words": result["english_word_count"],
+            "differences": len(result["differences"]),
+        }
+    if operation == OP_PUNCTUATION:
+        result = engine.run_punctuation_comparison(bilingual_path, english_path)
+        return {
+            "bilingual_marks": result["bilingual_punctuation_count"],
+            "english_marks": result["english_punctuation_count"],
+            "differences": len(result["differences"]),
+        }
+    if operation == OP_TAGGING:
+        result = engine.plan_paragraph_tagging(bilingual_path, english_path)
+        write_start = time.perf_counter()
+        written = engine.write_tagged_file(result)
+        return {
+            "tags_added": result["num_tags_added"],
+            "reference_paragraphs": result["num_ref_paragraphs"],
+            "unmatched_paragraphs": result["num_unmatched_ref_paras"],
+            "write_seconds": time.perf_counter() - write_start,
+            "write_skipped": not written, # The tagged file from an earlier run was identical
+        }
+    raise ValueError(f"Unknown operation: {operation!r}")
+
+
+def measure_operation(operation, bilingual_path, english_path):
+    # Runs in a child process. For tagging the timed part excludes the write, which
+    # is reported in the counters instead.
+    start = time.perf_counter()
+    counters = _run_operation(operation, bilingual_path, english_path)
+    seconds = time.perf_counter() - start - counters.get("write_seconds", 0.0)
+    return {"seconds": seconds, "peak_rss_bytes": _peak_rss_bytes(), "counters": counters}
+
+
+def run_benchmarks(sizes, operations, corpus_dir, seed=benchmark_corpus.DEFAULT_SEED, error_rates=None, repeat=1,
+                   log=print):
+    spawn_context = multiprocessing.get_context("spawn") # A fresh interpreter per run keeps peak memory separate
+    results = []
+    for size_label in sizes:
+        target_bytes = benchmark_corpus.parse_size(size_label)
+        folder = os.path.join(corpus_dir, f"{benchmark_corpus.format_size(target_bytes)}-seed{seed}")
+        log(f"Corpus {size_label}: preparing {folder}")
+        manifest = benchmark_corpus.ensure_corpus(folder, target_bytes, seed, error_rates)
+        bilingual_path = os.path.join(folder, engine.BILINGUAL_DEFAULT_NAME)
+        english_path = os.path.join(folder, engine.ENGLISH_DEFAULT_NAME)
+
+        for operation in operations:
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn_context) as executor:
+                    runs.append(executor.submit(measure_operation, operation, bilingual_path, english_path).result())
+            best_run = min(runs, key=lambda run: run["seconds"])
+            peaks = [run["peak_rss_bytes"] for run in runs if run["peak_rss_bytes"] is not None]
+            result = {
+                "size": size_label,
+                "operation": operation,
+                "bilingual_bytes": manifest["bilingual_bytes"],
+                "english_bytes": manifest["english_bytes"],
+                "seconds": best_run["seconds"],
+                "all_seconds": [run["seconds"] for run in runs],
+                "megabytes_per_second": (manifest["bilingual_bytes"] / (1024 * 1024)) / best_run["seconds"] if best_run["seconds"] else None,
+                "peak_rss_bytes": max(peaks) if peaks else None,
+                "counters": best_run["counters"],
+            }
+            results.append(result)
+            log(format_result(result))
+    return results
+
+
+def format_result(result):
+    line = f"  {result['size']:>6} {result['operation']:<12} {result['seconds']:9.3f} s"
+    if result["megabytes_per_second"] is not None:
+        line += f" {result['megabytes_per_second']:8.2f} MB/s"
+    if result["peak_rss_bytes"] is not None:
+        line += f"  peak {result['peak_rss_bytes'] / (1024 * 1024):8.1f} MB"
+    return line
+
+
+def build_report(results, seed, error_rates, repeat):
+    return {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "error_rates": error_rates,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def find_regressions(report, baseline_report, tolerance=DEFAULT_TOLERANCE):
+    # Returns (size, operation, baseline_seconds, seconds) for every result that is
+    # more than tolerance slower than the same size and operation in the baseline
+    baseline_seconds = {(result["size"], result["operation"]): result["seconds"] for result in baseline_report["results"]}
+    regressions = []
+    for result in report["results"]:
+        previous = baseline_seconds.get((result["size"], result["operation"]))
+        if previous is not None and result["seconds"] > previous * (1 + tolerance):
+            regressions.append((result["size"], result["operation"], previous, result["seconds"]))
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark word comparison, punctuation comparison and paragraph "
+                                                 "tagging on synthetic corpora.")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help=f"Comma-separated bilingual file sizes, 10KB up to 1GB (default: {','.join(DEFAULT_SIZES)})")
+    parser.add_argument("--operations", default=",".join(OPERATIONS),
+                        help=f"Comma-separated operations to time (default: {','.join(OPERATIONS)})")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "english_words_comparer_corpora"),
+                        help="Where generated corpora are kept and reused between runs")
+    parser.add_argument("--seed", type=int, default=benchmark_corpus.DEFAULT_SEED, help="Corpus random seed")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per operation; the fastest is reported")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"Results JSON file (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--baseline", help="Earlier results JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed slowdown against the baseline, as a fraction (default: {DEFAULT_TOLERANCE})")
+    benchmark_corpus.add_error_rate_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    operations = [operation.strip() for operation in args.operations.split(",") if operation.strip()]
+    unknown_operations = [operation for operation in operations if operation not in OPERATIONS]
+    if unknown_operations:
+        parser.error(f"unknown operations: {', '.join(unknown_operations)} (choose from {', '.join(OPERATIONS)})")
+    for size in sizes:
+        try:
+            benchmark_corpus.parse_size(size)
+        except ValueError:
+            parser.error(f"invalid size: {size}")
+    error_rates = benchmark_corpus.error_rates_from_args(args)
+
+    results = run_benchmarks(sizes, operations, args.corpus_dir, args.seed, error_rates, max(1, args.repeat))
+    report = build_report(results, args.seed, error_rates, max(1, args.repeat))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline_report = json.load(f)
+        regressions = find_regressions(report, baseline_report, args.tolerance)
+        for size, operation, previous, seconds in regressions:
+            print(f"REGRESSION {size} {operation}: {previous:.3f} s -> {seconds:.3f} s")
+        if regressions:
+            return EXIT_REGRESSIONS
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
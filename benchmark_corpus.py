@@ -0,0 +1,276 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+
+import comparer_engine as engine
+
+# Deterministic synthetic corpora for benchmarking. Writes a bilingual file (English
+# line, Chinese line, optional blank line) and the English reference it was derived
+# from, then injects errors into the bilingual side at controlled rates. The same
+# size, seed and rates always produce byte-identical files.
+
+DEFAULT_SEED = 1
+VOCABULARY_SIZE = 5000
+
+# Probabilities of each injected error
+ERROR_SUBSTITUTION = "substitution" # Per word: replaced by another word
+ERROR_INSERTION = "insertion" # Per word: an extra word is inserted after it
+ERROR_PUNCTUATION_SWAP = "punctuation_swap" # Per punctuation mark: replaced by another mark
+ERROR_MERGED_PARAGRAPHS = "merged_paragraphs" # Per paragraph boundary: last line of one paragraph and first of the next share a line
+ERROR_SPLIT_LINE = "split_line" # Per English line: split into two bilingual pairs at a random word
+ERROR_KINDS = (ERROR_SUBSTITUTION, ERROR_INSERTION, ERROR_PUNCTUATION_SWAP, ERROR_MERGED_PARAGRAPHS, ERROR_SPLIT_LINE)
+DEFAULT_ERROR_RATES = {
+    ERROR_SUBSTITUTION: 0.002,
+    ERROR_INSERTION: 0.001,
+    ERROR_PUNCTUATION_SWAP: 0.005,
+    ERROR_MERGED_PARAGRAPHS: 0.005,
+    ERROR_SPLIT_LINE: 0.01,
+}
+
+MANIFEST_NAME = "corpus.json" # Parameters and statistics, written last so it marks a complete corpus
+
+_SYLLABLES = ("ba", "be", "bi", "bo", "ca", "ce", "da", "de", "di", "fa", "fo", "ga", "ge", "ha", "he", "ja", "ka",
+              "ke", "la", "le", "li", "lo", "ma", "me", "mi", "mo", "na", "ne", "no", "pa", "pe", "ra", "re", "ri",
+              "ro", "sa", "se", "si", "so", "ta", "te", "ti", "to", "va", "ve", "wa", "we", "ya", "za", "zo")
+_SENTENCE_END_MARKS = (".", ".", ".", "!", "?")
+_INNER_MARKS = (",", ",", ";", ":")
+_SWAP_MARKS = (".", ",", ";", ":", "!", "?")
+_CHINESE_FIRST, _CHINESE_LAST = 0x4E00, 0x62FF
+_WRITE_BUFFER_BYTES = 1024 * 1024
+
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(text):
+    # "10KB", "1.5MB", "1GB" or a plain byte count
+    text = text.strip().upper()
+    for unit in ("GB", "MB", "KB", "B"):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * _SIZE_UNITS[unit])
+    return int(text)
+
+
+def format_size(num_bytes):
+    for unit in ("GB", "MB", "KB"):
+        if num_bytes >= _SIZE_UNITS[unit] and num_bytes % _SIZE_UNITS[unit] == 0:
+            return f"{num_bytes // _SIZE_UNITS[unit]}{unit}"
+    return f"{num_bytes}B"
+
+
+def build_vocabulary(rng, size=VOCABULARY_SIZE):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+class _ErrorClock:
+    # Draws geometric gaps between events so the per-word error checks cost one
+    # decrement instead of one random number per word
+    def __init__(self, rng, rate):
+        self.rng = rng
+        self.log_keep = math.log1p(-rate) if 0 < rate < 1 else None
+        self.always = rate >= 1
+        self.countdown = self._gap()
+
+    def _gap(self):
+        if self.always:
+            return 0
+        if self.log_keep is None:
+            return math.inf
+        return int(math.log(1.0 - self.rng.random()) / self.log_keep)
+
+    def tick(self):
+        # True when the current item gets the error
+        if self.countdown > 0:
+            self.countdown -= 1
+            return False
+        self.countdown = self._gap()
+        return True
+
+
+class _CorpusWriter:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.parts = []
+        self.buffered_bytes = 0
+        self.bytes_written = 0
+
+    def write_line(self, line_text):
+        data = (line_text + "\n").encode('utf-8')
+        self.parts.append(data)
+        self.buffered_bytes += len(data)
+        if self.buffered_bytes >= _WRITE_BUFFER_BYTES:
+            self.flush()
+
+    def flush(self):
+        self.file.write(b"".join(self.parts))
+        self.bytes_written += self.buffered_bytes
+        self.parts = []
+        self.buffered_bytes = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def _chinese_line(rng, num_words):
+    num_chars = max(4, num_words * 2 + rng.randint(-3, 3))
+    chars = [chr(rng.randint(_CHINESE_FIRST, _CHINESE_LAST)) for _ in range(num_chars)]
+    if num_chars > 8:
+        chars.insert(num_chars // 2, "，")
+    return "".join(chars) + "。"
+
+
+def _make_sentence(rng, vocabulary):
+    words = rng.choices(vocabulary, k=rng.randint(4, 20))
+    words[0] = words[0].capitalize()
+    if len(words) > 8 and rng.random() < 0.5:
+        comma_pos = rng.randint(2, len(words) - 3)
+        words[comma_pos] += rng.choice(_INNER_MARKS)
+    words[-1] += rng.choice(_SENTENCE_END_MARKS)
+    return words
+
+
+def _inject_word_errors(words, rng, vocabulary, clocks, counts):
+    damaged = []
+    for word in words:
+        if clocks[ERROR_SUBSTITUTION].tick():
+            trailing = word[len(word.rstrip(",.;:!?")):]
+            word = rng.choice(vocabulary) + trailing
+            counts[ERROR_SUBSTITUTION] += 1
+        if word[-1] in _SWAP_MARKS and clocks[ERROR_PUNCTUATION_SWAP].tick():
+            word = word[:-1] + rng.choice([mark for mark in _SWAP_MARKS if mark != word[-1]])
+            counts[ERROR_PUNCTUATION_SWAP] += 1
+        damaged.append(word)
+        if clocks[ERROR_INSERTION].tick():
+            damaged.append(rng.choice(vocabulary))
+            counts[ERROR_INSERTION] += 1
+    return damaged
+
+
+def generate_corpus(folder, target_bytes, seed=DEFAULT_SEED, error_rates=None, progress=None):
+    # Writes BilingualText.txt and EnglishText.txt into folder, stopping at the first
+    # paragraph boundary after the bilingual file reaches target_bytes. Returns the
+    # manifest dict (also written to folder/corpus.json).
+    rates = dict(DEFAULT_ERROR_RATES)
+    rates.update(error_rates or {})
+    unknown_kinds = set(rates) - set(ERROR_KINDS)
+    if unknown_kinds:
+        raise ValueError(f"Unknown error kinds: {', '.join(sorted(unknown_kinds))}")
+
+    rng = random.Random(seed)
+    vocabulary = build_vocabulary(rng)
+    # Separate streams so changing one rate does not reshuffle the others
+    clocks = {kind: _ErrorClock(random.Random(f"{seed}-{kind}"), rate) for kind, rate in rates.items()}
+    counts = {kind: 0 for kind in ERROR_KINDS}
+
+    os.makedirs(folder, exist_ok=True)
+    manifest_path = os.path.join(folder, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path) # Files below are about to change
+    bilingual = _CorpusWriter(os.path.join(folder, engine.BILINGUAL_DEFAULT_NAME))
+    english = _CorpusWriter(os.path.join(folder, engine.ENGLISH_DEFAULT_NAME))
+    num_paragraphs = 0
+    num_english_words = 0
+    carried_words = None # Last line of the previous paragraph, when it is merged into this one
+    try:
+        while bilingual.bytes_written + bilingual.buffered_bytes < target_bytes or carried_words is not None:
+            sentences = [_make_sentence(rng, vocabulary) for _ in range(rng.randint(1, 5))]
+            english.write_line(" ".join(word for sentence in sentences for word in sentence))
+            num_paragraphs += 1
+            num_english_words += sum(len(sentence) for sentence in sentences)
+
+            bilingual_lines = [_inject_word_errors(sentence, rng, vocabulary, clocks, counts) for sentence in sentences]
+            if carried_words is not None:
+                bilingual_lines[0] = carried_words + bilingual_lines[0]
+                carried_words = None
+            if clocks[ERROR_MERGED_PARAGRAPHS].tick():
+                carried_words = bilingual_lines.pop()
+                counts[ERROR_MERGED_PARAGRAPHS] += 1
+
+            for words in bilingual_lines:
+                if len(words) > 1 and clocks[ERROR_SPLIT_LINE].tick():
+                    split_pos = rng.randint(1, len(words) - 1)
+                    parts = (words[:split_pos], words[split_pos:])
+                    counts[ERROR_SPLIT_LINE] += 1
+                else:
+                    parts = (words,)
+                for part in parts:
+                    bilingual.write_line(" ".join(part))
+                    bilingual.write_line(_chinese_line(rng, len(part)))
+                    if rng.random() < 0.3:
+                        bilingual.write_line("") # Blank lines between pairs are allowed
+
+            if progress is not None and num_paragraphs % 1000 == 0:
+                progress("bilingual bytes written", bilingual.bytes_written, target_bytes)
+    finally:
+        bilingual.close()
+        english.close()
+
+    manifest = {
+        "target_bytes": target_bytes,
+        "seed": seed,
+        "error_rates": rates,
+        "bilingual_bytes": bilingual.bytes_written,
+        "english_bytes": english.bytes_written,
+        "paragraphs": num_paragraphs,
+        "english_words": num_english_words,
+        "injected_errors": counts,
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_corpus(folder, target_bytes, seed=DEFAULT_SEED, error_rates=None, progress=None):
+    # Reuses an existing corpus generated with the same parameters
+    rates = dict(DEFAULT_ERROR_RATES)
+    rates.update(error_rates or {})
+    manifest = load_manifest(folder)
+    if (manifest is not None and manifest["target_bytes"] == target_bytes and manifest["seed"] == seed
+            and manifest["error_rates"] == rates):
+        return manifest
+    return generate_corpus(folder, target_bytes, seed, rates, progress)
+
+
+def add_error_rate_arguments(parser):
+    for kind in ERROR_KINDS:
+        parser.add_argument(f"--{kind.replace('_', '-')}-rate", dest=kind, type=float, default=DEFAULT_ERROR_RATES[kind],
+                            help=f"Probability of a {kind.replace('_', ' ')} error (default: {DEFAULT_ERROR_RATES[kind]})")
+
+
+def error_rates_from_args(args):
+    return {kind: getattr(args, kind) for kind in ERROR_KINDS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a deterministic bilingual/English corpus for benchmarking.")
+    parser.add_argument("folder", help="Output folder (BilingualText.txt, EnglishText.txt, corpus.json)")
+    parser.add_argument("--size", type=parse_size, default=parse_size("1MB"),
+                        help="Approximate size of the bilingual file, e.g. 10KB, 100MB, 1GB (default: 1MB)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED})")
+    add_error_rate_arguments(parser)
+    args = parser.parse_args(argv)
+
+    manifest = generate_corpus(args.folder, args.size, args.seed, error_rates_from_args(args))
+    injected = ", ".join(f"{kind}: {count}" for kind, count in manifest["injected_errors"].items())
+    print(f"Wrote {manifest['bilingual_bytes']} bytes bilingual / {manifest['english_bytes']} bytes English "
+          f"({manifest['paragraphs']} paragraphs) to {args.folder}")
+    print(f"Injected errors: {injected}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
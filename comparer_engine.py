@@ -0,0 +1,1046 @@
+import os
+from array import array
+from itertools import chain, zip_longest
+
+import run_stats
+import text_streams
+import parallel_align
+import word_diff
+from atomic_output import write_lines_atomically
+from document_cache import DOC_BILINGUAL, DOC_ENGLISH
+from paragraph_matcher import FUZZY_TOLERANCE, FuzzyBlockIndex, ParagraphBlockIndex, TokenHasher
+from punctuation_scanner import PUNCTUATION_ASCII, PUNCTUATION_CLASSES
+from report_writers import RECORD_EDIT, RECORD_PAIRING, RECORD_PARAGRAPH, RECORD_PUNCTUATION, RECORD_WORD
+from run_stats import RunStats, count_file_bytes, measure_stage, timed
+from script_classifier import PAIRING_ISSUE_KINDS, SCRIPT_NAMES, PairingReport, format_pairing_issue
+from tagging_log import LOG_CANDIDATE, LOG_OFF, LOG_PARAGRAPH, LOG_SUMMARY, TaggingLog
+from text_streams import count_words, get_last_word
+from token_arrays import TokenVocabulary, TokenWords, differing_positions
+
+# GUI-free comparison engine. Everything in here works on file paths, strings and
+# plain dicts/lists so it can be driven by the Tk app and the batch CLI alike.
+
+# Callers reach everything through the engine, including the options and RunStats
+# it imports from other modules
+__all__ = [
+    "BILINGUAL_DEFAULT_NAME", "ENGLISH_DEFAULT_NAME", "END_OF_BILINGUAL_MARKER", "END_OF_ENGLISH_MARKER",
+    "WORD_DIFF_INDEX", "WORD_DIFF_ALIGN", "WORD_DIFF_MODES", "ALIGN_PREVIEW_WORDS", "PROGRESS_INTERVAL_PARAGRAPHS",
+    "MATCH_EXACT", "MATCH_FUZZY", "MATCH_MODES", "PARAGRAPH_MATCHED", "PARAGRAPH_FUZZY_MATCHED",
+    "PARAGRAPH_LAST_WORD_MISMATCH", "PARAGRAPH_UNMATCHED", "FUZZY_TOLERANCE", "PUNCTUATION_ASCII",
+    "PUNCTUATION_CLASSES", "RunStats", "InputFileError", "OperationCancelled", "iter_bilingual_english_text",
+    "iter_indexed_lines", "iter_english_text", "get_document", "get_documents", "tokenize_and_clean_text",
+    "extract_punctuation_with_location", "compare_words", "compare_token_arrays", "align_words",
+    "iter_aligned_differences", "iter_aligned_token_differences", "aligned_difference", "run_word_comparison",
+    "format_word_comparison", "compare_punctuation", "punctuation_difference_reason", "run_punctuation_comparison",
+    "format_punctuation_comparison", "collect_reference_paragraphs", "collect_bilingual_english_lines",
+    "determine_tagged_output_path", "match_paragraphs", "iter_tagged_lines", "plan_paragraph_tagging",
+    "append_pairing_log", "write_tagged_file", "format_tagging_summary"
+]
+
+BILINGUAL_DEFAULT_NAME = "BilingualText.txt"
+ENGLISH_DEFAULT_NAME = "EnglishText.txt"
+
+END_OF_BILINGUAL_MARKER = "<END_OF_BILINGUAL_EXTRACT>"
+END_OF_ENGLISH_MARKER = "<END_OF_ENGLISHTEXT>"
+
+# Word comparison modes: "index" compares word i with word i, "align" reports the
+# shortest set of insertions, deletions and substitutions between the two texts.
+WORD_DIFF_INDEX = "index"
+WORD_DIFF_ALIGN = "align"
+WORD_DIFF_MODES = (WORD_DIFF_INDEX, WORD_DIFF_ALIGN)
+
+ALIGN_PREVIEW_WORDS = 12 # Words shown per side for a single aligned edit
+PROGRESS_INTERVAL_PARAGRAPHS = 100
+
+# Paragraph matching modes: "exact" needs the block's word count and last word to
+# equal the paragraph's, "fuzzy" also accepts the block closest in content when the
+# exact rule finds nothing at the expected place (see paragraph_matcher.py).
+MATCH_EXACT = "exact"
+MATCH_FUZZY = "fuzzy"
+MATCH_MODES = (MATCH_EXACT, MATCH_FUZZY)
+
+# Status of a "paragraph" record written during tagging
+PARAGRAPH_MATCHED = "matched"
+PARAGRAPH_FUZZY_MATCHED = "fuzzy_matched" # Matched by content similarity
+PARAGRAPH_LAST_WORD_MISMATCH = "last_word_mismatch" # Word count matched, block not chosen
+PARAGRAPH_UNMATCHED = "unmatched"
+
+class InputFileError(Exception):
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+# Long-running functions take an optional progress(label, done, total) callback,
+# where total is None when it is not known up front. The callback may raise
+# OperationCancelled to stop the run; it is never swallowed by the engine.
+# They also take an optional stats=RunStats(...) that collects per-stage times and
+# counters for the run (see run_stats.py).
+
+
+# --- Reading and cleaning ---
+# Inputs are streamed line by line (see text_streams.py); use_mmap=None memory-maps
+# only very large files. When a DocumentCache is passed in, parsed documents are
+# taken from it instead (see document_cache.py).
+
+def iter_bilingual_english_text(filepath, use_mmap=None, stats=None):
+    # The English lines of the bilingual file as a stream of lines, i.e. the extracted
+    # English text without ever joining it into one string.
+    try:
+        lines = timed(text_streams.iter_lines(filepath, use_mmap), stats, run_stats.STAGE_READ, run_stats.COUNT_LINES_READ)
+        english_lines = text_streams.iter_bilingual_english_lines(lines)
+        for _, line_text in timed(english_lines, stats, run_stats.STAGE_EXTRACT, run_stats.COUNT_ENGLISH_LINES):
+            yield line_text + "\n"
+    except Exception as e:
+        raise InputFileError("Error Reading Bilingual File", f"Could not read or parse bilingual file: {e}") from e
+
+
+def iter_indexed_lines(filepath, kind, use_mmap=None, stats=None):
+    # (original_idx, line_without_newline) for the English lines of a bilingual file
+    # (kind DOC_BILINGUAL) or every line of an English file (kind DOC_ENGLISH)
+    try:
+        lines = timed(text_streams.iter_lines(filepath, use_mmap), stats, run_stats.STAGE_READ, run_stats.COUNT_LINES_READ)
+        if kind == DOC_BILINGUAL:
+            indexed_lines = text_streams.iter_bilingual_english_lines(lines)
+        else:
+            indexed_lines = ((original_idx, line_text.rstrip('\n')) for original_idx, line_text in enumerate(lines))
+        yield from timed(indexed_lines, stats, run_stats.STAGE_EXTRACT, run_stats.COUNT_ENGLISH_LINES)
+    except Exception as e:
+        if kind == DOC_BILINGUAL:
+            raise InputFileError("Error Reading Bilingual File", f"Could not read or parse bilingual file: {e}") from e
+        raise InputFileError("Error Reading English File", f"Could not read English file: {e}") from e
+
+
+def iter_english_text(filepath, use_mmap=None, stats=None):
+    try:
+        yield from timed(text_streams.iter_lines(filepath, use_mmap), stats, run_stats.STAGE_READ, run_stats.COUNT_LINES_READ)
+    except Exception as e:
+        raise InputFileError("Error Reading English File", f"Could not read English file: {e}") from e
+
+
+def get_document(document_cache, filepath, kind, progress=None, stats=None, vocabulary=None):
+    try:
+        return document_cache.get(filepath, kind, progress, stats, vocabulary)
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        if kind == DOC_BILINGUAL:
+            raise InputFileError("Error Reading Bilingual File", f"Could not read or parse bilingual file: {e}") from e
+        raise InputFileError("Error Reading English File", f"Could not read English file: {e}") from e
+
+
+def get_documents(document_cache, bilingual_path, english_path, progress=None, stats=None):
+    # Both documents over one vocabulary, so that their token ids compare directly. The
+    # cache may have started a new vocabulary while the English one was parsed.
+    bilingual_document = get_document(document_cache, bilingual_path, DOC_BILINGUAL, progress, stats)
+    english_document = get_document(document_cache, english_path, DOC_ENGLISH, progress, stats)
+    if bilingual_document.vocabulary is not english_document.vocabulary:
+        bilingual_document = get_document(document_cache, bilingual_path, DOC_BILINGUAL, progress, stats,
+                                          english_document.vocabulary)
+    return bilingual_document, english_document
+
+
+def tokenize_and_clean_text(text):
+    if not text:
+        return []
+    return list(text_streams.iter_words([text]))
+
+
+def extract_punctuation_with_location(text, punctuation_class=PUNCTUATION_ASCII):
+    if not text:
+        return []
+    return list(text_streams.iter_punctuation_with_location([text], punctuation_class))
+
+
+# --- Word comparison ---
+
+def compare_words(bilingual_words, english_words):
+    # Index-by-index comparison of two word iterables (generators are fine, nothing is
+    # buffered). Returns (differences, bilingual_word_count, english_word_count);
+    # when either side has no words at all nothing is compared.
+    bilingual_iter = iter(bilingual_words)
+    english_iter = iter(english_words)
+    first_b = next(bilingual_iter, None)
+    first_e = next(english_iter, None)
+    if first_b is None or first_e is None:
+        bilingual_count = (first_b is not None) + sum(1 for _ in bilingual_iter)
+        english_count = (first_e is not None) + sum(1 for _ in english_iter)
+        return [], bilingual_count, english_count
+
+    differences = []
+    bilingual_count = 0
+    english_count = 0
+    word_pairs = zip_longest(chain([first_b], bilingual_iter), chain([first_e], english_iter))
+    for i, (word_b, word_e) in enumerate(word_pairs):
+        if word_b is None:
+            word_b = END_OF_BILINGUAL_MARKER
+        else:
+            bilingual_count += 1
+        if word_e is None:
+            word_e = END_OF_ENGLISH_MARKER
+        else:
+            english_count += 1
+
+        if word_b.lower() != word_e.lower():
+            differences.append({"index": i, "bilingual": word_b, "english": word_e})
+    return differences, bilingual_count, english_count
+
+
+def compare_token_arrays(bilingual_ids, english_ids, vocabulary, folded=None):
+    # compare_words() for whole documents already stored as token ids (see
+    # token_arrays.py); folded optionally gives both documents' folded ids
+    if not bilingual_ids or not english_ids:
+        return [], len(bilingual_ids), len(english_ids)
+    bilingual_folded, english_folded = folded or (vocabulary.fold(bilingual_ids), vocabulary.fold(english_ids))
+    words = vocabulary.words
+    differences = [{"index": i, "bilingual": words[bilingual_ids[i]], "english": words[english_ids[i]]}
+                   for i in differing_positions(bilingual_folded, english_folded)]
+    # The longer text's extra words are shown against the other's end marker
+    differences.extend({"index": i, "bilingual": words[bilingual_ids[i]], "english": END_OF_ENGLISH_MARKER}
+                       for i in range(len(english_ids), len(bilingual_ids)))
+    differences.extend({"index": i, "bilingual": END_OF_BILINGUAL_MARKER, "english": words[english_ids[i]]}
+                       for i in range(len(bilingual_ids), len(english_ids)))
+    return differences, len(bilingual_ids), len(english_ids)
+
+
+def align_words(bilingual_words, english_words, progress=None, jobs=1):
+    return list(iter_aligned_differences(bilingual_words, english_words, progress, jobs))
+
+
+def iter_aligned_differences(bilingual_words, english_words, progress=None, jobs=1):
+    vocabulary = TokenVocabulary()
+    return iter_aligned_token_differences(vocabulary.encode(bilingual_words), vocabulary.encode(english_words),
+                                          vocabulary, progress, jobs)
+
+
+def iter_aligned_token_differences(bilingual_ids, english_ids, vocabulary, progress=None, jobs=1, folded=None):
+    # Large inputs are split at anchors and the pieces aligned separately, by jobs
+    # worker processes when jobs > 1 (see parallel_align.py); the differences do not
+    # depend on jobs. folded is as for compare_token_arrays().
+    bilingual_folded, english_folded = folded or (vocabulary.fold(bilingual_ids), vocabulary.fold(english_ids))
+    bilingual_words = TokenWords(bilingual_ids, vocabulary)
+    english_words = TokenWords(english_ids, vocabulary)
+
+    checkpoint = None
+    aligned_up_to = [0] # Bilingual words covered by the edits emitted so far
+    if progress is not None:
+        checkpoint = lambda: progress("bilingual words aligned", aligned_up_to[0], len(bilingual_folded))
+
+    for edit_range in parallel_align.diff_ranges_partitioned(bilingual_folded, english_folded, vocabulary.hashes,
+                                                                 jobs, checkpoint):
+        aligned_up_to[0] = edit_range[2]
+        yield aligned_difference(edit_range, bilingual_words, english_words)
+
+
+def aligned_difference(edit_range, bilingual_words, english_words):
+    # Result dict for one (tag, b_lo, b_hi, e_lo, e_hi) range from word_diff.diff_ranges()
+    tag, b_lo, b_hi, e_lo, e_hi = edit_range
+    return {
+        "tag": tag,
+        "bilingual_start": b_lo, "bilingual_end": b_hi,
+        "english_start": e_lo, "english_end": e_hi,
+        "bilingual": _preview_words(bilingual_words, b_lo, b_hi),
+        "english": _preview_words(english_words, e_lo, e_hi),
+    }
+
+
+def _preview_words(words, start, end):
+    if end - start > ALIGN_PREVIEW_WORDS:
+        return " ".join(words[start:start + ALIGN_PREVIEW_WORDS]) + f" ... (+{end - start - ALIGN_PREVIEW_WORDS} more)"
+    return " ".join(words[start:end])
+
+
+def _iter_bilingual_lines_with_progress(filepath, use_mmap, progress, stats=None):
+    return text_streams.iter_with_progress(iter_bilingual_english_text(filepath, use_mmap, stats), progress, "bilingual English lines read")
+
+
+def _iter_english_lines_with_progress(filepath, use_mmap, progress, stats=None):
+    return text_streams.iter_with_progress(iter_english_text(filepath, use_mmap, stats), progress, "English lines read")
+
+
+def _iter_words(lines, stats):
+    if stats is None:
+        return text_streams.iter_words(lines)
+    # Timed per line rather than per word to keep the measuring overhead small
+    return chain.from_iterable(timed(text_streams.iter_line_words(lines), stats, run_stats.STAGE_TOKENIZE))
+
+
+def run_word_comparison(bilingual_path, english_path, mode=WORD_DIFF_ALIGN, use_mmap=None, document_cache=None, progress=None,
+                        stats=None, record_writer=None, align_jobs=1):
+    # With a record_writer (see report_writers.py) the differences are streamed to it
+    # as records with token offsets and line/column positions instead of being
+    # returned; result["differences"] is then None. align_jobs is the number of
+    # worker processes for the alignment.
+    if record_writer is not None:
+        return _write_word_comparison(bilingual_path, english_path, mode, use_mmap, document_cache, progress, stats, record_writer,
+                                      align_jobs)
+
+    with measure_stage(stats, run_stats.STAGE_COMPARE):
+        if document_cache is not None:
+            # Cached documents hold token ids over the cache's shared vocabulary
+            bilingual_document, english_document = get_documents(document_cache, bilingual_path, english_path, progress, stats)
+            vocabulary = english_document.vocabulary
+            bilingual_ids = bilingual_document.token_ids
+            english_ids = english_document.token_ids
+            folded = (bilingual_document.folded_ids, english_document.folded_ids)
+        else:
+            count_file_bytes(stats, bilingual_path, english_path)
+            bilingual_words = _iter_words(_iter_bilingual_lines_with_progress(bilingual_path, use_mmap, progress, stats), stats)
+            english_words = _iter_words(_iter_english_lines_with_progress(english_path, use_mmap, progress, stats), stats)
+            if mode == WORD_DIFF_ALIGN:
+                # The alignment needs random access to both texts
+                vocabulary = TokenVocabulary()
+                bilingual_ids = vocabulary.encode(bilingual_words)
+                english_ids = vocabulary.encode(english_words)
+                folded = None
+
+        if mode == WORD_DIFF_ALIGN:
+            differences = []
+            if bilingual_ids and english_ids:
+                differences = list(iter_aligned_token_differences(bilingual_ids, english_ids, vocabulary, progress, align_jobs, folded))
+            bilingual_count = len(bilingual_ids)
+            english_count = len(english_ids)
+        elif document_cache is not None:
+            differences, bilingual_count, english_count = compare_token_arrays(bilingual_ids, english_ids, vocabulary, folded)
+        else:
+            differences, bilingual_count, english_count = compare_words(bilingual_words, english_words)
+    if stats is not None:
+        stats.add(run_stats.COUNT_TOKENS, bilingual_count + english_count)
+
+    return {
+        "mode": mode,
+        "bilingual_word_count": bilingual_count,
+        "english_word_count": english_count,
+        "differences": differences,
+        "num_differences": len(differences),
+    }
+
+
+def _iter_located_words(filepath, kind, use_mmap, document_cache, progress, stats):
+    # (word, line_number, column) in the original file
+    if document_cache is not None:
+        document = get_document(document_cache, filepath, kind, progress, stats)
+        indexed_lines = zip(document.original_indices, document.lines)
+    else:
+        indexed_lines = text_streams.iter_with_progress(iter_indexed_lines(filepath, kind, use_mmap, stats), progress, f"{kind} lines read")
+    if stats is None:
+        return text_streams.iter_words_with_location(indexed_lines)
+    return timed(text_streams.iter_words_with_location(indexed_lines), stats, run_stats.STAGE_TOKENIZE)
+
+
+def _word_record(index, bilingual, english):
+    # bilingual and english are (word, line, column)
+    return {
+        "type": RECORD_WORD, "index": index,
+        "bilingual": bilingual[0], "bilingual_line": bilingual[1], "bilingual_column": bilingual[2],
+        "english": english[0], "english_line": english[1], "english_column": english[2],
+    }
+
+
+def _write_word_comparison(bilingual_path, english_path, mode, use_mmap, document_cache, progress, stats, record_writer, align_jobs=1):
+    with measure_stage(stats, run_stats.STAGE_COMPARE):
+        if document_cache is None:
+            count_file_bytes(stats, bilingual_path, english_path)
+        tokens = None
+        if mode == WORD_DIFF_ALIGN and document_cache is not None:
+            # Cached documents already hold the token ids, over the cache's shared vocabulary
+            bilingual_document, english_document = get_documents(document_cache, bilingual_path, english_path, progress, stats)
+            tokens = (bilingual_document.token_ids, english_document.token_ids, english_document.vocabulary,
+                      (bilingual_document.folded_ids, english_document.folded_ids))
+        bilingual_words = _iter_located_words(bilingual_path, DOC_BILINGUAL, use_mmap, document_cache, progress, stats)
+        english_words = _iter_located_words(english_path, DOC_ENGLISH, use_mmap, document_cache, progress, stats)
+        if mode == WORD_DIFF_ALIGN:
+            num_differences, bilingual_count, english_count = _write_aligned_words(bilingual_words, english_words, progress, record_writer,
+                                                                                   align_jobs, tokens)
+        else:
+            num_differences, bilingual_count, english_count = _write_compared_words(bilingual_words, english_words, record_writer)
+    if stats is not None:
+        stats.add(run_stats.COUNT_TOKENS, bilingual_count + english_count)
+    return {
+        "mode": mode,
+        "bilingual_word_count": bilingual_count,
+        "english_word_count": english_count,
+        "differences": None,
+        "num_differences": num_differences,
+    }
+
+
+def _write_compared_words(bilingual_words, english_words, record_writer):
+    # compare_words() over located words; same rules for empty sides and end markers
+    bilingual_iter = iter(bilingual_words)
+    english_iter = iter(english_words)
+    first_b = next(bilingual_iter, None)
+    first_e = next(english_iter, None)
+    if first_b is None or first_e is None:
+        bilingual_count = (first_b is not None) + sum(1 for _ in bilingual_iter)
+        english_count = (first_e is not None) + sum(1 for _ in english_iter)
+        return 0, bilingual_count, english_count
+
+    num_differences = 0
+    bilingual_count = 0
+    english_count = 0
+    word_pairs = zip_longest(chain([first_b], bilingual_iter), chain([first_e], english_iter))
+    for i, (located_b, located_e) in enumerate(word_pairs):
+        if located_b is None:
+            located_b = (END_OF_BILINGUAL_MARKER, None, None)
+        else:
+            bilingual_count += 1
+        if located_e is None:
+            located_e = (END_OF_ENGLISH_MARKER, None, None)
+        else:
+            english_count += 1
+
+        if located_b[0].lower() != located_e[0].lower():
+            record_writer.write(_word_record(i, located_b, located_e))
+            num_differences += 1
+    return num_differences, bilingual_count, english_count
+
+
+def _located_arrays(located_words, vocabulary):
+    # (token ids, line numbers, columns) in compact arrays; no ids when vocabulary is None
+    token_ids, line_numbers, columns = array('I'), array('I'), array('I')
+    for word, line_number, column in located_words:
+        if vocabulary is not None:
+            token_ids.append(vocabulary.intern(word))
+        line_numbers.append(line_number)
+        columns.append(column)
+    return token_ids, line_numbers, columns
+
+
+def _write_aligned_words(bilingual_located, english_located, progress, record_writer, align_jobs=1, tokens=None):
+    # The alignment needs both texts; words and positions are kept in compact arrays.
+    # tokens is (bilingual_ids, english_ids, vocabulary, folded) when the ids are known
+    # already (cached documents); only the positions are collected then.
+    if tokens is None:
+        vocabulary = TokenVocabulary()
+        bilingual_ids, bilingual_lines, bilingual_columns = _located_arrays(bilingual_located, vocabulary)
+        english_ids, english_lines, english_columns = _located_arrays(english_located, vocabulary)
+        folded = None
+    else:
+        bilingual_ids, english_ids, vocabulary, folded = tokens
+        _, bilingual_lines, bilingual_columns = _located_arrays(bilingual_located, None)
+        _, english_lines, english_columns = _located_arrays(english_located, None)
+
+    num_differences = 0
+    if bilingual_ids and english_ids:
+        for difference in iter_aligned_token_differences(bilingual_ids, english_ids, vocabulary, progress, align_jobs, folded):
+            # Position of the first word of each range; for an empty range, of the word it comes before
+            b_pos = min(difference["bilingual_start"], len(bilingual_ids) - 1)
+            e_pos = min(difference["english_start"], len(english_ids) - 1)
+            record_writer.write({
+                "type": RECORD_EDIT, "tag": difference["tag"],
+                "bilingual_start": difference["bilingual_start"], "bilingual_end": difference["bilingual_end"],
+                "bilingual_line": bilingual_lines[b_pos], "bilingual_column": bilingual_columns[b_pos],
+                "english_start": difference["english_start"], "english_end": difference["english_end"],
+                "english_line": english_lines[e_pos], "english_column": english_columns[e_pos],
+                "bilingual": difference["bilingual"], "english": difference["english"],
+            })
+            num_differences += 1
+    return num_differences, len(bilingual_ids), len(english_ids)
+
+
+def format_word_comparison(result, difference_starts=None):
+    # difference_starts, if given, receives the index in the returned list at which
+    # each reported difference begins.
+    report_lines = []
+    bilingual_count = result["bilingual_word_count"]
+    english_count = result["english_word_count"]
+
+    if not bilingual_count and not english_count:
+        report_lines.append("Both texts are empty or contain no valid words after cleaning punctuation.\n")
+        return report_lines
+    if not bilingual_count:
+        report_lines.append("Extracted English from BilingualText is empty or has no valid words after cleaning punctuation.\n")
+        report_lines.append(f"EnglishText.txt contains {english_count} words after cleaning punctuation.\n")
+        return report_lines
+    if not english_count:
+        report_lines.append("EnglishText.txt is empty or has no valid words after cleaning punctuation.\n")
+        report_lines.append(f"Bilingual extract contains {bilingual_count} words after cleaning punctuation.\n")
+        return report_lines
+
+    differences = result["differences"]
+    if result["mode"] == WORD_DIFF_ALIGN:
+        _format_aligned_differences(differences, report_lines, difference_starts)
+    else:
+        for difference in differences:
+            if difference_starts is not None:
+                difference_starts.append(len(report_lines))
+            report_lines.append(f"Difference at word index {difference['index']}:\n")
+            report_lines.append(f"  Bilingual Extracted: '{difference['bilingual']}'\n")
+            report_lines.append(f"  EnglishText.txt:     '{difference['english']}'\n\n")
+
+    if not differences:
+        report_lines.append("No differences found between the English words (case-insensitive, after cleaning punctuation).\n")
+    elif result["mode"] == WORD_DIFF_ALIGN:
+        tag_counts = {tag: 0 for tag in (word_diff.EDIT_REPLACE, word_diff.EDIT_INSERT, word_diff.EDIT_DELETE)}
+        for difference in differences:
+            tag_counts[difference["tag"]] += 1
+        report_lines.append(
+            f"Aligned edits: {len(differences)} (substitutions: {tag_counts[word_diff.EDIT_REPLACE]}, "
+            f"missing from bilingual extract: {tag_counts[word_diff.EDIT_INSERT]}, "
+            f"extra in bilingual extract: {tag_counts[word_diff.EDIT_DELETE]})\n"
+        )
+
+    if bilingual_count != english_count:
+        report_lines.append(f"(Note: Cleaned word counts differ - Bilingual Extract: {bilingual_count}, EnglishText: {english_count})\n")
+    elif not differences:
+        report_lines.append(f"(Cleaned word counts match: {bilingual_count})\n")
+    return report_lines
+
+
+def _format_word_range(start, end):
+    # Ranges are half-open internally; shown as inclusive word indices
+    if end - start == 1:
+        return f"word index {start}"
+    if end == start:
+        return f"before word index {start}"
+    return f"word indices {start}-{end - 1}"
+
+
+def _format_aligned_differences(differences, report_lines, difference_starts):
+    for difference in differences:
+        if difference_starts is not None:
+            difference_starts.append(len(report_lines))
+        bilingual_range = _format_word_range(difference["bilingual_start"], difference["bilingual_end"])
+        english_range = _format_word_range(difference["english_start"], difference["english_end"])
+        if difference["tag"] == word_diff.EDIT_INSERT:
+            heading = "Missing from bilingual extract"
+        elif difference["tag"] == word_diff.EDIT_DELETE:
+            heading = "Extra in bilingual extract"
+        else:
+            heading = "Substitution"
+        report_lines.append(f"{heading} (Bilingual {bilingual_range}, EnglishText {english_range}):\n")
+        bilingual_text = f"'{difference['bilingual']}'" if difference["bilingual"] else "<NONE>"
+        english_text = f"'{difference['english']}'" if difference["english"] else "<NONE>"
+        report_lines.append(f"  Bilingual Extracted: {bilingual_text}\n")
+        report_lines.append(f"  EnglishText.txt:     {english_text}\n\n")
+
+
+# --- Punctuation comparison ---
+
+def compare_punctuation(puncts_bilingual, puncts_english, differences=None):
+    # Compares two streams of (char, line, column) marks occurrence by occurrence.
+    # Returns (differences, bilingual_count, english_count); differences may be any
+    # object with append(), e.g. a _RecordSink that streams them to a report file.
+    if differences is None:
+        differences = []
+    bilingual_count = 0
+    english_count = 0
+
+    for i, (mark_b, mark_e) in enumerate(zip_longest(puncts_bilingual, puncts_english)):
+        if mark_b is not None:
+            bilingual_count += 1
+        if mark_e is not None:
+            english_count += 1
+        diff_type = punctuation_difference_reason(mark_b, mark_e)
+        if diff_type:
+            differences.append({"occurrence": i + 1, "bilingual": mark_b, "english": mark_e, "reason": diff_type})
+    return differences, bilingual_count, english_count
+
+
+def punctuation_difference_reason(mark_b, mark_e):
+    # Reason reported for the pair of marks at one occurrence (None when a text has
+    # no mark there), or "" when they agree
+    if mark_e is None:
+        return "Bilingual Extract has fewer punctuation marks."
+    if mark_b is None:
+        return "EnglishText.txt has fewer punctuation marks."
+    if mark_b[0] != mark_e[0]:
+        return "Punctuation characters differ."
+    return ""
+
+
+def run_punctuation_comparison(bilingual_path, english_path, use_mmap=None, document_cache=None, progress=None,
+                               punctuation_class=PUNCTUATION_ASCII, stats=None, record_writer=None):
+    # punctuation_class is one of PUNCTUATION_CLASSES (see punctuation_scanner.py).
+    # With a record_writer the differences are streamed to it and not returned, as
+    # in run_word_comparison(). Bilingual positions are in the extracted English text.
+    differences = [] if record_writer is None else _RecordSink(record_writer, _punctuation_record)
+    with measure_stage(stats, run_stats.STAGE_COMPARE):
+        if document_cache is not None:
+            bilingual_document = get_document(document_cache, bilingual_path, DOC_BILINGUAL, progress, stats)
+            english_document = get_document(document_cache, english_path, DOC_ENGLISH, progress, stats)
+            with measure_stage(stats, run_stats.STAGE_PUNCTUATION_SCAN):
+                puncts_bilingual = bilingual_document.punctuation_marks(punctuation_class)
+                puncts_english = english_document.punctuation_marks(punctuation_class)
+        else:
+            count_file_bytes(stats, bilingual_path, english_path)
+            bilingual_lines = _iter_bilingual_lines_with_progress(bilingual_path, use_mmap, progress, stats)
+            english_lines = _iter_english_lines_with_progress(english_path, use_mmap, progress, stats)
+            puncts_bilingual = timed(text_streams.iter_punctuation_with_location(bilingual_lines, punctuation_class),
+                                     stats, run_stats.STAGE_PUNCTUATION_SCAN)
+            puncts_english = timed(text_streams.iter_punctuation_with_location(english_lines, punctuation_class),
+                                   stats, run_stats.STAGE_PUNCTUATION_SCAN)
+
+        differences, bilingual_count, english_count = compare_punctuation(puncts_bilingual, puncts_english, differences)
+    if stats is not None:
+        stats.add(run_stats.COUNT_PUNCTUATION_MARKS, bilingual_count + english_count)
+    return {
+        "punctuation_class": punctuation_class,
+        "bilingual_punctuation_count": bilingual_count,
+        "english_punctuation_count": english_count,
+        "differences": differences if record_writer is None else None,
+        "num_differences": len(differences),
+    }
+
+
+class _RecordSink:
+    # List-like target for difference dicts that converts and writes each one
+    def __init__(self, record_writer, to_record):
+        self.record_writer = record_writer
+        self.to_record = to_record
+        self.num_records = 0
+
+    def append(self, difference):
+        self.record_writer.write(self.to_record(difference))
+        self.num_records += 1
+
+    def __len__(self):
+        return self.num_records
+
+
+def _punctuation_record(difference):
+    mark_b = difference["bilingual"] or (None, None, None)
+    mark_e = difference["english"] or (None, None, None)
+    return {
+        "type": RECORD_PUNCTUATION, "occurrence": difference["occurrence"], "reason": difference["reason"],
+        "bilingual_char": mark_b[0], "bilingual_line": mark_b[1], "bilingual_column": mark_b[2],
+        "english_char": mark_e[0], "english_line": mark_e[1], "english_column": mark_e[2],
+    }
+
+
+def format_punctuation_comparison(result, difference_starts=None):
+    report_lines = []
+    bilingual_count = result["bilingual_punctuation_count"]
+    english_count = result["english_punctuation_count"]
+
+    if not bilingual_count and not english_count:
+        report_lines.append("No punctuation found in either text.\n")
+        return report_lines
+
+    if result["punctuation_class"] == PUNCTUATION_ASCII:
+        report_lines.append("Punctuation Comparison:\n\n")
+    else:
+        report_lines.append(f"Punctuation Comparison ({result['punctuation_class']} punctuation):\n\n")
+    differences = result["differences"]
+    for difference in differences:
+        if difference_starts is not None:
+            difference_starts.append(len(report_lines))
+        report_lines.append(f"Difference in punctuation sequence at occurrence #{difference['occurrence']}:\n")
+        if difference["bilingual"] is not None:
+            p_b_char, p_b_line, p_b_col = difference["bilingual"]
+            report_lines.append(f"  Bilingual Extract: '{p_b_char}' (Line {p_b_line}, Char {p_b_col})\n")
+        else:
+            report_lines.append("  Bilingual Extract: <NO PUNCTUATION AT THIS POSITION>\n")
+
+        if difference["english"] is not None:
+            p_e_char, p_e_line, p_e_col = difference["english"]
+            report_lines.append(f"  EnglishText.txt:     '{p_e_char}' (Line {p_e_line}, Char {p_e_col})\n")
+        else:
+            report_lines.append("  EnglishText.txt:     <NO PUNCTUATION AT THIS POSITION>\n")
+        report_lines.append(f"  Reason: {difference['reason']}\n\n")
+
+    if not differences:
+        report_lines.append("No differences found in the sequence of punctuation marks.\n")
+
+    if bilingual_count != english_count:
+        report_lines.append(f"(Note: Punctuation counts differ - Bilingual Extract: {bilingual_count}, EnglishText: {english_count})\n")
+    elif not differences:
+        report_lines.append(f"(Punctuation counts match: {bilingual_count})\n")
+    return report_lines
+
+
+# --- Paragraph tagging ---
+
+def collect_reference_paragraphs(english_ref_lines, token_hasher=None):
+    # With a TokenHasher (fuzzy matching), each paragraph also gets its "token_hashes"
+    english_ref_paragraphs_info = []
+    for line_num, line_text in enumerate(english_ref_lines):
+        text = line_text.strip()
+        if not text: continue
+        word_count = count_words(text)
+        last_word = get_last_word(text)
+        if word_count > 0:
+            english_ref_paragraphs_info.append({
+                "word_count": word_count,
+                "last_word": last_word, "original_line_num": line_num + 1
+            })
+            if token_hasher is not None:
+                english_ref_paragraphs_info[-1]["token_hashes"] = token_hasher.hash_line(text)
+    return english_ref_paragraphs_info
+
+
+def collect_bilingual_english_lines(bilingual_lines, stats=None, pairing=None, token_hasher=None):
+    # Per-line stats of the English lines of the bilingual file as parallel arrays. The
+    # line text itself is not kept. pairing: see text_streams.iter_bilingual_english_lines().
+    # With a TokenHasher (fuzzy matching), the token hashes of every line are added as
+    # "token_count" per line and "token_hashes" for the whole text.
+    bilingual_eng_lines = {"original_idx": array('I'), "word_count": array('I'), "last_word": []}
+    if token_hasher is not None:
+        bilingual_eng_lines["token_count"] = array('I')
+        bilingual_eng_lines["token_hashes"] = array('I')
+    english_lines = timed(text_streams.iter_bilingual_english_lines(bilingual_lines, pairing), stats,
+                          run_stats.STAGE_EXTRACT, run_stats.COUNT_ENGLISH_LINES)
+    for original_idx, line_text in english_lines:
+        bilingual_eng_lines["original_idx"].append(original_idx)
+        bilingual_eng_lines["word_count"].append(count_words(line_text))
+        bilingual_eng_lines["last_word"].append(get_last_word(line_text))
+        if token_hasher is not None:
+            line_hashes = token_hasher.hash_line(line_text)
+            bilingual_eng_lines["token_count"].append(len(line_hashes))
+            bilingual_eng_lines["token_hashes"].extend(line_hashes)
+    return bilingual_eng_lines
+
+
+def determine_tagged_output_path(bilingual_input_path):
+    # Returns (output_filepath, info_message). The tagged file is named after the
+    # folder holding the bilingual file; info_message is set when a fallback is used.
+    bilingual_filename_itself = os.path.basename(bilingual_input_path)
+    containing_folder_path = os.path.dirname(bilingual_input_path)
+    normalized_containing_folder_path = os.path.normpath(containing_folder_path)
+    folder_name_for_output_file_base = os.path.basename(normalized_containing_folder_path)
+
+    is_special_case_for_naming = False
+    if not folder_name_for_output_file_base or folder_name_for_output_file_base == ".":
+        is_special_case_for_naming = True
+    elif os.name == 'nt' and len(folder_name_for_output_file_base) == 2 and \
+         folder_name_for_output_file_base[1] == ':' and folder_name_for_output_file_base[0].isalpha():
+        is_special_case_for_naming = True
+    elif os.name != 'nt' and folder_name_for_output_file_base == os.sep: # For root path like '/'
+        is_special_case_for_naming = True
+
+    info_message = None
+    if is_special_case_for_naming:
+        bilingual_file_name_base, _ = os.path.splitext(bilingual_filename_itself)
+        output_file_basename = bilingual_file_name_base + "_Tagged"
+        info_message = f"INFO: Bilingual file's containing folder is root, CWD, or ambiguous. Using fallback output name: {output_file_basename}.txt\n"
+    else:
+        output_file_basename = folder_name_for_output_file_base
+
+    output_filename = output_file_basename + ".txt"
+    output_dir = containing_folder_path if containing_folder_path else os.getcwd()
+    return os.path.join(output_dir, output_filename), info_message
+
+
+def match_paragraphs(english_ref_paragraphs_info, bilingual_eng_lines, log, progress=None, stats=None,
+                     record_writer=None, fuzzy_index=None):
+    # Steps are recorded in log (a TaggingLog) up to its level. With a record_writer,
+    # every match, last-word mismatch and unmatched paragraph is also written to it as
+    # a "paragraph" record while matching.
+    # With a FuzzyBlockIndex (paragraph infos then need "token_hashes"), an exact match
+    # that does not start right at the search start must also be within the fuzzy
+    # tolerance in content, else it is a coincidence and ignored; an earlier block
+    # close enough in content is preferred to it.
+    original_indices_of_lines_to_pre_tag = set()
+    bilingual_search_start_idx = 0
+    num_successful_matches = 0
+    num_fuzzy_matches = 0
+    num_last_word_mismatches_for_wc_match = 0
+    num_unmatched_ref_paras = 0
+
+    # Blocks are looked up through prefix sums of the per-line word counts instead of
+    # re-scanning the remaining lines for every paragraph.
+    line_original_indices = bilingual_eng_lines["original_idx"]
+    line_last_words = bilingual_eng_lines["last_word"]
+    block_index = ParagraphBlockIndex(bilingual_eng_lines["word_count"], line_last_words)
+
+    log_paragraphs = log.enabled(LOG_PARAGRAPH)
+    log_candidates = log.enabled(LOG_CANDIDATE)
+    log.add(LOG_SUMMARY, "\n--- Matching Process ---\n")
+    for ref_para_idx, ref_para_info in enumerate(english_ref_paragraphs_info):
+        if progress is not None and ref_para_idx % PROGRESS_INTERVAL_PARAGRAPHS == 0:
+            progress("paragraphs matched", ref_para_idx, len(english_ref_paragraphs_info))
+        ref_wc = ref_para_info["word_count"]
+        ref_lw_cleaned = ref_para_info["last_word"]
+        if log_paragraphs:
+            log.add(LOG_PARAGRAPH, "Attempting to match Ref Para {} (Line {}, WC: {}, Cleaned LW: '{}')\n",
+                    ref_para_idx + 1, ref_para_info['original_line_num'], ref_wc, ref_lw_cleaned)
+
+        match, rejected_blocks = block_index.find_block(bilingual_search_start_idx, ref_wc, ref_lw_cleaned)
+        fuzzy_match = None
+        if fuzzy_index is not None and (match is None or match[0] != bilingual_search_start_idx):
+            ref_hashes = ref_para_info["token_hashes"]
+            if match is not None and fuzzy_index.block_similarity(match[0], match[1], ref_hashes) is None:
+                if log_candidates:
+                    log.add(LOG_CANDIDATE, "  EXACT MATCH IGNORED: Bilingual block (Original lines {} to {}) has the same WC and LW but different words.\n",
+                            line_original_indices[match[0]]+1, line_original_indices[match[1]]+1)
+                match = None
+            fuzzy_match = fuzzy_index.find_block(bilingual_search_start_idx, ref_hashes, None if match is None else match[0])
+            if fuzzy_match is not None:
+                # Exact-rule candidates from the fuzzy block on are never reached
+                rejected_blocks = [block for block in rejected_blocks if block[0] < fuzzy_match[0]]
+
+        for block_first_idx, block_last_idx in rejected_blocks:
+            num_last_word_mismatches_for_wc_match +=1
+            if log_candidates:
+                log.add(LOG_CANDIDATE, "  LAST WORD MISMATCH: Ref Para (Cleaned LW: '{}') vs Bilingual block (Cleaned LW '{}', Original last line idx: {}). WC ({}) matched. Block not chosen.\n",
+                        ref_lw_cleaned, line_last_words[block_last_idx], line_original_indices[block_last_idx]+1, ref_wc)
+            if record_writer is not None:
+                record_writer.write(_paragraph_record(ref_para_idx, ref_para_info, PARAGRAPH_LAST_WORD_MISMATCH, bilingual_eng_lines,
+                                                      block_first_idx, block_last_idx))
+
+        if fuzzy_match is not None:
+            block_first_idx, block_last_idx, similarity = fuzzy_match
+            original_indices_of_lines_to_pre_tag.add(line_original_indices[block_first_idx])
+            num_successful_matches += 1
+            num_fuzzy_matches += 1
+            bilingual_search_start_idx = block_last_idx + 1
+            if log_paragraphs:
+                log.add(LOG_PARAGRAPH, "  FUZZY MATCHED: Bilingual block (Original lines {} to {}) WC: {} (Ref: {}), Cleaned LW: '{}', similarity {:.0%}.\n",
+                        line_original_indices[block_first_idx]+1, line_original_indices[block_last_idx]+1,
+                        block_index.prefix_sums[block_last_idx + 1] - block_index.prefix_sums[block_first_idx], ref_wc,
+                        line_last_words[block_last_idx], similarity)
+            if record_writer is not None:
+                record_writer.write(_paragraph_record(ref_para_idx, ref_para_info, PARAGRAPH_FUZZY_MATCHED, bilingual_eng_lines,
+                                                      block_first_idx, block_last_idx))
+        elif match is not None:
+            block_first_idx, block_last_idx = match
+            original_indices_of_lines_to_pre_tag.add(line_original_indices[block_first_idx])
+            num_successful_matches += 1
+            bilingual_search_start_idx = block_last_idx + 1
+            if log_paragraphs:
+                log.add(LOG_PARAGRAPH, "  MATCHED: Bilingual block (Original lines {} to {}) WC: {}, Cleaned LW: '{}'.\n",
+                        line_original_indices[block_first_idx]+1, line_original_indices[block_last_idx]+1, ref_wc,
+                        line_last_words[block_last_idx])
+            if record_writer is not None:
+                record_writer.write(_paragraph_record(ref_para_idx, ref_para_info, PARAGRAPH_MATCHED, bilingual_eng_lines,
+                                                      block_first_idx, block_last_idx))
+        else:
+            num_unmatched_ref_paras +=1
+            if log_paragraphs:
+                log.add(LOG_PARAGRAPH, "  NO MATCH FOUND for Ref Para {} in remaining bilingual text.\n", ref_para_idx + 1)
+            if record_writer is not None:
+                record_writer.write(_paragraph_record(ref_para_idx, ref_para_info, PARAGRAPH_UNMATCHED, bilingual_eng_lines))
+
+    if progress is not None:
+        progress("paragraphs matched", len(english_ref_paragraphs_info), len(english_ref_paragraphs_info))
+    if stats is not None:
+        # Every block with the right word count up to and including the match had its last word checked
+        stats.add(run_stats.COUNT_MATCH_ATTEMPTS, len(english_ref_paragraphs_info))
+        stats.add(run_stats.COUNT_CANDIDATES_TRIED, num_last_word_mismatches_for_wc_match + num_successful_matches)
+        stats.add(run_stats.COUNT_BLOCK_INDEXES, block_index.num_indexed_word_counts())
+        if fuzzy_index is not None:
+            stats.add(run_stats.COUNT_FUZZY_BLOCKS_SCORED, fuzzy_index.num_blocks_scored)
+    log.add(LOG_SUMMARY, "--- Matching Process Complete ---\n\n")
+    return {
+        "tag_indices": original_indices_of_lines_to_pre_tag,
+        "num_successful_matches": num_successful_matches,
+        "num_fuzzy_matches": num_fuzzy_matches,
+        "num_last_word_mismatches": num_last_word_mismatches_for_wc_match,
+        "num_unmatched_ref_paras": num_unmatched_ref_paras,
+    }
+
+
+def _paragraph_record(ref_para_idx, ref_para_info, status, bilingual_eng_lines, block_first_idx=None, block_last_idx=None):
+    record = {
+        "type": RECORD_PARAGRAPH, "ref_paragraph": ref_para_idx + 1, "ref_line": ref_para_info["original_line_num"],
+        "word_count": ref_para_info["word_count"], "last_word": ref_para_info["last_word"], "status": status,
+        "bilingual_first_line": None, "bilingual_last_line": None, "bilingual_last_word": None,
+    }
+    if block_first_idx is not None:
+        record["bilingual_first_line"] = bilingual_eng_lines["original_idx"][block_first_idx] + 1
+        record["bilingual_last_line"] = bilingual_eng_lines["original_idx"][block_last_idx] + 1
+        record["bilingual_last_word"] = bilingual_eng_lines["last_word"][block_last_idx]
+    return record
+
+
+def iter_tagged_lines(bilingual_lines, tag_indices):
+    for original_idx, original_line_text in enumerate(bilingual_lines):
+        if original_idx in tag_indices:
+            yield "<paragraph>\n"
+        yield original_line_text
+
+
+def plan_paragraph_tagging(bilingual_input_path, english_ref_path, use_mmap=None, document_cache=None, progress=None,
+                           stats=None, record_writer=None, keep_log=True, match_mode=MATCH_EXACT,
+                           fuzzy_tolerance=FUZZY_TOLERANCE, log=None):
+    # Streams both files once (or takes them from the cache) and runs the matcher.
+    # Nothing is written here so callers can still show the detailed log when
+    # writing the tagged file fails. With keep_log=False the detailed log is not
+    # collected at all (headless runs that only need the counts or the records).
+    # log is a TaggingLog (see tagging_log.py) for other levels, a bounded buffer or a
+    # spill file; it is returned as result["log"] and left open.
+    if log is None:
+        log = TaggingLog(LOG_CANDIDATE if keep_log else LOG_OFF)
+    log.add(LOG_SUMMARY, "Starting paragraph tagging process...\n")
+    token_hasher = TokenHasher() if match_mode == MATCH_FUZZY else None
+
+    if document_cache is not None:
+        english_document = get_document(document_cache, english_ref_path, DOC_ENGLISH, progress, stats)
+        bilingual_document = get_document(document_cache, bilingual_input_path, DOC_BILINGUAL, progress, stats)
+        bilingual_stat = (bilingual_document.size, bilingual_document.mtime_ns)
+        with measure_stage(stats, run_stats.STAGE_LINE_STATS):
+            english_ref_paragraphs_info = collect_reference_paragraphs(english_document.lines, token_hasher)
+            bilingual_eng_lines = bilingual_document.line_stats()
+            if token_hasher is not None:
+                bilingual_eng_lines["token_count"], bilingual_eng_lines["token_hashes"] = token_hasher.hash_lines(bilingual_document.lines)
+        pairing = bilingual_document.pairing
+    else:
+        bilingual_stat = _file_stat(bilingual_input_path) # Before reading, so a change during the read is caught too
+        count_file_bytes(stats, bilingual_input_path, english_ref_path)
+        english_lines = text_streams.iter_with_progress(text_streams.iter_lines(english_ref_path, use_mmap), progress, "English lines read")
+        bilingual_lines = text_streams.iter_with_progress(text_streams.iter_lines(bilingual_input_path, use_mmap), progress, "bilingual lines read")
+        pairing = PairingReport()
+        with measure_stage(stats, run_stats.STAGE_LINE_STATS):
+            english_ref_paragraphs_info = collect_reference_paragraphs(
+                timed(english_lines, stats, run_stats.STAGE_READ, run_stats.COUNT_LINES_READ), token_hasher)
+            bilingual_eng_lines = collect_bilingual_english_lines(
+                timed(bilingual_lines, stats, run_stats.STAGE_READ, run_stats.COUNT_LINES_READ), stats, pairing, token_hasher)
+
+    if not bilingual_eng_lines["original_idx"]:
+        log.add(LOG_SUMMARY, "WARNING: No English lines identified in the bilingual file.\n")
+    else:
+        log.add(LOG_SUMMARY, "Identified {} English lines from bilingual file.\n", len(bilingual_eng_lines['original_idx']))
+    append_pairing_log(pairing, log)
+    if record_writer is not None:
+        for issue in pairing.issues:
+            record_writer.write(_pairing_record(issue))
+
+    output_filepath, info_message = determine_tagged_output_path(bilingual_input_path)
+    if info_message:
+        log.add(LOG_SUMMARY, "{}", info_message)
+
+    with measure_stage(stats, run_stats.STAGE_MATCH):
+        fuzzy_index = None
+        if token_hasher is not None:
+            fuzzy_index = FuzzyBlockIndex(bilingual_eng_lines["token_count"], bilingual_eng_lines["token_hashes"], fuzzy_tolerance)
+        match_result = match_paragraphs(english_ref_paragraphs_info, bilingual_eng_lines, log, progress, stats,
+                                        record_writer, fuzzy_index)
+
+    return {
+        "bilingual_input_path": bilingual_input_path,
+        "bilingual_stat": bilingual_stat, # (size, mtime_ns) of the bilingual file the tags were planned on
+        "output_filepath": output_filepath,
+        "tag_indices": match_result["tag_indices"],
+        "num_tags_added": len(match_result["tag_indices"]),
+        "num_ref_paragraphs": len(english_ref_paragraphs_info),
+        "num_successful_matches": match_result["num_successful_matches"],
+        "num_fuzzy_matches": match_result["num_fuzzy_matches"],
+        "num_last_word_mismatches": match_result["num_last_word_mismatches"],
+        "num_unmatched_ref_paras": match_result["num_unmatched_ref_paras"],
+        "match_mode": match_mode,
+        "fuzzy_tolerance": fuzzy_tolerance,
+        "pairing": pairing,
+        "log": log,
+        "use_mmap": use_mmap,
+    }
+
+
+def append_pairing_log(pairing, log):
+    # The count is a summary record, the issues themselves are listed per paragraph
+    if not pairing.num_issues():
+        return
+    log.add(LOG_SUMMARY, "WARNING: English/Chinese line pairing breaks down in {} places:\n", pairing.num_issues())
+    if not log.enabled(LOG_PARAGRAPH):
+        return
+    for issue in pairing.issues:
+        log.add(LOG_PARAGRAPH, "  {}\n", format_pairing_issue(issue))
+    if pairing.num_issues() > len(pairing.issues):
+        log.add(LOG_PARAGRAPH, "  ... {} more not listed\n", pairing.num_issues() - len(pairing.issues))
+
+
+def _pairing_record(issue):
+    return {"type": RECORD_PAIRING, "kind": issue["kind"], "line": issue["line"], "role": SCRIPT_NAMES[issue["role"]]}
+
+
+def _file_stat(path):
+    # (size, mtime_ns), or None when the file cannot be stat'ed (reading it reports why)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_tagged_file(tagging_result, stats=None):
+    # The bilingual file is streamed a second time rather than kept in memory, into a
+    # temporary file that replaces the output only when complete (see atomic_output.py),
+    # which also makes it safe for the output to be the input itself. Returns False
+    # when the output already had exactly this content and was left untouched.
+    # Raises InputFileError when the bilingual file changed since the tags were planned,
+    # as the tags would then land on the wrong lines.
+    bilingual_stat = tagging_result.get("bilingual_stat")
+    if bilingual_stat is not None and _file_stat(tagging_result["bilingual_input_path"]) != bilingual_stat:
+        raise InputFileError("Bilingual File Changed",
+                             f"{tagging_result['bilingual_input_path']} changed after it was read for tagging; "
+                             "run the tagging again")
+    with measure_stage(stats, run_stats.STAGE_WRITE):
+        count_file_bytes(stats, tagging_result["bilingual_input_path"])
+        bilingual_lines = timed(text_streams.iter_lines(tagging_result["bilingual_input_path"], tagging_result["use_mmap"]),
+                                stats, run_stats.STAGE_READ, run_stats.COUNT_LINES_READ)
+        tagged_lines = timed(iter_tagged_lines(bilingual_lines, tagging_result["tag_indices"]),
+                             stats, run_stats.STAGE_WRITE, run_stats.COUNT_LINES_WRITTEN)
+        written, num_bytes = write_lines_atomically(tagging_result["output_filepath"], tagged_lines)
+    tagging_result["output_unchanged"] = not written
+    if stats is not None:
+        stats.add(run_stats.COUNT_BYTES_WRITTEN, num_bytes)
+        if not written:
+            stats.add(run_stats.COUNT_UNCHANGED_OUTPUTS)
+    return written
+
+
+def format_tagging_summary(tagging_result):
+    overall_summary_lines = []
+    matching_summary_lines = []
+    detailed_log_header = []
+
+    # 1. Overall Operation Summary
+    op_summary_title = "Tagging Operation Summary:"
+    op_summary_sep = "-" * len(op_summary_title)
+    overall_summary_lines.extend([
+        f"{op_summary_title}\n",
+        f"{op_summary_sep}\n",
+        f"Output File: {tagging_result['output_filepath']}"
+        f"{' (already up to date, not rewritten)' if tagging_result.get('output_unchanged') else ''}\n",
+        f"Number of <paragraph> tags added: {tagging_result['num_tags_added']}\n",
+        f"{op_summary_sep}\n\n"
+    ])
+
+    # 2. Summary of Matching
+    match_summary_title = "Summary of Matching:"
+    match_summary_sep = "-" * len(match_summary_title)
+    matching_summary_lines.extend([
+        f"{match_summary_title}\n",
+        f"{match_summary_sep}\n",
+        f"Total English reference paragraphs processed: {tagging_result['num_ref_paragraphs']}\n",
+        f"Successfully matched and tagged: {tagging_result['num_successful_matches']}\n",
+    ])
+    if tagging_result.get("match_mode") == MATCH_FUZZY:
+        matching_summary_lines.append(
+            f"  of which matched by similarity (fuzzy, up to {tagging_result['fuzzy_tolerance']:.0%} of words differing): "
+            f"{tagging_result['num_fuzzy_matches']}\n"
+        )
+    if tagging_result["num_last_word_mismatches"] > 0:
+        matching_summary_lines.append(
+            f"Word count matches with last word mismatch (not tagged): {tagging_result['num_last_word_mismatches']}\n"
+        )
+    if tagging_result["num_unmatched_ref_paras"] > 0:
+        matching_summary_lines.append(
+            f"Reference paragraphs with no suitable block found: {tagging_result['num_unmatched_ref_paras']}\n"
+        )
+    pairing = tagging_result.get("pairing")
+    if pairing is not None and pairing.num_issues():
+        issue_counts = ", ".join(f"{kind.replace('_', ' ')}: {pairing.counts[kind]}" for kind in PAIRING_ISSUE_KINDS
+                                 if pairing.counts[kind])
+        matching_summary_lines.append(
+            f"Bilingual line pairing issues (see Detailed Log): {pairing.num_issues()} ({issue_counts})\n"
+        )
+    if tagging_result["num_tags_added"] == 0 and tagging_result["num_ref_paragraphs"] > 0 and tagging_result["num_successful_matches"] == 0:
+        matching_summary_lines.append(
+            "(No English paragraphs from the reference file could be matched and tagged based on criteria.)\n"
+        )
+    matching_summary_lines.append(f"{match_summary_sep}\n\n")
+
+    # 3. Detailed Log Header
+    log_header_title = "Detailed Log:"
+    log_header_sep = "-" * len(log_header_title)
+    detailed_log_header.extend([
+        f"{log_header_title}\n",
+        f"{log_header_sep}\n"
+    ])
+
+    return overall_summary_lines + matching_summary_lines + detailed_log_header
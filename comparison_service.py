@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import comparer_engine as engine
+from document_cache import DEFAULT_MEMORY_BUDGET_BYTES, DocumentCache
+
+# Local comparison service: a long-running process that answers word comparison,
+# punctuation comparison and tagging requests over HTTP on a loopback address or a
+# Unix socket, so editor plugins and scripts pay for interpreter start-up and file
+# parsing once instead of on every check.
+#
+# Every request runs on a worker thread against one shared DocumentCache; a file is
+# parsed again only when it changed on disk. Differences and tagging steps are
+# streamed back as JSON Lines (the records of report_writers.py plus "progress",
+# "result" and "error" lines) in a chunked response while the engine produces them.
+#
+#   POST /words        {"bilingual": path, "english": path, "mode": "align"}
+#   POST /punctuation  {"bilingual": path, "english": path, "punctuation_class": "ascii"}
+#   POST /tag          {"bilingual": path, "english": path, "match": "exact", "write": true}
+#   POST /invalidate   {"path": path}  (every document when path is left out)
+#   GET  /status
+#
+# Instead of the two paths, "folder" names a folder holding BilingualText.txt and
+# EnglishText.txt. Options can also be given as query parameters, and "stats": true
+# adds per-stage timings to the result line. Closing the connection cancels the run.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+MAX_REQUEST_BYTES = 64 * 1024 # Requests only carry paths and options
+STREAM_BATCH_RECORDS = 256 # Records sent per chunk while a run is producing them quickly
+STREAM_FLUSH_SECONDS = 0.1 # Longest a record waits for its chunk
+STREAM_QUEUE_CHUNKS = 16 # Chunks buffered per response before the worker waits for the client
+PROGRESS_MIN_INTERVAL_SECONDS = 0.25
+
+_DONE = object() # Ends the chunk queue of a response
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large"}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _StreamWriter:
+    # Record writer (as in report_writers.py) used on the worker thread. Records are
+    # batched into chunks for the response; waiting on the bounded chunk queue keeps
+    # a slow client from piling up results in memory.
+    def __init__(self, loop, chunks, cancel_event):
+        self.loop = loop
+        self.chunks = chunks
+        self.cancel_event = cancel_event
+        self.num_records = 0
+        self._batch = []
+        self._last_send = time.monotonic()
+        self._last_progress = 0.0
+
+    def write(self, record):
+        self._batch.append(json.dumps(record, ensure_ascii=False))
+        self.num_records += 1
+        if len(self._batch) >= STREAM_BATCH_RECORDS or time.monotonic() - self._last_send >= STREAM_FLUSH_SECONDS:
+            self._send()
+
+    def progress(self, label, done, total):
+        # Engine progress callback; also where a closed connection cancels the run
+        if self.cancel_event.is_set():
+            raise engine.OperationCancelled(label)
+        now = time.monotonic()
+        if now - self._last_progress < PROGRESS_MIN_INTERVAL_SECONDS and (total is None or done < total):
+            return
+        self._last_progress = now
+        self._batch.append(json.dumps({"type": "progress", "label": label, "done": done, "total": total}))
+        self._send()
+
+    def _send(self):
+        if self.cancel_event.is_set():
+            raise engine.OperationCancelled("client disconnected")
+        self._put(("\n".join(self._batch) + "\n").encode('utf-8'))
+        self._batch = []
+        self._last_send = time.monotonic()
+
+    def _put(self, item):
+        asyncio.run_coroutine_threadsafe(self.chunks.put(item), self.loop).result()
+
+    def close(self):
+        # Always reaches the response, cancelled or not, so it can finish
+        if self._batch:
+            self._put(("\n".join(self._batch) + "\n").encode('utf-8'))
+            self._batch = []
+        self._put(_DONE)
+
+
+def _pair_paths(params):
+    for name in ("folder", "bilingual", "english"):
+        if params.get(name) is not None and not isinstance(params[name], str):
+            raise RequestError(400, f"\"{name}\" must be a path string")
+    folder = params.get("folder")
+    bilingual_path = params.get("bilingual") or (folder and os.path.join(folder, engine.BILINGUAL_DEFAULT_NAME))
+    english_path = params.get("english") or (folder and os.path.join(folder, engine.ENGLISH_DEFAULT_NAME))
+    if not bilingual_path or not english_path:
+        raise RequestError(400, "Give \"bilingual\" and \"english\" file paths, or a \"folder\" holding both files")
+    return bilingual_path, english_path
+
+
+def _choice(params, name, choices, default):
+    value = params.get(name, default)
+    if value not in choices:
+        raise RequestError(400, f"\"{name}\" must be one of {', '.join(choices)}")
+    return value
+
+
+def _flag(params, name, default):
+    value = params.get(name, default)
+    if isinstance(value, str): # From the query string
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+class ComparisonService:
+    def __init__(self, document_cache=None, workers=DEFAULT_WORKERS):
+        self.document_cache = document_cache if document_cache is not None else DocumentCache()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="comparison-service")
+        self.num_running = 0
+        self.num_served = 0
+        self._operations = {
+            "/words": self._run_words,
+            "/punctuation": self._run_punctuation,
+            "/tag": self._run_tagging,
+        }
+
+    # --- Operations (worker threads) ---
+    # Each checks its options up front, so bad requests get a 400 before streaming
+    # starts, and returns run(writer) -> result dict
+
+    def _run_words(self, params):
+        bilingual_path, english_path = _pair_paths(params)
+        mode = _choice(params, "mode", engine.WORD_DIFF_MODES, engine.WORD_DIFF_ALIGN)
+
+        def run(writer, stats):
+            result = engine.run_word_comparison(bilingual_path, english_path, mode=mode, document_cache=self.document_cache,
+                                                progress=writer.progress, stats=stats, record_writer=writer)
+            return {key: result[key] for key in ("mode", "bilingual_word_count", "english_word_count", "num_differences")}
+        return "Compare English Words", run
+
+    def _run_punctuation(self, params):
+        bilingual_path, english_path = _pair_paths(params)
+        punctuation_class = _choice(params, "punctuation_class", engine.PUNCTUATION_CLASSES, engine.PUNCTUATION_ASCII)
+
+        def run(writer, stats):
+            result = engine.run_punctuation_comparison(bilingual_path, english_path, document_cache=self.document_cache,
+                                                       progress=writer.progress, punctuation_class=punctuation_class,
+                                                       stats=stats, record_writer=writer)
+            return {key: result[key] for key in ("punctuation_class", "bilingual_punctuation_count",
+                                                 "english_punctuation_count", "num_differences")}
+        return "Compare Punctuation", run
+
+    def _run_tagging(self, params):
+        bilingual_path, english_path = _pair_paths(params)
+        match_mode = _choice(params, "match", engine.MATCH_MODES, engine.MATCH_EXACT)
+        try:
+            fuzzy_tolerance = float(params.get("fuzzy_tolerance", engine.FUZZY_TOLERANCE))
+        except (TypeError, ValueError):
+            raise RequestError(400, "\"fuzzy_tolerance\" must be a number") from None
+        write = _flag(params, "write", True)
+
+        def run(writer, stats):
+            tagging_result = engine.plan_paragraph_tagging(bilingual_path, english_path, document_cache=self.document_cache,
+                                                           progress=writer.progress, stats=stats, record_writer=writer,
+                                                           keep_log=False, match_mode=match_mode,
+                                                           fuzzy_tolerance=fuzzy_tolerance)
+            if write:
+                engine.write_tagged_file(tagging_result, stats)
+            summary = {key: tagging_result[key] for key in ("num_tags_added", "num_ref_paragraphs", "num_successful_matches",
+                                                             "num_fuzzy_matches", "num_last_word_mismatches",
+                                                             "num_unmatched_ref_paras", "match_mode", "output_filepath")}
+            summary["written"] = write and not tagging_result["output_unchanged"]
+            summary["pairing_issues"] = tagging_result["pairing"].num_issues()
+            return summary
+        return "Tag Paragraphs", run
+
+    def _execute(self, description, run, writer, collect_stats):
+        stats = engine.RunStats(description) if collect_stats else None
+        try:
+            summary = run(writer, stats)
+            if stats is not None:
+                summary["stats"] = stats.as_dict()
+            writer.write({"type": "result", "operation": description, **summary})
+        except engine.OperationCancelled:
+            pass
+        except engine.InputFileError as e:
+            writer.write({"type": "error", "title": e.title, "message": str(e)})
+        except Exception as e:
+            writer.write({"type": "error", "title": f"{description} failed", "message": str(e)})
+        finally:
+            writer.close()
+
+    def status(self):
+        cache = self.document_cache
+        return {
+            "documents": cache.num_documents(),
+            "cache_bytes": cache.total_bytes(),
+            "cache_budget_bytes": cache.memory_budget_bytes,
+            "vocabulary_words": len(cache.vocabulary),
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+            "running": self.num_running,
+            "served": self.num_served,
+            "pid": os.getpid(),
+        }
+
+    # --- HTTP (event loop) ---
+
+    async def handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, params = await self._read_request(reader)
+                await self._dispatch(method, path, params, writer)
+            except RequestError as e:
+                await self._send_json(writer, e.status, {"type": "error", "message": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise RequestError(413, "Request headers too large") from None
+        request_line, *header_lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise RequestError(400, "Malformed request line") from None
+        headers = {}
+        for header_line in header_lines:
+            name, _, value = header_line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        # Browsers send Origin with cross-site requests; a web page must not be able to
+        # drive this service (editor plugins and scripts do not send it)
+        if "origin" in headers:
+            raise RequestError(403, "Cross-origin requests are not accepted")
+
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise RequestError(400, "Malformed Content-Length header") from None
+        if length < 0:
+            raise RequestError(400, "Malformed Content-Length header")
+        if length > MAX_REQUEST_BYTES:
+            raise RequestError(413, f"Request body over {MAX_REQUEST_BYTES} bytes")
+        if length:
+            body = await reader.readexactly(length)
+            try:
+                body_params = json.loads(body)
+            except ValueError:
+                raise RequestError(400, "Request body is not valid JSON") from None
+            if not isinstance(body_params, dict):
+                raise RequestError(400, "Request body must be a JSON object")
+            params.update(body_params)
+        return method, url.path, params
+
+    async def _dispatch(self, method, path, params, writer):
+        if path == "/status":
+            await self._send_json(writer, 200, self.status())
+            return
+        if method != "POST":
+            raise RequestError(405 if path in self._operations or path == "/invalidate" else 404,
+                               f"{method} {path} is not supported")
+        if path == "/invalidate":
+            if params.get("path") is not None and not isinstance(params["path"], str):
+                raise RequestError(400, "\"path\" must be a path string")
+            self.document_cache.invalidate(params.get("path"))
+            await self._send_json(writer, 200, {"type": "result", "documents": self.document_cache.num_documents()})
+            return
+        operation = self._operations.get(path)
+        if operation is None:
+            raise RequestError(404, f"Unknown operation {path}")
+        description, run = operation(params)
+        await self._stream(description, run, _flag(params, "stats", False), writer)
+
+    async def _stream(self, description, run, collect_stats, writer):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(STREAM_QUEUE_CHUNKS)
+        cancel_event = threading.Event()
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8\r\n"
+                     b"Transfer-Encoding: chunked\r\nCache-Control: no-store\r\nConnection: close\r\n\r\n")
+        self.num_running += 1
+        future = loop.run_in_executor(self.executor, self._execute, description, run,
+                                      _StreamWriter(loop, chunks, cancel_event), collect_stats)
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is _DONE:
+                    break
+                if cancel_event.is_set():
+                    continue # Drained until the worker notices
+                try:
+                    writer.write(b"%X\r\n%s\r\n" % (len(chunk), chunk))
+                    await writer.drain()
+                except ConnectionError:
+                    cancel_event.set()
+            try:
+                await future
+            except engine.OperationCancelled:
+                pass # Cancelled while reporting a result or error
+            if not cancel_event.is_set():
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        finally:
+            self.num_running -= 1
+            self.num_served += 1
+
+    async def _send_json(self, writer, status, payload):
+        body = (json.dumps(payload, ensure_ascii=False) + "\n").encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+
+def is_local_host(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, on_ready=None):
+    # Runs until cancelled; on_ready(description) is called once the socket listens
+    if unix_socket is not None:
+        server = await asyncio.start_unix_server(service.handle_connection, unix_socket, limit=MAX_REQUEST_BYTES)
+        os.chmod(unix_socket, 0o600) # Owner only
+        where = unix_socket
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_REQUEST_BYTES)
+        where = "http://{}:{}".format(*server.sockets[0].getsockname()[:2])
+    if on_ready is not None:
+        on_ready(where)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if unix_socket is not None and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Serve word comparison, punctuation comparison and paragraph tagging to local clients, keeping "
+                    "parsed documents in memory between requests."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Loopback address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT}; 0 picks a free one)")
+    parser.add_argument("--unix-socket", metavar="PATH", help="Listen on a Unix socket at PATH instead of TCP")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Requests run at the same time (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_MEMORY_BUDGET_BYTES // (1024 * 1024),
+                        help="Memory budget for parsed documents in MB (default: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.unix_socket is None and not is_local_host(args.host):
+        print(f"Refusing to listen on {args.host}: only loopback addresses are allowed", file=sys.stderr)
+        return 2
+    if args.unix_socket is not None and not hasattr(asyncio, "start_unix_server"):
+        print("Unix sockets are not available on this platform", file=sys.stderr)
+        return 2
+
+    service = ComparisonService(DocumentCache(args.cache_mb * 1024 * 1024), max(1, args.workers))
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_socket,
+                          lambda where: print(f"Comparison service listening on {where} (Ctrl+C to stop)", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Could not start the service: {e}", file=sys.stderr)
+        return 2
+    finally:
+        service.executor.shutdown(wait=False, cancel_futures=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+import run_stats
+import text_streams
+from punctuation_scanner import PUNCTUATION_ASCII
+from run_stats import measure_stage, timed
+from script_classifier import PairingReport
+from token_arrays import TokenVocabulary, TokenWords
+
+# Parsed-document cache shared by Compare Words, Compare Punctuation and Tag Paragraphs.
+# A document is parsed once and reused until the file changes on disk (size or mtime)
+# or it is evicted to stay under the memory budget (least recently used first).
+# Words are stored as token ids over one vocabulary shared by all documents of a
+# cache, so the ids of any two cached documents can be compared directly.
+#
+# The vocabulary counts against the memory budget too. Evicting documents does not
+# shrink it, so it is replaced by an empty one whenever the cache runs empty, and
+# when it outgrows VOCABULARY_MAX_SHARE of the budget, which drops every document
+# (they hold ids into the old one). Documents already handed out keep the vocabulary
+# they were parsed with.
+
+DOC_BILINGUAL = "bilingual" # English lines of a bilingual file
+DOC_ENGLISH = "english" # Every line of an English reference file
+
+DEFAULT_MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+VOCABULARY_MAX_SHARE = 0.25 # Of the memory budget, before the vocabulary is rebuilt
+
+# Rough per-object costs used for the memory estimate (CPython, 64-bit)
+_LIST_SLOT_BYTES = 8
+_TOKEN_ID_BYTES = 4
+_PUNCTUATION_ENTRY_BYTES = 64 + 3 * _LIST_SLOT_BYTES
+# Per distinct word: the str, its dict entry, its list slot and three array items
+_VOCABULARY_WORD_BYTES = 56 + 3 * _LIST_SLOT_BYTES + _LIST_SLOT_BYTES + 3 * _TOKEN_ID_BYTES
+
+
+class ParsedDocument:
+    def __init__(self, path, kind, size, mtime_ns, vocabulary):
+        self.path = path
+        self.kind = kind
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.lines = [] # Extracted English lines, without line endings
+        self.original_indices = array('I') # 0-based line number of each entry in lines
+        self.line_word_counts = array('I')
+        self.line_last_words = []
+        self.vocabulary = vocabulary
+        self.token_ids = array('I') # Cleaned tokens of the whole document, as ids in vocabulary
+        self.folded_ids = array('I') # Ids of the same tokens in lower case
+        self.punctuation = [] # (char, line, column) in the extracted text, ASCII punctuation
+        self.pairing = None # PairingReport of a bilingual file
+        self.approx_bytes = 0
+
+    @property
+    def words(self):
+        return TokenWords(self.token_ids, self.vocabulary)
+
+    def punctuation_marks(self, punctuation_class=PUNCTUATION_ASCII):
+        # Only the default class is kept; other classes are rescanned from the cached
+        # lines, which needs no file access and is a single regex pass per line.
+        if punctuation_class == PUNCTUATION_ASCII:
+            return self.punctuation
+        return list(text_streams.iter_punctuation_with_location(self._newline_terminated_lines(), punctuation_class))
+
+    def _newline_terminated_lines(self):
+        # Punctuation line numbers are counted over the lines rejoined with "\n",
+        # i.e. over the extracted text
+        return (line_text + "\n" for line_text in self.lines)
+
+    def line_stats(self):
+        # Same layout as comparer_engine.collect_bilingual_english_lines()
+        return {"original_idx": self.original_indices, "word_count": self.line_word_counts, "last_word": self.line_last_words}
+
+
+def parse_document(path, kind, use_mmap=None, progress=None, stats=None, vocabulary=None):
+    stat = os.stat(path)
+    if vocabulary is None:
+        vocabulary = TokenVocabulary()
+    document = ParsedDocument(path, kind, stat.st_size, stat.st_mtime_ns, vocabulary)
+    if stats is not None:
+        stats.add(run_stats.COUNT_BYTES_READ, stat.st_size)
+
+    lines = text_streams.iter_with_progress(text_streams.iter_lines(path, use_mmap), progress, f"{kind} file lines parsed")
+    lines = timed(lines, stats, run_stats.STAGE_READ, run_stats.COUNT_LINES_READ)
+    if kind == DOC_BILINGUAL:
+        document.pairing = PairingReport()
+        indexed_lines = text_streams.iter_bilingual_english_lines(lines, document.pairing)
+    else:
+        indexed_lines = ((original_idx, line_text.rstrip('\n')) for original_idx, line_text in enumerate(lines))
+    indexed_lines = timed(indexed_lines, stats, run_stats.STAGE_EXTRACT, run_stats.COUNT_ENGLISH_LINES)
+
+    line_bytes = 0
+    with measure_stage(stats, run_stats.STAGE_LINE_STATS):
+        for original_idx, line_text in indexed_lines:
+            document.lines.append(line_text)
+            document.original_indices.append(original_idx)
+            document.line_word_counts.append(text_streams.count_words(line_text))
+            document.line_last_words.append(text_streams.get_last_word(line_text))
+            line_bytes += sys.getsizeof(line_text)
+
+    with measure_stage(stats, run_stats.STAGE_TOKENIZE):
+        document.token_ids = vocabulary.encode(text_streams.iter_words(document.lines))
+        document.folded_ids = vocabulary.fold(document.token_ids)
+    with measure_stage(stats, run_stats.STAGE_PUNCTUATION_SCAN):
+        document.punctuation = list(text_streams.iter_punctuation_with_location(document._newline_terminated_lines()))
+
+    document.approx_bytes = (
+        2 * line_bytes # lines and last words (upper bound for the latter)
+        + len(document.lines) * (3 * _LIST_SLOT_BYTES)
+        + 2 * len(document.token_ids) * _TOKEN_ID_BYTES # The shared vocabulary is counted by the cache
+        + len(document.punctuation) * _PUNCTUATION_ENTRY_BYTES
+    )
+    return document
+
+
+class DocumentCache:
+    def __init__(self, memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES, use_mmap=None, vocabulary=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.use_mmap = use_mmap
+        self._documents = OrderedDict() # (abspath, kind) -> ParsedDocument, oldest first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        # Replaced rather than shrunk (see above); ids stay valid for every document handed out
+        self.vocabulary = vocabulary if vocabulary is not None else TokenVocabulary()
+        self._parse_lock = threading.Lock() # Parsing adds words to the vocabulary
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, kind, progress=None, stats=None, vocabulary=None):
+        # With a vocabulary, the document is returned over that one: when the cache's
+        # vocabulary has been replaced since, it is parsed again and not cached
+        key = (os.path.abspath(path), kind)
+        stat = os.stat(path)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None and vocabulary is not None and document.vocabulary is not vocabulary:
+                document = None
+            if document is not None:
+                if document.size == stat.st_size and document.mtime_ns == stat.st_mtime_ns:
+                    self._documents.move_to_end(key)
+                    self.hits += 1
+                    if stats is not None:
+                        stats.add(run_stats.COUNT_CACHE_HITS)
+                    return document
+                self._remove(key) # Changed on disk
+            self.misses += 1
+        if stats is not None:
+            stats.add(run_stats.COUNT_CACHE_MISSES)
+
+        # Parse outside the lock so other documents stay available meanwhile
+        with self._parse_lock:
+            document = parse_document(path, kind, self.use_mmap, progress, stats,
+                                      vocabulary if vocabulary is not None else self.vocabulary)
+        with self._lock:
+            if document.vocabulary is not self.vocabulary: # Replaced meanwhile, or the caller's own
+                return document
+            if key in self._documents:
+                self._remove(key)
+            if document.approx_bytes <= self.memory_budget_bytes:
+                self._documents[key] = document
+                self._total_bytes += document.approx_bytes
+                self._evict_to_budget()
+        return document
+
+    def add(self, document):
+        # Adopts a document parsed elsewhere (e.g. by another process) over this cache's vocabulary
+        if document.vocabulary is not self.vocabulary:
+            raise ValueError("Document was parsed with a different vocabulary")
+        key = (os.path.abspath(document.path), document.kind)
+        with self._lock:
+            if key in self._documents:
+                self._remove(key)
+            self._documents[key] = document
+            self._total_bytes += document.approx_bytes
+            self._evict_to_budget()
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._documents.clear()
+                self._total_bytes = 0
+            else:
+                abspath = os.path.abspath(path)
+                for key in [key for key in self._documents if key[0] == abspath]:
+                    self._remove(key)
+            if not self._documents:
+                self.vocabulary = TokenVocabulary()
+
+    def num_documents(self):
+        return len(self._documents)
+
+    def total_bytes(self):
+        return self._total_bytes + self.vocabulary_bytes()
+
+    def vocabulary_bytes(self):
+        return len(self.vocabulary) * _VOCABULARY_WORD_BYTES
+
+    def _remove(self, key):
+        document = self._documents.pop(key)
+        self._total_bytes -= document.approx_bytes
+
+    def _evict_to_budget(self):
+        vocabulary_bytes = self.vocabulary_bytes()
+        if vocabulary_bytes > VOCABULARY_MAX_SHARE * self.memory_budget_bytes:
+            self._documents.clear()
+            self._total_bytes = 0
+        while self._total_bytes + vocabulary_bytes > self.memory_budget_bytes and self._documents:
+            oldest_key = next(iter(self._documents))
+            self._remove(oldest_key)
+        if not self._documents:
+            self.vocabulary = TokenVocabulary()
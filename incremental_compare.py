@@ -0,0 +1,915 @@
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import count
+
+import comparer_engine as engine
+import parallel_align
+import run_stats
+import text_streams
+import word_diff
+from atomic_output import write_lines_atomically
+from document_cache import DOC_BILINGUAL, DOC_ENGLISH
+from paragraph_matcher import ChunkedLineCounts, EditableBlockIndex
+from punctuation_scanner import PUNCTUATION_ASCII
+from run_stats import measure_stage
+from script_classifier import SCRIPT_BLANK, SCRIPT_ENGLISH, PairingReport, classify_line, line_role
+from tagging_log import LOG_OFF, TaggingLog
+from token_arrays import TokenVocabulary
+
+# Incremental re-comparison for watch mode (watch_mode.py). Both files are kept in
+# memory as lines together with the parse results of their English lines. When a
+# file changes on disk, its new lines are diffed against the previous version and
+# only the changed lines are re-parsed. The word differences, punctuation
+# differences and paragraph matches are then recomputed around the edits and
+# spliced into the previous results, and the tagged file is rewritten when its
+# output changed (first_changed_output_line is the first line of it that did).
+#
+# Results are the same as a fresh run of the engine, except that the alignment word
+# diff is re-aligned only in a window around each edit: the edits found there are a
+# valid script but may be grouped differently from a full alignment.
+
+# Changed line regions up to this size are diffed line by line; larger ones are
+# first split into content-defined chunks (see _diff_by_chunks)
+DIRECT_DIFF_MAX_LINES = 256
+CHUNK_BOUNDARY_MODULUS = 32 # A line whose hash is divisible by this ends a chunk
+CHUNK_MAX_LINES = 256
+_COMPARE_BLOCK_LINES = 4096 # Lines compared per C-level slice comparison
+_COMPARE_BLOCK_ITEMS = 4096 # Words or punctuation marks, likewise
+# Paragraphs are first looked for this many bilingual lines past their search start
+# before the whole block index for their word count is built
+NEAR_SEARCH_LINES = 256
+
+_SCAN_BLOCK_BYTES = 65536
+
+
+def read_text_lines(path):
+    # (lines without line endings, ends_with_newline), split like text_streams.iter_lines()
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    ends_with_newline = lines[-1] == ""
+    if ends_with_newline:
+        lines.pop()
+    return lines, ends_with_newline
+
+
+# --- Changed line ranges ---
+
+def _common_prefix_length(a, b):
+    limit = min(len(a), len(b))
+    start = 0
+    while start < limit:
+        stop = min(start + _COMPARE_BLOCK_LINES, limit)
+        if a[start:stop] != b[start:stop]:
+            break
+        start = stop
+    while start < limit and a[start] == b[start]:
+        start += 1
+    return start
+
+
+def _common_suffix_length(a, b, prefix_length):
+    limit = min(len(a), len(b)) - prefix_length
+    len_a = len(a)
+    len_b = len(b)
+    done = 0
+    while done < limit:
+        step = min(_COMPARE_BLOCK_LINES, limit - done)
+        if a[len_a - done - step:len_a - done] != b[len_b - done - step:len_b - done]:
+            break
+        done += step
+    while done < limit and a[len_a - done - 1] == b[len_b - done - 1]:
+        done += 1
+    return done
+
+
+def diff_lines(old_lines, new_lines):
+    # Changed regions as (old_lo, old_hi, new_lo, new_hi), in order. The unchanged
+    # head and tail are skipped with slice comparisons, so a small edit costs a
+    # memory scan of the file rather than a line-by-line diff.
+    prefix_length = _common_prefix_length(old_lines, new_lines)
+    suffix_length = _common_suffix_length(old_lines, new_lines, prefix_length)
+    old_hi = len(old_lines) - suffix_length
+    new_hi = len(new_lines) - suffix_length
+    if prefix_length == old_hi and prefix_length == new_hi:
+        return []
+    if (old_hi - prefix_length) + (new_hi - prefix_length) <= DIRECT_DIFF_MAX_LINES:
+        return _diff_region(old_lines, new_lines, prefix_length, old_hi, prefix_length, new_hi)
+    return _diff_by_chunks(old_lines, new_lines, prefix_length, old_hi, prefix_length, new_hi)
+
+
+def _diff_region(old_lines, new_lines, old_lo, old_hi, new_lo, new_hi):
+    if old_lo == old_hi or new_lo == new_hi or (old_hi - old_lo) + (new_hi - new_lo) > DIRECT_DIFF_MAX_LINES:
+        return [(old_lo, old_hi, new_lo, new_hi)]
+    return [(old_lo + a_lo, old_lo + a_hi, new_lo + b_lo, new_lo + b_hi)
+            for _, a_lo, a_hi, b_lo, b_hi in word_diff.diff_ranges(old_lines[old_lo:old_hi], new_lines[new_lo:new_hi])]
+
+
+def _chunk_bounds(lines, lo, hi):
+    # Chunk boundaries depend on line content only, so an edit changes the chunks
+    # around it and leaves the others identical on both sides
+    bounds = [lo]
+    for line_idx in range(lo, hi):
+        if hash(lines[line_idx]) % CHUNK_BOUNDARY_MODULUS == 0 or line_idx + 1 - bounds[-1] >= CHUNK_MAX_LINES:
+            bounds.append(line_idx + 1)
+    if bounds[-1] != hi:
+        bounds.append(hi)
+    return bounds
+
+
+def _diff_by_chunks(old_lines, new_lines, old_lo, old_hi, new_lo, new_hi):
+    # Chunks that occur exactly once on each side and in the same order anchor the
+    # two versions; only the gaps between anchors are diffed line by line.
+    old_bounds = _chunk_bounds(old_lines, old_lo, old_hi)
+    new_bounds = _chunk_bounds(new_lines, new_lo, new_hi)
+    old_chunks = {}
+    for chunk_idx in range(len(old_bounds) - 1):
+        key = tuple(old_lines[old_bounds[chunk_idx]:old_bounds[chunk_idx + 1]])
+        old_chunks[key] = -1 if key in old_chunks else chunk_idx
+    new_keys = [tuple(new_lines[new_bounds[chunk_idx]:new_bounds[chunk_idx + 1]]) for chunk_idx in range(len(new_bounds) - 1)]
+    new_counts = {}
+    for key in new_keys:
+        new_counts[key] = new_counts.get(key, 0) + 1
+
+    edits = []
+    old_cursor = old_lo
+    new_cursor = new_lo
+    last_old_chunk = -1
+    for new_chunk, key in enumerate(new_keys):
+        old_chunk = old_chunks.get(key, -1)
+        if old_chunk <= last_old_chunk or new_counts[key] != 1:
+            continue
+        last_old_chunk = old_chunk
+        old_start = old_bounds[old_chunk]
+        new_start = new_bounds[new_chunk]
+        if old_start > old_cursor or new_start > new_cursor:
+            edits.extend(_diff_region(old_lines, new_lines, old_cursor, old_start, new_cursor, new_start))
+        old_cursor = old_bounds[old_chunk + 1]
+        new_cursor = new_bounds[new_chunk + 1]
+    if old_hi > old_cursor or new_hi > new_cursor:
+        edits.extend(_diff_region(old_lines, new_lines, old_cursor, old_hi, new_cursor, new_hi))
+    return edits
+
+
+# --- Documents ---
+
+class IncrementalDocument:
+    # One input file: its lines and the parse results of its English lines (every
+    # line of an English file, the lines in English of a bilingual file), kept per
+    # line so that a changed line range can be replaced in place.
+    def __init__(self, path, kind, punctuation_class=PUNCTUATION_ASCII):
+        self.path = path
+        self.kind = kind
+        self.punctuation_class = punctuation_class
+        self.size = None
+        self.mtime_ns = None
+        self.lines = [] # Without line endings
+        self.ends_with_newline = True
+        # Per line of the file (bilingual only)
+        self.line_scripts = bytearray() # script_classifier.classify_line()
+        self.line_roles = bytearray() # English or Chinese, SCRIPT_BLANK for blank lines
+        self.english_raw_idx = [] # Line of the file holding each English line
+        # Per English line
+        self.word_counts = array('I') # count_words(), as used by the tagger
+        self.last_words = []
+        self.is_paragraph = bytearray() # English file only: a reference paragraph (at least one word)
+        self.token_counts = ChunkedLineCounts()
+        self.marks = [] # (char, line within this line, column) per line; see iter_punctuation_with_location()
+        self.mark_counts = ChunkedLineCounts()
+        self.sub_line_counts = ChunkedLineCounts() # Lines this line counts as for punctuation line numbers
+        # Whole document
+        self.words = [] # Cleaned tokens, as in ParsedDocument.words
+        self.folded_words = [] # The same in lower case, for comparing
+        self.mark_chars = [] # Punctuation characters in order
+
+    def changed_on_disk(self):
+        stat = os.stat(self.path)
+        return stat.st_size != self.size or stat.st_mtime_ns != self.mtime_ns
+
+    def raw_index(self, english_idx):
+        if self.kind == DOC_BILINGUAL:
+            return self.english_raw_idx[english_idx]
+        return english_idx
+
+    def read(self):
+        # Returns (lines, ends_with_newline) and records the size and mtime they belong to
+        try:
+            stat = os.stat(self.path)
+            lines, ends_with_newline = read_text_lines(self.path)
+        except Exception as e:
+            if self.kind == DOC_BILINGUAL:
+                raise engine.InputFileError("Error Reading Bilingual File", f"Could not read or parse bilingual file: {e}") from e
+            raise engine.InputFileError("Error Reading English File", f"Could not read English file: {e}") from e
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        return lines, ends_with_newline
+
+    def apply_line_edits(self, new_lines, line_edits):
+        # Brings self.lines to new_lines given diff_lines(self.lines, new_lines) and
+        # returns one dict per edit with the replaced ranges ((start, old_count,
+        # new_count) in final positions) of lines of the file ("raw"), English lines,
+        # words, punctuation marks and reference paragraphs.
+        edits = []
+        for old_lo, old_hi, new_lo, new_hi in line_edits:
+            edit = self._replace_lines(new_lines, new_lo, old_hi - old_lo, new_hi)
+            edits.append(edit)
+            if edit["raw"][0] + edit["raw"][2] == len(new_lines) and len(self.lines) == len(new_lines):
+                break # Re-parsed to the end of the file
+        return edits
+
+    def _replace_lines(self, new_lines, start, old_count, new_hi):
+        if self.kind != DOC_BILINGUAL:
+            inserted = new_lines[start:new_hi]
+            self.lines[start:start + old_count] = inserted
+            edit = self._replace_english_lines(start, start + old_count, inserted)
+            edit["raw"] = (start, old_count, len(inserted))
+            return edit
+
+        inserted = new_lines[start:new_hi]
+        scripts = bytearray(map(classify_line, inserted))
+        roles, last_role = _resolve_roles(scripts, self._role_before(start))
+        if self._next_role_changes(start + old_count, last_role):
+            # Lines without a clear script take their role from the line before them,
+            # and that changed: re-parse to the end
+            old_count = len(self.lines) - start
+            inserted = new_lines[start:]
+            scripts = bytearray(map(classify_line, inserted))
+            roles, _ = _resolve_roles(scripts, self._role_before(start))
+
+        new_raw_indices = [start + offset for offset, role in enumerate(roles) if role == SCRIPT_ENGLISH]
+        english_texts = [new_lines[raw_idx] for raw_idx in new_raw_indices]
+
+        english_lo = bisect_left(self.english_raw_idx, start)
+        english_hi = bisect_left(self.english_raw_idx, start + old_count)
+        line_delta = len(inserted) - old_count
+        later_raw_indices = self.english_raw_idx[english_hi:]
+        if line_delta:
+            later_raw_indices = [raw_idx + line_delta for raw_idx in later_raw_indices]
+        self.english_raw_idx[english_lo:] = new_raw_indices + later_raw_indices
+
+        self.lines[start:start + old_count] = inserted
+        self.line_scripts[start:start + old_count] = scripts
+        self.line_roles[start:start + old_count] = roles
+        edit = self._replace_english_lines(english_lo, english_hi, english_texts)
+        edit["raw"] = (start, old_count, len(inserted))
+        return edit
+
+    def _role_before(self, raw_idx):
+        for idx in range(raw_idx - 1, -1, -1):
+            if self.line_roles[idx]:
+                return self.line_roles[idx]
+        return None
+
+    def _next_role_changes(self, raw_idx, previous_role):
+        # Whether the first non-blank line from raw_idx on gets a different role after
+        # a line with previous_role
+        for idx in range(raw_idx, len(self.lines)):
+            if self.line_scripts[idx] != SCRIPT_BLANK:
+                return line_role(self.line_scripts[idx], previous_role) != self.line_roles[idx]
+        return False
+
+    def pairing_report(self):
+        pairing = PairingReport()
+        for raw_idx, role in enumerate(self.line_roles):
+            if role:
+                pairing.add(raw_idx, self.line_scripts[raw_idx], role)
+        return pairing.finish()
+
+    def _replace_english_lines(self, lo, hi, texts):
+        words_per_line = list(text_streams.iter_line_words(texts))
+        marks_per_line = [list(text_streams.iter_punctuation_with_location((line_text + "\n",), self.punctuation_class))
+                          for line_text in texts]
+        word_counts = array('I', (text_streams.count_words(line_text) for line_text in texts))
+
+        word_start = self.token_counts.prefix(lo)
+        old_words = self.token_counts.prefix(hi) - word_start
+        mark_start = self.mark_counts.prefix(lo)
+        old_marks = self.mark_counts.prefix(hi) - mark_start
+        paragraph_start = self.is_paragraph.count(1, 0, lo)
+        old_paragraphs = self.is_paragraph.count(1, lo, hi)
+
+        new_words = [word for line_words in words_per_line for word in line_words]
+        new_mark_chars = [mark[0] for line_marks in marks_per_line for mark in line_marks]
+        self.words[word_start:word_start + old_words] = new_words
+        self.folded_words[word_start:word_start + old_words] = [word.lower() for word in new_words]
+        self.mark_chars[mark_start:mark_start + old_marks] = new_mark_chars
+        self.word_counts[lo:hi] = word_counts
+        self.last_words[lo:hi] = [text_streams.get_last_word(line_text) for line_text in texts]
+        self.is_paragraph[lo:hi] = bytearray(1 if word_count else 0 for word_count in word_counts)
+        self.token_counts.replace(lo, hi, (len(line_words) for line_words in words_per_line))
+        self.marks[lo:hi] = marks_per_line
+        self.mark_counts.replace(lo, hi, (len(line_marks) for line_marks in marks_per_line))
+        self.sub_line_counts.replace(lo, hi, (len((line_text + "\n").splitlines()) for line_text in texts))
+
+        new_paragraphs = self.is_paragraph.count(1, lo, lo + len(texts))
+        return {
+            "lines": (lo, hi - lo, len(texts)),
+            "words": (word_start, old_words, len(new_words)),
+            "marks": (mark_start, old_marks, len(new_mark_chars)),
+            "paragraphs": (paragraph_start, old_paragraphs, new_paragraphs),
+        }
+
+    def mark_locator(self):
+        # Function mapping a 0-based punctuation occurrence to its (char, line, column)
+        # in the extracted text, as reported by the engine
+        mark_counts = self.mark_counts
+        sub_line_counts = self.sub_line_counts
+
+        def locate(occurrence_idx):
+            line_idx = mark_counts.first_reaching(occurrence_idx + 1) - 1
+            char, sub_line, column = self.marks[line_idx][occurrence_idx - mark_counts.prefix(line_idx)]
+            return char, sub_line_counts.prefix(line_idx) + sub_line, column
+        return locate
+
+
+def _resolve_roles(scripts, previous_role):
+    # (roles, role of the last non-blank line or previous_role) for consecutive lines
+    roles = bytearray(len(scripts))
+    for offset, script in enumerate(scripts):
+        if script != SCRIPT_BLANK:
+            previous_role = roles[offset] = line_role(script, previous_role)
+    return roles, previous_role
+
+
+def _nth_set_position(flags, n):
+    # Index of the (n+1)-th byte equal to 1 in flags, or len(flags) if there are fewer
+    position = 0
+    while position < len(flags):
+        count = flags.count(1, position, position + _SCAN_BLOCK_BYTES)
+        if count > n:
+            break
+        n -= count
+        position += _SCAN_BLOCK_BYTES
+    else:
+        return len(flags)
+    while True:
+        position = flags.index(1, position)
+        if n == 0:
+            return position
+        n -= 1
+        position += 1
+
+
+def _old_to_new(edits):
+    # (old_start, old_count, new_start, new_count) per edit, from the final-position
+    # (start, old_count, new_count) triples returned by apply_line_edits()
+    converted = []
+    delta = 0
+    for start, old_count, new_count in edits:
+        converted.append((start - delta, old_count, start, new_count))
+        delta += new_count - old_count
+    return converted
+
+
+def _position_mapper(edits):
+    # Maps an old position to its new one, or None if it was replaced. edits as
+    # returned by _old_to_new().
+    old_starts = [edit[0] for edit in edits]
+
+    def map_position(position):
+        edit_idx = bisect_right(old_starts, position) - 1
+        if edit_idx < 0:
+            return position
+        old_start, old_count, new_start, new_count = edits[edit_idx]
+        if position < old_start + old_count:
+            return None
+        return position - old_start - old_count + new_start + new_count
+    return map_position
+
+
+def _differing_indices(seq_b, seq_e, lo, hi):
+    # Indices in [lo, hi) where the sequences differ; past the end of the shorter one
+    # every index differs (it is compared against an end marker). Equal stretches are
+    # skipped a block at a time by a C-level slice comparison.
+    common_hi = min(hi, len(seq_b), len(seq_e))
+    found = []
+    for block_lo in range(lo, common_hi, _COMPARE_BLOCK_ITEMS):
+        block_hi = min(block_lo + _COMPARE_BLOCK_ITEMS, common_hi)
+        block_b = seq_b[block_lo:block_hi]
+        block_e = seq_e[block_lo:block_hi]
+        if block_b != block_e:
+            found.extend([idx for idx, item_b, item_e in zip(count(block_lo), block_b, block_e) if item_b != item_e])
+    found.extend(range(max(lo, common_hi), hi))
+    return found
+
+
+def _recompare(differences, seq_b, seq_e, edits):
+    # Updates the sorted list of differing indices after edits ((start, old_count,
+    # new_count) in final positions) to one of the sequences. When an edit changes a
+    # length, every later index is compared again.
+    if not edits:
+        return
+    end = max(len(seq_b), len(seq_e))
+    if any(old_count != new_count for _, old_count, new_count in edits):
+        ranges = [(edits[0][0], end)]
+    else:
+        ranges = [(start, start + new_count) for start, _, new_count in edits]
+    for lo, hi in ranges:
+        pos_lo = bisect_left(differences, lo)
+        pos_hi = len(differences) if hi == end else bisect_left(differences, hi)
+        differences[pos_lo:pos_hi] = _differing_indices(seq_b, seq_e, lo, hi)
+
+
+class _ParagraphMatches:
+    # Outcome of the matcher for each reference paragraph, in order: the bilingual
+    # line the search started from, the matched block (-1 when unmatched) and the
+    # number of blocks rejected for their last word
+    def __init__(self):
+        self.starts = []
+        self.firsts = []
+        self.lasts = []
+        self.rejected = []
+
+    def next_search_start(self, ref_para_idx):
+        if ref_para_idx == 0:
+            return 0
+        if self.lasts[ref_para_idx - 1] >= 0:
+            return self.lasts[ref_para_idx - 1] + 1
+        return self.starts[ref_para_idx - 1]
+
+
+# --- Comparison ---
+
+class IncrementalComparison:
+    # Word comparison, punctuation comparison and paragraph tagging of one file pair,
+    # kept up to date by refresh(). The *_result() methods return the same dicts as
+    # the engine's run_word_comparison(), run_punctuation_comparison() and
+    # plan_paragraph_tagging(), so the engine's formatters apply.
+    def __init__(self, bilingual_path, english_path, word_diff_mode=engine.WORD_DIFF_ALIGN,
+                 punctuation_class=PUNCTUATION_ASCII, write_tagged=True):
+        self.bilingual = IncrementalDocument(bilingual_path, DOC_BILINGUAL, punctuation_class)
+        self.english = IncrementalDocument(english_path, DOC_ENGLISH, punctuation_class)
+        self.word_diff_mode = word_diff_mode
+        self.punctuation_class = punctuation_class
+        self.output_filepath, _ = engine.determine_tagged_output_path(bilingual_path)
+        # The tagged file would replace the file being watched
+        self.write_tagged = write_tagged and os.path.abspath(self.output_filepath) != os.path.abspath(bilingual_path)
+
+        self._aligned = [] # (tag, b_lo, b_hi, e_lo, e_hi) from word_diff.diff_ranges()
+        self._aligned_both_texts = False # Neither word list was empty when aligning
+        self._word_indices = [] # Differing word indices (index mode)
+        self._punctuation_indices = [] # Differing punctuation occurrences, 0-based
+        self._matches = _ParagraphMatches()
+        self._num_successful_matches = 0
+        self._num_last_word_mismatches = 0
+        self._block_index = None
+        self._tagged = bytearray() # Per bilingual line: preceded by a <paragraph> tag
+
+    def load(self, stats=None):
+        # Reads both files and computes everything from scratch
+        self.bilingual = IncrementalDocument(self.bilingual.path, DOC_BILINGUAL, self.punctuation_class)
+        self.english = IncrementalDocument(self.english.path, DOC_ENGLISH, self.punctuation_class)
+        self._matches = _ParagraphMatches()
+        self._num_successful_matches = 0
+        self._num_last_word_mismatches = 0
+        for document in (self.bilingual, self.english):
+            with measure_stage(stats, run_stats.STAGE_READ):
+                lines, document.ends_with_newline = document.read()
+            with measure_stage(stats, run_stats.STAGE_TOKENIZE):
+                document.apply_line_edits(lines, [(0, 0, 0, len(lines))])
+        self._tagged = bytearray(len(self.bilingual.lines))
+        bilingual = self.bilingual
+        english = self.english
+        with measure_stage(stats, run_stats.STAGE_COMPARE):
+            if self.word_diff_mode == engine.WORD_DIFF_ALIGN:
+                self._realign()
+            else:
+                self._word_indices = _differing_indices(bilingual.folded_words, english.folded_words, 0,
+                                                        max(len(bilingual.words), len(english.words)))
+            self._punctuation_indices = _differing_indices(bilingual.mark_chars, english.mark_chars, 0,
+                                                           max(len(bilingual.mark_chars), len(english.mark_chars)))
+        with measure_stage(stats, run_stats.STAGE_MATCH):
+            self._block_index = EditableBlockIndex(self.bilingual.word_counts, self.bilingual.last_words)
+            changed_tags = self._rematch((), (), stats)
+        if self.write_tagged:
+            with measure_stage(stats, run_stats.STAGE_WRITE):
+                self._write_tagged_file(stats)
+        return {"changed_files": [self.bilingual.path, self.english.path], "changed_lines": None,
+                "changed_tags": len(changed_tags), "first_changed_output_line": 1 if self.write_tagged else None}
+
+    def refresh(self, stats=None):
+        # Re-reads whichever file changed on disk and updates the results. Returns None
+        # when neither changed, otherwise a summary of the update.
+        changed = [document for document in (self.bilingual, self.english) if document.changed_on_disk()]
+        if not changed:
+            return None
+        changed_lines = {}
+        changed_tags = set()
+        first_changed_line = None # Bilingual line, with whether it was tagged before
+        first_line_was_tagged = False
+        for document in changed:
+            with measure_stage(stats, run_stats.STAGE_READ):
+                lines, ends_with_newline = document.read()
+            with measure_stage(stats, run_stats.STAGE_EXTRACT):
+                line_edits = diff_lines(document.lines, lines)
+            old_last_line = len(document.lines) - 1
+            if document is self.bilingual and old_last_line >= 0 and (
+                    ends_with_newline != document.ends_with_newline
+                    or (not document.ends_with_newline and line_edits and line_edits[-1][1] > old_last_line)):
+                # The old last line gains or loses its line ending, so the output changes there
+                first_changed_line = old_last_line
+                first_line_was_tagged = bool(self._tagged[old_last_line])
+            document.ends_with_newline = ends_with_newline
+            changed_lines[document.path] = sum(max(old_hi - old_lo, new_hi - new_lo) for old_lo, old_hi, new_lo, new_hi in line_edits)
+            if not line_edits:
+                continue
+            with measure_stage(stats, run_stats.STAGE_TOKENIZE):
+                edits = document.apply_line_edits(lines, line_edits)
+            if stats is not None:
+                stats.add(run_stats.COUNT_LINES_READ, sum(edit["raw"][2] for edit in edits))
+            if document is self.bilingual:
+                for start, old_count, new_count in (edit["raw"] for edit in edits):
+                    if first_changed_line is None or start < first_changed_line:
+                        first_changed_line = start
+                        first_line_was_tagged = old_count > 0 and bool(self._tagged[start])
+                    self._tagged[start:start + old_count] = bytes(new_count)
+            changed_tags |= self._apply_edits(document, edits, stats)
+
+        if changed_tags:
+            first_changed_tag = min(changed_tags)
+            if first_changed_line is None or first_changed_tag <= first_changed_line:
+                first_changed_line = first_changed_tag
+                first_line_was_tagged = False
+        first_changed_output_line = None
+        if self.write_tagged and first_changed_line is not None:
+            with measure_stage(stats, run_stats.STAGE_WRITE):
+                self._write_tagged_file(stats)
+            first_changed_output_line = self._output_line(first_changed_line, first_line_was_tagged)
+        return {
+            "changed_files": [document.path for document in changed],
+            "changed_lines": changed_lines,
+            "changed_tags": len(changed_tags),
+            "first_changed_output_line": first_changed_output_line,
+        }
+
+    def _output_line(self, line_idx, same_tag):
+        # 1-based line of the tagged file where bilingual line line_idx starts: its tag,
+        # or the line itself when it was and still is tagged
+        num_tags = self._tagged.count(1, 0, line_idx)
+        if same_tag and line_idx < len(self._tagged) and self._tagged[line_idx]:
+            num_tags += 1
+        return line_idx + num_tags + 1
+
+    def _apply_edits(self, document, edits, stats):
+        word_edits = [edit["words"] for edit in edits if edit["words"][1] or edit["words"][2]]
+        mark_edits = [edit["marks"] for edit in edits if edit["marks"][1] or edit["marks"][2]]
+        with measure_stage(stats, run_stats.STAGE_COMPARE):
+            if self.word_diff_mode == engine.WORD_DIFF_ALIGN:
+                self._splice_alignment(1 if document is self.bilingual else 3, word_edits)
+            else:
+                _recompare(self._word_indices, self.bilingual.folded_words, self.english.folded_words, word_edits)
+            _recompare(self._punctuation_indices, self.bilingual.mark_chars, self.english.mark_chars, mark_edits)
+
+        with measure_stage(stats, run_stats.STAGE_MATCH):
+            if document is self.bilingual:
+                line_edits = [edit["lines"] for edit in edits if edit["lines"][1] or edit["lines"][2]]
+                if not line_edits:
+                    return set()
+                # The block index is patched where the lines changed; the matcher still
+                # needs the blocks the old lines had around the edits
+                old_block_index = self._block_index.snapshot()
+                word_counts = self.bilingual.word_counts
+                last_words = self.bilingual.last_words
+                for start, old_count, new_count in line_edits:
+                    self._block_index.replace(start, start + old_count, word_counts[start:start + new_count],
+                                              last_words[start:start + new_count])
+                return self._rematch(_old_to_new(line_edits), (), stats, old_block_index)
+            # Edits to blank lines leave every reference paragraph as it was
+            paragraph_edits = [edit["paragraphs"] for edit in edits if edit["paragraphs"][1] or edit["paragraphs"][2]]
+            if not paragraph_edits:
+                return set()
+            return self._rematch((), _old_to_new(paragraph_edits), stats)
+
+    # --- Words ---
+
+    def _realign(self):
+        bilingual_words = self.bilingual.words
+        english_words = self.english.words
+        self._aligned = []
+        self._aligned_both_texts = bool(bilingual_words and english_words)
+        if self._aligned_both_texts:
+            vocabulary = TokenVocabulary()
+            self._aligned = list(parallel_align.diff_ranges_partitioned(vocabulary.fold(vocabulary.encode(bilingual_words)),
+                                                                        vocabulary.fold(vocabulary.encode(english_words)),
+                                                                        vocabulary.hashes))
+
+    def _alignment_window(self, lo_key, start, end):
+        # The aligned edits touching words [start, end) of one side (lo_key 1 for the
+        # bilingual text, 3 for the English one), widened to whole edits, and the
+        # matching range of the other side. Outside the window both texts are equal.
+        edits = self._aligned
+        hi_key = lo_key + 1
+        other_hi_key = 5 - lo_key
+        edit_lo = _first_at_least(edits, hi_key, start)
+        edit_hi = _first_at_least(edits, lo_key, end + 1)
+        before = edits[edit_lo - 1] if edit_lo else None
+        shift_before = before[other_hi_key] - before[hi_key] if before else 0
+        if edit_hi > edit_lo:
+            window_start = min(start, edits[edit_lo][lo_key])
+            window_end = max(end, edits[edit_hi - 1][hi_key])
+            shift_after = edits[edit_hi - 1][other_hi_key] - edits[edit_hi - 1][hi_key]
+        else:
+            window_start, window_end, shift_after = start, end, shift_before
+        return edit_lo, edit_hi, window_start, window_end, window_start + shift_before, window_end + shift_after
+
+    def _splice_alignment(self, lo_key, word_edits):
+        if not word_edits:
+            return
+        bilingual_words = self.bilingual.words
+        english_words = self.english.words
+        if not bilingual_words or not english_words or not self._aligned_both_texts:
+            self._realign()
+            return
+
+        edit_idx = 0
+        while edit_idx < len(word_edits):
+            start, old_count, new_count = word_edits[edit_idx]
+            edit_idx += 1
+            while True:
+                edit_lo, edit_hi, window_start, window_end, other_start, other_end = self._alignment_window(
+                    lo_key, start, start + old_count)
+                delta = new_count - old_count
+                # Edits whose window overlaps the next one are re-aligned together
+                if edit_idx < len(word_edits) and word_edits[edit_idx][0] <= window_end + delta:
+                    next_start, next_old_count, next_new_count = word_edits[edit_idx]
+                    edit_idx += 1
+                    old_count = next_start - delta + next_old_count - start
+                    new_count = next_start + next_new_count - start
+                    continue
+
+                if lo_key == 1:
+                    b_lo, b_hi, e_lo, e_hi = window_start, window_end + delta, other_start, other_end
+                else:
+                    b_lo, b_hi, e_lo, e_hi = other_start, other_end, window_start, window_end + delta
+                window = [(tag, b_lo + a_start, b_lo + a_end, e_lo + b_start, e_lo + b_end)
+                          for tag, a_start, a_end, b_start, b_end in word_diff.diff_ranges(
+                              self.bilingual.folded_words[b_lo:b_hi], self.english.folded_words[e_lo:e_hi])]
+                # A cheaper alignment may pair words of the window with those of a
+                # neighbouring edit across a short equal run: re-align with it included
+                cost = sum(a_hi - a_lo + c_hi - c_lo for _, a_lo, a_hi, c_lo, c_hi in window)
+                edits = self._aligned
+                hi_key = lo_key + 1
+                if edit_lo and window_start - edits[edit_lo - 1][hi_key] <= cost:
+                    widen = start - edits[edit_lo - 1][lo_key]
+                    start -= widen
+                elif edit_hi < len(edits) and edits[edit_hi][lo_key] - window_end <= cost:
+                    widen = edits[edit_hi][hi_key] - (start + old_count)
+                else:
+                    break
+                old_count += widen
+                new_count += widen
+
+            later = self._aligned[edit_hi:]
+            if delta:
+                if lo_key == 1:
+                    later = [(tag, a_lo + delta, a_hi + delta, c_lo, c_hi) for tag, a_lo, a_hi, c_lo, c_hi in later]
+                else:
+                    later = [(tag, a_lo, a_hi, c_lo + delta, c_hi + delta) for tag, a_lo, a_hi, c_lo, c_hi in later]
+            self._aligned[edit_lo:] = window + later
+
+    def word_result(self):
+        bilingual_words = self.bilingual.words
+        english_words = self.english.words
+        if self.word_diff_mode == engine.WORD_DIFF_ALIGN:
+            differences = [engine.aligned_difference(edit_range, bilingual_words, english_words) for edit_range in self._aligned]
+        elif bilingual_words and english_words:
+            differences = [{"index": word_idx,
+                            "bilingual": bilingual_words[word_idx] if word_idx < len(bilingual_words) else engine.END_OF_BILINGUAL_MARKER,
+                            "english": english_words[word_idx] if word_idx < len(english_words) else engine.END_OF_ENGLISH_MARKER}
+                           for word_idx in self._word_indices]
+        else:
+            differences = []
+        return {
+            "mode": self.word_diff_mode,
+            "bilingual_word_count": len(bilingual_words),
+            "english_word_count": len(english_words),
+            "differences": differences,
+            "num_differences": len(differences),
+        }
+
+    def num_word_differences(self):
+        if self.word_diff_mode == engine.WORD_DIFF_ALIGN:
+            return len(self._aligned)
+        return len(self._word_indices) if self.bilingual.words and self.english.words else 0
+
+    # --- Punctuation ---
+
+    def punctuation_result(self):
+        locate_bilingual = self.bilingual.mark_locator()
+        locate_english = self.english.mark_locator()
+        num_bilingual = len(self.bilingual.mark_chars)
+        num_english = len(self.english.mark_chars)
+        differences = []
+        for occurrence_idx in self._punctuation_indices:
+            mark_b = locate_bilingual(occurrence_idx) if occurrence_idx < num_bilingual else None
+            mark_e = locate_english(occurrence_idx) if occurrence_idx < num_english else None
+            differences.append({"occurrence": occurrence_idx + 1, "bilingual": mark_b, "english": mark_e,
+                                "reason": engine.punctuation_difference_reason(mark_b, mark_e)})
+        return {
+            "punctuation_class": self.punctuation_class,
+            "bilingual_punctuation_count": num_bilingual,
+            "english_punctuation_count": num_english,
+            "differences": differences,
+            "num_differences": len(differences),
+        }
+
+    def num_punctuation_differences(self):
+        return len(self._punctuation_indices)
+
+    # --- Paragraph tagging ---
+
+    def _first_affected_paragraph(self, line_edits):
+        # A paragraph's outcome depends on the bilingual lines from its search start up
+        # to its match (to the end of the text when unmatched). Those ranges are ordered
+        # and cover the searched text, so the first edit decides.
+        matches = self._matches
+        old_start, old_count = line_edits[0][:2]
+        edit_last = old_start + old_count - 1 if old_count else old_start
+        for ref_para_idx in range(bisect_right(matches.starts, edit_last)):
+            last = matches.lasts[ref_para_idx]
+            if last < 0 or last >= old_start:
+                return ref_para_idx
+        return len(matches.starts)
+
+    def _reused_outcome(self, ref_para_idx, line_edits, map_position, old_block_index, word_count, last_word):
+        # The previous (first, last, rejected) of a paragraph whose search starts where
+        # it did before, when the bilingual edits cannot change it, or None. A match is
+        # kept when no edit falls between the search start and the matched block's
+        # end. An unmatched paragraph stays unmatched unless a block created by the
+        # edits has its last word; only the number of rejected blocks changes.
+        matches = self._matches
+        old_start = matches.starts[ref_para_idx]
+        old_last = matches.lasts[ref_para_idx]
+        if old_last >= 0:
+            if _touches_edits(line_edits, old_start, old_last):
+                return None
+            return map_position(matches.firsts[ref_para_idx]), map_position(old_last), matches.rejected[ref_para_idx]
+
+        new_start = map_position(old_start)
+        last_words = self.bilingual.last_words
+        last_word = last_word.lower()
+        new_blocks = set()
+        old_blocks = set() # A block can overlap several edits
+        for edit_old_start, old_count, edit_new_start, new_count in line_edits:
+            new_blocks.update(self._block_index.blocks_overlapping(word_count, new_start, edit_new_start, new_count))
+            old_blocks.update(old_block_index.blocks_overlapping(word_count, old_start, edit_old_start, old_count))
+        for _, block_last_idx in new_blocks:
+            if last_words[block_last_idx].lower() == last_word:
+                return None
+        return -1, -1, matches.rejected[ref_para_idx] + len(new_blocks) - len(old_blocks)
+
+    def _rematch(self, line_edits, paragraph_edits, stats, old_block_index=None):
+        # Re-runs the matcher from the first reference paragraph the edits can affect
+        # until it is back in step with the previous run: same search start at a
+        # paragraph past every edit. From there on all outcomes are the previous ones.
+        # line_edits are bilingual English-line edits, paragraph_edits reference
+        # paragraph edits, both as (old_start, old_count, new_start, new_count).
+        # Returns the bilingual lines whose tag was added or removed.
+        matches = self._matches
+        num_old = len(matches.starts)
+        resume_from = num_old
+        if paragraph_edits:
+            resume_from = paragraph_edits[0][0]
+        if line_edits:
+            resume_from = min(resume_from, self._first_affected_paragraph(line_edits))
+        map_position = _position_mapper(line_edits)
+        settled_start = 0
+        line_delta = 0
+        if line_edits:
+            old_start, old_count, _, _ = line_edits[-1]
+            settled_start = old_start + max(old_count, 1)
+            line_delta = sum(new_count - old_count for _, old_count, _, new_count in line_edits)
+        settled_paragraph = 0
+        paragraph_delta = 0
+        if paragraph_edits:
+            _, _, new_start, new_count = paragraph_edits[-1]
+            settled_paragraph = new_start + new_count
+            paragraph_delta = sum(new_count - old_count for _, old_count, _, new_count in paragraph_edits)
+
+        english = self.english
+        block_index = self._block_index
+        num_new = english.is_paragraph.count(1)
+        search_start = matches.next_search_start(resume_from)
+        line_idx = _nth_set_position(english.is_paragraph, resume_from)
+        new_starts, new_firsts, new_lasts, new_rejected = [], [], [], []
+        ref_para_idx = resume_from
+        old_resume = num_old
+        while ref_para_idx < num_new:
+            if ref_para_idx >= settled_paragraph:
+                old_idx = ref_para_idx - paragraph_delta
+                if (old_idx < num_old and matches.starts[old_idx] >= settled_start
+                        and map_position(matches.starts[old_idx]) == search_start):
+                    old_resume = old_idx
+                    break
+            line_idx = english.is_paragraph.index(1, line_idx)
+            word_count = english.word_counts[line_idx]
+            last_word = english.last_words[line_idx]
+            outcome = None
+            if line_edits and ref_para_idx < num_old and map_position(matches.starts[ref_para_idx]) == search_start:
+                outcome = self._reused_outcome(ref_para_idx, line_edits, map_position, old_block_index, word_count, last_word)
+            if outcome is None:
+                found = block_index.find_block_near(search_start, word_count, last_word, NEAR_SEARCH_LINES)
+                match, num_rejected = found if found is not None else block_index.find_block(search_start, word_count, last_word)
+                first, last = match if match is not None else (-1, -1)
+                outcome = (first, last, num_rejected)
+            first, last, rejected_count = outcome
+            new_starts.append(search_start)
+            new_firsts.append(first)
+            new_lasts.append(last)
+            new_rejected.append(rejected_count)
+            if last >= 0:
+                search_start = last + 1
+            line_idx += 1
+            ref_para_idx += 1
+
+        bilingual = self.bilingual
+        removed_tags = {bilingual.raw_index(map_position(first)) for first in matches.firsts[resume_from:old_resume]
+                        if first >= 0 and map_position(first) is not None}
+        added_tags = {bilingual.raw_index(first) for first in new_firsts if first >= 0}
+        self._num_successful_matches += len(added_tags) - sum(1 for first in matches.firsts[resume_from:old_resume] if first >= 0)
+        self._num_last_word_mismatches += sum(new_rejected) - sum(matches.rejected[resume_from:old_resume])
+
+        def shifted(positions):
+            if not line_delta:
+                return positions
+            return [position + line_delta if position >= 0 else position for position in positions]
+        matches.starts[resume_from:] = new_starts + shifted(matches.starts[old_resume:])
+        matches.firsts[resume_from:] = new_firsts + shifted(matches.firsts[old_resume:])
+        matches.lasts[resume_from:] = new_lasts + shifted(matches.lasts[old_resume:])
+        matches.rejected[resume_from:] = new_rejected + matches.rejected[old_resume:]
+
+        for raw_idx in removed_tags - added_tags:
+            self._tagged[raw_idx] = 0
+        for raw_idx in added_tags - removed_tags:
+            self._tagged[raw_idx] = 1
+        if stats is not None:
+            stats.add(run_stats.COUNT_MATCH_ATTEMPTS, len(new_starts))
+            stats.add(run_stats.COUNT_CANDIDATES_TRIED, sum(new_rejected) + len(added_tags))
+        return removed_tags ^ added_tags
+
+    def tagging_result(self):
+        num_ref_paragraphs = len(self._matches.starts)
+        tag_indices = {self.bilingual.raw_index(first) for first in self._matches.firsts if first >= 0}
+        return {
+            "bilingual_input_path": self.bilingual.path,
+            "output_filepath": self.output_filepath,
+            "tag_indices": tag_indices,
+            "num_tags_added": len(tag_indices),
+            "num_ref_paragraphs": num_ref_paragraphs,
+            "num_successful_matches": self._num_successful_matches,
+            "num_last_word_mismatches": self._num_last_word_mismatches,
+            "num_unmatched_ref_paras": num_ref_paragraphs - self._num_successful_matches,
+            "pairing": self.bilingual.pairing_report(),
+            "log": TaggingLog(LOG_OFF),
+            "use_mmap": None,
+        }
+
+    def num_tags(self):
+        return self._num_successful_matches
+
+    def _write_tagged_file(self, stats=None):
+        # Writes the whole tagged file through a temporary file that replaces it when
+        # complete (see atomic_output.py), like a full run does. Rewriting in place from
+        # the first changed line would be cheaper, but stopping watch mode during the
+        # write would then leave a file that is half old and half new.
+        written, num_bytes = write_lines_atomically(self.output_filepath, self._iter_tagged_lines(), skip_unchanged=False)
+        if stats is not None:
+            stats.add(run_stats.COUNT_LINES_WRITTEN, len(self.bilingual.lines) + self._tagged.count(1))
+            stats.add(run_stats.COUNT_BYTES_WRITTEN, num_bytes)
+
+    def _iter_tagged_lines(self):
+        # The untagged lines between two tags are joined in one piece
+        lines = self.bilingual.lines
+        tagged = self._tagged
+        start_idx = 0
+        while start_idx < len(lines):
+            if tagged[start_idx]:
+                yield "<paragraph>\n"
+            end_idx = tagged.find(1, start_idx + 1)
+            if end_idx < 0:
+                end_idx = len(lines)
+            text = "\n".join(lines[start_idx:end_idx])
+            yield text if end_idx == len(lines) and not self.bilingual.ends_with_newline else text + "\n"
+            start_idx = end_idx
+
+
+def _touches_edits(line_edits, lo, hi):
+    # Whether any edit replaced lines in [lo, hi] or inserted lines before one of them
+    for old_start, old_count, _, _ in line_edits:
+        edit_last = old_start + old_count - 1 if old_count else old_start
+        if old_start <= hi and edit_last >= lo:
+            return True
+    return False
+
+
+def _first_at_least(edits, key, value):
+    # First position in edits whose edits[pos][key] >= value (that field is sorted)
+    lo = 0
+    hi = len(edits)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if edits[mid][key] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
@@ -0,0 +1,325 @@
+import argparse
+import fnmatch
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from array import array
+
+import comparer_engine as engine
+import text_streams
+from atomic_output import file_digest
+from paragraph_matcher import TokenHasher
+
+# Persistent index of an English reference library, to find which reference file a
+# bilingual file belongs to without running the comparison against every one of them.
+#
+# Every library file is reduced to two fingerprints, stored in SQLite:
+# - paragraph keys: a hash of each paragraph's word count and cleaned last word, the
+#   same two values paragraph tagging matches on;
+# - shingles: hashes of word n-grams (SHINGLE_WORDS words, cleaned and lower-cased),
+#   of which one in SHINGLE_SAMPLING is kept, chosen by hash value so the same
+#   n-gram is kept in every file.
+# The English lines of a bilingual file get the same shingles, and paragraph keys for
+# every run of up to MAX_BLOCK_LINES lines. Library files are ranked by the share of
+# the bilingual file's shingles they contain, so a chapter still finds the whole book
+# it was taken from; the share of their paragraph keys found is shown next to it.
+# Only shingles get an inverted index (hash -> files); the paragraph keys of a file
+# are one blob in its row, read for the few files whose shingles matched.
+#
+# Files are re-indexed only when their size or modification time changed, and then
+# only if their content did too. The shingles of each file are also kept as one blob
+# in its row, so its old rows can be deleted without a second index over file ids.
+
+INDEX_VERSION = 1
+SHINGLE_WORDS = 4
+SHINGLE_SAMPLING = 8
+MAX_BLOCK_LINES = 12 # Longest run of bilingual lines taken as one paragraph
+DEFAULT_PATTERN = "*.txt"
+DEFAULT_TOP = 10
+MIN_SHARED_SHINGLES = 2 # Files sharing fewer shingles with the query are not listed
+_SHINGLE_MULTIPLIER = 0x9E3779B1
+_SAMPLED_BELOW = (1 << 32) // SHINGLE_SAMPLING # Kept shingles have their top bits clear
+_COMMIT_EVERY_FILES = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    num_paragraphs INTEGER NOT NULL,
+    num_words INTEGER NOT NULL,
+    paragraph_keys BLOB NOT NULL, -- array('I') of its distinct paragraph keys
+    shingles BLOB NOT NULL -- array('I') of the distinct hashes in shingles
+);
+CREATE TABLE IF NOT EXISTS shingles (hash INTEGER NOT NULL, file_id INTEGER NOT NULL, PRIMARY KEY (hash, file_id)) WITHOUT ROWID;
+"""
+
+
+def is_under(path, root):
+    # Whether path is inside the folder root (both absolute), also for "/" or "C:\\"
+    try:
+        return os.path.commonpath([os.path.normcase(root), os.path.normcase(path)]) == os.path.normcase(root)
+    except ValueError: # Different drives
+        return False
+
+
+def paragraph_key(word_count, last_word):
+    return zlib.crc32(f"{word_count} {last_word}".encode('utf-8'))
+
+
+def sampled_shingles(token_hashes):
+    # Distinct sampled n-gram hashes of a token hash sequence, as a set
+    m = _SHINGLE_MULTIPLIER
+    ngrams = zip(*(token_hashes[offset:] for offset in range(SHINGLE_WORDS)))
+    return {shingle for shingle in ((((a * m + b) * m + c) * m + d) & 0xFFFFFFFF for a, b, c, d in ngrams)
+            if shingle < _SAMPLED_BELOW}
+
+
+def fingerprint_reference(path, token_hasher=None):
+    # (paragraph keys, shingles, num_paragraphs, num_words) of an English reference file
+    token_hasher = token_hasher if token_hasher is not None else TokenHasher()
+    paragraphs = engine.collect_reference_paragraphs(text_streams.iter_lines(path), token_hasher)
+    token_hashes = array('I')
+    for paragraph in paragraphs:
+        token_hashes.extend(paragraph["token_hashes"])
+    keys = {paragraph_key(paragraph["word_count"], paragraph["last_word"]) for paragraph in paragraphs}
+    return keys, sampled_shingles(token_hashes), len(paragraphs), sum(paragraph["word_count"] for paragraph in paragraphs)
+
+
+def fingerprint_bilingual(path, token_hasher=None):
+    # (block keys, shingles, num_lines, num_words) of the English lines of a bilingual file
+    token_hasher = token_hasher if token_hasher is not None else TokenHasher()
+    lines = engine.collect_bilingual_english_lines(text_streams.iter_lines(path), token_hasher=token_hasher)
+    word_counts = lines["word_count"]
+    last_words = lines["last_word"]
+    keys = set()
+    for last_idx in range(len(word_counts)):
+        block_words = 0
+        for first_idx in range(last_idx, max(-1, last_idx - MAX_BLOCK_LINES), -1):
+            block_words += word_counts[first_idx]
+            keys.add(paragraph_key(block_words, last_words[last_idx]))
+    return keys, sampled_shingles(lines["token_hashes"]), len(word_counts), sum(word_counts)
+
+
+class LibraryIndex:
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.connection = sqlite3.connect(index_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, INDEX_VERSION):
+            self.connection.close()
+            raise ValueError(f"{index_path} is a version {version} index; this program reads version {INDEX_VERSION}")
+        self.connection.executescript(_SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # --- Updating ---
+
+    def update(self, root, pattern=DEFAULT_PATTERN, on_file=None):
+        # Brings the index up to date with the files under root matching pattern and
+        # drops indexed files under root that are gone. on_file(path, outcome) is called
+        # for every file that was added, updated, removed or failed. Returns the counts.
+        counts = {"added": 0, "updated": 0, "touched": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        root = os.path.normpath(os.path.abspath(root))
+        indexed = {path: (file_id, size, mtime_ns, digest) for file_id, path, size, mtime_ns, digest in
+                   self.connection.execute("SELECT id, path, size, mtime_ns, digest FROM files")}
+        token_hasher = TokenHasher()
+        num_changed = 0
+        seen = set()
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(fnmatch.filter(filenames, pattern)):
+                path = os.path.join(dirpath, filename)
+                seen.add(path)
+                outcome = self._update_file(path, indexed.get(path), token_hasher)
+                counts[outcome] += 1
+                if outcome != "unchanged":
+                    num_changed += 1
+                    if num_changed % _COMMIT_EVERY_FILES == 0:
+                        self.connection.commit()
+                    if on_file is not None:
+                        on_file(path, outcome)
+        for path, (file_id, *_) in indexed.items():
+            if path not in seen and is_under(path, root):
+                self._remove_file(file_id)
+                counts["removed"] += 1
+                if on_file is not None:
+                    on_file(path, "removed")
+        self.connection.commit()
+        return counts
+
+    def _update_file(self, path, indexed, token_hasher):
+        try:
+            stat = os.stat(path)
+            if indexed is not None and indexed[1] == stat.st_size and indexed[2] == stat.st_mtime_ns:
+                return "unchanged"
+            digest = file_digest(path)
+            if indexed is not None and indexed[3] == digest:
+                self.connection.execute("UPDATE files SET mtime_ns = ? WHERE id = ?", (stat.st_mtime_ns, indexed[0]))
+                return "touched"
+            keys, shingles, num_paragraphs, num_words = fingerprint_reference(path, token_hasher)
+        except (OSError, UnicodeDecodeError):
+            return "failed"
+        if indexed is not None:
+            self._remove_file(indexed[0])
+        cursor = self.connection.execute(
+            "INSERT INTO files (path, size, mtime_ns, digest, num_paragraphs, num_words, paragraph_keys, shingles) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, digest, num_paragraphs, num_words,
+             array('I', sorted(keys)).tobytes(), array('I', sorted(shingles)).tobytes()))
+        file_id = cursor.lastrowid
+        self.connection.executemany("INSERT INTO shingles (hash, file_id) VALUES (?, ?)", ((shingle, file_id) for shingle in shingles))
+        return "added" if indexed is None else "updated"
+
+    def _remove_file(self, file_id):
+        shingles = array('I')
+        shingles.frombytes(self.connection.execute("SELECT shingles FROM files WHERE id = ?", (file_id,)).fetchone()[0])
+        self.connection.executemany("DELETE FROM shingles WHERE hash = ? AND file_id = ?", ((shingle, file_id) for shingle in shingles))
+        self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    # --- Matching ---
+
+    def match(self, bilingual_path, top=DEFAULT_TOP):
+        # Returns {"num_lines", "num_words", "num_shingles", "fingerprint_seconds",
+        # "lookup_seconds", "candidates": [...]}, the best top library files first
+        start = time.perf_counter()
+        keys, shingles, num_lines, num_words = fingerprint_bilingual(bilingual_path)
+        fingerprint_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        shared_shingles = self._count_shared(shingles)
+        file_ids = [file_id for file_id, num_shared in shared_shingles.items() if num_shared >= MIN_SHARED_SHINGLES]
+        if not shingles: # Too short for shingles; every file is a candidate for its paragraph keys
+            file_ids = [file_id for file_id, in self.connection.execute("SELECT id FROM files")]
+        candidates = []
+        for file_id in file_ids:
+            path, num_paragraphs, num_file_words, keys_blob, shingles_blob_length = self.connection.execute(
+                "SELECT path, num_paragraphs, num_words, paragraph_keys, length(shingles) FROM files WHERE id = ?",
+                (file_id,)).fetchone()
+            # Few files get this far, so their paragraph keys are matched here rather than in SQL
+            file_keys = array('I')
+            file_keys.frombytes(keys_blob)
+            num_shared_keys = len(keys.intersection(file_keys))
+            if not shingles and not num_shared_keys:
+                continue
+            num_shared = shared_shingles.get(file_id, 0)
+            num_file_shingles = shingles_blob_length // 4
+            candidates.append({
+                "path": path,
+                "shared_shingles": num_shared,
+                "shingle_share": num_shared / len(shingles) if shingles else 0.0, # Of the bilingual file found in this file
+                "coverage": num_shared / num_file_shingles if num_file_shingles else 0.0, # Of this file found in the bilingual file
+                "paragraph_share": num_shared_keys / len(file_keys) if file_keys else 0.0,
+                "num_paragraphs": num_paragraphs,
+                "num_words": num_file_words,
+            })
+        candidates.sort(key=lambda candidate: (-candidate["shingle_share"], -candidate["paragraph_share"], -candidate["coverage"]))
+        return {
+            "num_lines": num_lines,
+            "num_words": num_words,
+            "num_shingles": len(shingles),
+            "fingerprint_seconds": fingerprint_seconds,
+            "lookup_seconds": time.perf_counter() - start,
+            "candidates": candidates[:top],
+        }
+
+    def _count_shared(self, shingles):
+        # {file_id: number of the shingles it contains}, the shingles going through a
+        # temporary table so the lookup walks the primary key of shingles once per hash
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS query_shingles (hash INTEGER PRIMARY KEY)")
+        self.connection.execute("DELETE FROM query_shingles")
+        self.connection.executemany("INSERT INTO query_shingles (hash) VALUES (?)", ((shingle,) for shingle in shingles))
+        shared = dict(self.connection.execute(
+            "SELECT s.file_id, COUNT(*) FROM query_shingles AS q CROSS JOIN shingles AS s ON s.hash = q.hash "
+            "GROUP BY s.file_id"))
+        self.connection.execute("DELETE FROM query_shingles")
+        self.connection.commit()
+        return shared
+
+    def status(self):
+        num_files, num_words = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(num_words), 0) FROM files").fetchone()
+        num_shingles = self.connection.execute("SELECT COUNT(*) FROM shingles").fetchone()[0]
+        return {"files": num_files, "words": num_words, "shingles": num_shingles,
+                "bytes": os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0}
+
+
+def format_matches(bilingual_path, match_result):
+    report_lines = [f"{bilingual_path}: {match_result['num_lines']} English lines, {match_result['num_words']} words, "
+                    f"{match_result['num_shingles']} sampled shingles (fingerprint {match_result['fingerprint_seconds'] * 1000:.0f} ms, "
+                    f"lookup {match_result['lookup_seconds'] * 1000:.0f} ms)\n"]
+    if not match_result["candidates"]:
+        report_lines.append("No library file shares enough text with it.\n")
+        return report_lines
+    report_lines.append(f"{'Rank':>4}  {'Text found':>10}  {'Paragraphs':>10}  {'Coverage':>8}  Reference file\n")
+    for rank, candidate in enumerate(match_result["candidates"], 1):
+        report_lines.append(f"{rank:>4}  {candidate['shingle_share']:>10.1%}  {candidate['paragraph_share']:>10.1%}  "
+                            f"{candidate['coverage']:>8.1%}  {candidate['path']}\n")
+    return report_lines
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Index an English reference library and find the reference files a "
+                                                 "bilingual file belongs to.")
+    parser.add_argument("index", help="SQLite index file (created when missing)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    update_parser = subparsers.add_parser("update", help="Add, re-index and drop library files under a folder")
+    update_parser.add_argument("root", help="Library folder")
+    update_parser.add_argument("--pattern", default=DEFAULT_PATTERN, help=f"File name pattern (default: {DEFAULT_PATTERN})")
+    match_parser = subparsers.add_parser("match", help="List the library files a bilingual file most likely belongs to")
+    match_parser.add_argument("bilingual", nargs="+", help="Bilingual text files")
+    match_parser.add_argument("--top", type=int, default=DEFAULT_TOP, help=f"Files listed per bilingual file (default: {DEFAULT_TOP})")
+    subparsers.add_parser("status", help="Show the size of the index")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    try:
+        index = LibraryIndex(args.index)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Could not open {args.index}: {e}", file=sys.stderr)
+        return 2
+
+    with index:
+        if args.command == "update":
+            if os.path.exists(args.root) and not os.path.isdir(args.root): # A missing folder drops its files
+                print(f"Not a directory: {args.root}", file=sys.stderr)
+                return 2
+            start = time.perf_counter()
+            counts = index.update(args.root, args.pattern, lambda path, outcome: print(f"{outcome:>8}  {path}", flush=True))
+            print(", ".join(f"{count} {outcome}" for outcome, count in counts.items())
+                  + f" in {time.perf_counter() - start:.2f} s")
+            return 2 if counts["failed"] else 0
+        if args.command == "match":
+            exit_status = 0
+            for bilingual_path in args.bilingual:
+                try:
+                    match_result = index.match(bilingual_path, args.top)
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"Could not read {bilingual_path}: {e}", file=sys.stderr)
+                    exit_status = 2
+                    continue
+                sys.stdout.writelines(format_matches(bilingual_path, match_result))
+            return exit_status
+        status = index.status()
+        print(f"{args.index}: {status['files']} files, {status['words']:,} words, {status['shingles']:,} shingles, "
+              f"{status['bytes'] / (1024 * 1024):.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,490 @@
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import nsmallest
+from itertools import accumulate
+
+from text_streams import line_words
+
+# Indexed lookup of bilingual line blocks for paragraph tagging.
+#
+# A block is a run of consecutive English lines from the bilingual file. The
+# tagger looks for the first block starting at or after some line k whose word
+# count equals a reference paragraph's word count W. Every bilingual line holds
+# at least one word, so the prefix sums of the per-line word counts are strictly
+# increasing and each start line has at most one block summing to exactly W:
+# the block ending where prefix[end] == prefix[start] + W.
+
+
+class ParagraphBlockIndex:
+    def __init__(self, line_word_counts, line_last_words):
+        self.num_lines = len(line_word_counts)
+        self.line_last_words = line_last_words
+
+        self.prefix_sums = array('Q', [0])
+        for word_count in line_word_counts:
+            self.prefix_sums.append(self.prefix_sums[-1] + word_count)
+
+        self._blocks_by_word_count = {}
+
+    def _blocks_for_word_count(self, word_count):
+        # All blocks summing to word_count, sorted by start line, plus a lookup from
+        # the lowercased last word of the block's final line to positions in that list.
+        # Built once per distinct word count and reused for every paragraph of that size.
+        blocks = self._blocks_by_word_count.get(word_count)
+        if blocks is not None:
+            return blocks
+
+        prefix_sums = self.prefix_sums
+        block_starts = []
+        block_last_lines = []
+        positions_by_last_word = {}
+        # Two pointers: the block end only ever moves forward as the start does
+        end_idx = 0
+        for start_idx in range(self.num_lines):
+            target = prefix_sums[start_idx] + word_count
+            while end_idx <= self.num_lines and prefix_sums[end_idx] < target:
+                end_idx += 1
+            if end_idx > self.num_lines:
+                break
+            if prefix_sums[end_idx] != target:
+                continue
+            last_line_idx = end_idx - 1
+            positions_by_last_word.setdefault(self.line_last_words[last_line_idx].lower(), []).append(len(block_starts))
+            block_starts.append(start_idx)
+            block_last_lines.append(last_line_idx)
+
+        blocks = (block_starts, block_last_lines, positions_by_last_word)
+        self._blocks_by_word_count[word_count] = blocks
+        return blocks
+
+    def num_indexed_word_counts(self):
+        return len(self._blocks_by_word_count)
+
+    def find_block(self, search_start_idx, word_count, last_word):
+        # Returns (match, rejected). match is (first_line_idx, last_line_idx) of the
+        # first block starting at or after search_start_idx with the given word count
+        # and (case-insensitive) last word, or None. rejected lists, in order, the
+        # blocks with the right word count but another last word that come before it.
+        block_starts, block_last_lines, positions_by_last_word = self._blocks_for_word_count(word_count)
+        first_pos = bisect_left(block_starts, search_start_idx)
+
+        match = None
+        stop_pos = len(block_starts)
+        candidate_positions = positions_by_last_word.get(last_word.lower())
+        if candidate_positions:
+            candidate_idx = bisect_left(candidate_positions, first_pos)
+            if candidate_idx < len(candidate_positions):
+                stop_pos = candidate_positions[candidate_idx]
+                match = (block_starts[stop_pos], block_last_lines[stop_pos])
+
+        rejected = [(block_starts[pos], block_last_lines[pos]) for pos in range(first_pos, stop_pos)]
+        return match, rejected
+
+    def find_block_near(self, search_start_idx, word_count, last_word, max_lines):
+        # Same result as find_block(), found by walking the start lines one by one
+        # instead of indexing every block of this word count. Gives up and returns
+        # None when the answer is not settled within max_lines start lines.
+        prefix_sums = self.prefix_sums
+        last_word = last_word.lower()
+        rejected = []
+        end_idx = search_start_idx + 1
+        stop_idx = min(self.num_lines, search_start_idx + max_lines)
+        for start_idx in range(search_start_idx, stop_idx):
+            target = prefix_sums[start_idx] + word_count
+            end_idx = bisect_left(prefix_sums, target, max(end_idx, start_idx + 1))
+            if end_idx > self.num_lines:
+                return None, rejected # No later start line has a block this large
+            if prefix_sums[end_idx] != target:
+                continue
+            if self.line_last_words[end_idx - 1].lower() == last_word:
+                return (start_idx, end_idx - 1), rejected
+            rejected.append((start_idx, end_idx - 1))
+        if stop_idx == self.num_lines:
+            return None, rejected
+        return None
+
+
+# --- Editable index (watch mode) ---
+# The same blocks over line word counts that change between lookups. Lines are kept
+# in chunks of about CHUNK_LINES, each with its own prefix sums and its position in
+# the whole text, so replacing a range of lines rebuilds only the chunks holding it
+# and the short list of chunk positions. Blocks are indexed per chunk and word
+# count; an edit drops the indexes of the chunks it replaced and of the earlier
+# chunks whose blocks reached into it.
+
+CHUNK_LINES = 256
+
+
+class ChunkedLineCounts:
+    # Per-line counts (and optionally one value per line) with their prefix sums,
+    # kept up to date as line ranges are replaced. Chunk arrays are never changed in
+    # place, so a snapshot() keeps answering for the lines it was taken of.
+    def __init__(self, counts=(), values=None):
+        self.num_lines = 0
+        self.total = 0
+        self._chunk_counts = [] # array('I') per chunk
+        self._chunk_prefix = [] # Prefix sums within the chunk, array('Q') of len + 1
+        self._chunk_values = [] # List per chunk, when values are kept
+        self._line_starts = [] # First line of each chunk
+        self._count_starts = [] # Sum of the counts before each chunk
+        self._count_ends = [] # ... and up to its end
+        self._keep_values = values is not None
+        self.replace(0, 0, counts, values)
+
+    def __len__(self):
+        return self.num_lines
+
+    def snapshot(self):
+        copy = object.__new__(type(self))
+        copy.__dict__.update(self.__dict__)
+        for name in ("_chunk_counts", "_chunk_prefix", "_chunk_values", "_line_starts", "_count_starts", "_count_ends"):
+            setattr(copy, name, list(getattr(self, name)))
+        return copy
+
+    def _chunk_of(self, line_idx):
+        return max(0, bisect_right(self._line_starts, line_idx) - 1)
+
+    def prefix(self, line_idx):
+        # Sum of the counts of lines [0, line_idx), for 0 <= line_idx <= num_lines
+        if line_idx >= self.num_lines:
+            return self.total
+        chunk_idx = self._chunk_of(line_idx)
+        return self._count_starts[chunk_idx] + self._chunk_prefix[chunk_idx][line_idx - self._line_starts[chunk_idx]]
+
+    def first_reaching(self, target, lo=0):
+        # Smallest line_idx >= lo with prefix(line_idx) >= target, or num_lines + 1
+        # (bisect_left over the prefix sums)
+        if target <= 0:
+            return lo
+        chunk_idx = bisect_left(self._count_ends, target)
+        if chunk_idx == len(self._count_ends):
+            return self.num_lines + 1
+        line_idx = self._line_starts[chunk_idx] + bisect_left(self._chunk_prefix[chunk_idx],
+                                                              target - self._count_starts[chunk_idx])
+        return max(lo, line_idx)
+
+    def value(self, line_idx):
+        chunk_idx = self._chunk_of(line_idx)
+        return self._chunk_values[chunk_idx][line_idx - self._line_starts[chunk_idx]]
+
+    def replace(self, lo, hi, counts, values=None):
+        # Replaces lines [lo, hi) with the given counts (and values). Returns the
+        # chunk range (first, old end, new end) that was rebuilt.
+        counts = array('I', counts)
+        values = list(values) if self._keep_values else None
+        if self._chunk_counts:
+            first = self._chunk_of(lo)
+            last = self._chunk_of(hi - 1) if hi > lo else first
+            head = lo - self._line_starts[first]
+            tail = hi - self._line_starts[last]
+            counts = self._chunk_counts[first][:head] + counts + self._chunk_counts[last][tail:]
+            if values is not None:
+                values = self._chunk_values[first][:head] + values + self._chunk_values[last][tail:]
+            old_end = last + 1
+        else:
+            first = old_end = 0
+
+        # Split into pieces of CHUNK_LINES, unless the lines fit into two
+        piece_lines = CHUNK_LINES if len(counts) > 2 * CHUNK_LINES else max(len(counts), 1)
+        piece_starts = range(0, len(counts), piece_lines)
+        new_counts = [counts[start:start + piece_lines] for start in piece_starts]
+        self._chunk_counts[first:old_end] = new_counts
+        self._chunk_prefix[first:old_end] = [array('Q', accumulate(piece, initial=0)) for piece in new_counts]
+        if values is not None:
+            self._chunk_values[first:old_end] = [values[start:start + piece_lines] for start in piece_starts]
+
+        self._line_starts = list(accumulate((len(piece) for piece in self._chunk_counts), initial=0))
+        self.num_lines = self._line_starts.pop()
+        self._count_starts = list(accumulate((prefix[-1] for prefix in self._chunk_prefix), initial=0))
+        self.total = self._count_starts.pop()
+        self._count_ends = self._count_starts[1:] + [self.total] if self._count_starts else []
+        return first, old_end, first + len(new_counts)
+
+
+class EditableBlockIndex(ChunkedLineCounts):
+    # ParagraphBlockIndex over bilingual lines that are edited in place (see
+    # replace()). Lookups return the number of rejected blocks instead of the list.
+    def __init__(self, line_word_counts, line_last_words):
+        self._chunk_blocks = [] # Per chunk: {word count: (starts, lasts, positions by last word, reach)}
+        super().__init__(line_word_counts, line_last_words)
+
+    def snapshot(self):
+        copy = super().snapshot()
+        copy._chunk_blocks = [{} for _ in self._chunk_counts]
+        return copy
+
+    def replace(self, lo, hi, word_counts, last_words):
+        first, old_end, new_end = super().replace(lo, hi, word_counts, last_words)
+        self._chunk_blocks[first:old_end] = [{} for _ in range(first, new_end)]
+        # Earlier chunks keep the blocks that end before the edit
+        for chunk_idx in range(first):
+            blocks = self._chunk_blocks[chunk_idx]
+            if blocks:
+                line_start = self._line_starts[chunk_idx]
+                for word_count in [word_count for word_count, entry in blocks.items() if line_start + entry[3] > lo]:
+                    del blocks[word_count]
+        return first, old_end, new_end
+
+    def num_indexed_word_counts(self):
+        return len(set().union(*self._chunk_blocks))
+
+    def _blocks_for_word_count(self, chunk_idx, word_count):
+        # The blocks starting in one chunk, as line offsets from the chunk's start, with
+        # how many lines from there they depend on (reach)
+        chunk_blocks = self._chunk_blocks[chunk_idx]
+        blocks = chunk_blocks.get(word_count)
+        if blocks is not None:
+            return blocks
+
+        num_starts = len(self._chunk_counts[chunk_idx])
+        prefix_sums = self._chunk_prefix[chunk_idx]
+        # Blocks of the last start lines continue into the following chunks
+        next_idx = chunk_idx + 1
+        if num_starts and next_idx < len(self._chunk_prefix) and prefix_sums[-1] < prefix_sums[num_starts - 1] + word_count:
+            prefix_sums = array('Q', prefix_sums)
+            while next_idx < len(self._chunk_prefix) and prefix_sums[-1] < prefix_sums[num_starts - 1] + word_count:
+                base = prefix_sums[-1]
+                prefix_sums.extend(base + value for value in self._chunk_prefix[next_idx][1:])
+                next_idx += 1
+        num_lines = len(prefix_sums) - 1
+
+        line_start = self._line_starts[chunk_idx]
+        block_starts = []
+        block_last_lines = []
+        positions_by_last_word = {}
+        end_idx = 0
+        for start_idx in range(num_starts):
+            target = prefix_sums[start_idx] + word_count
+            while end_idx <= num_lines and prefix_sums[end_idx] < target:
+                end_idx += 1
+            if end_idx > num_lines:
+                break
+            if prefix_sums[end_idx] != target:
+                continue
+            last_line_idx = end_idx - 1
+            positions_by_last_word.setdefault(self.value(line_start + last_line_idx).lower(), []).append(len(block_starts))
+            block_starts.append(start_idx)
+            block_last_lines.append(last_line_idx)
+
+        # Counts of the lines before end_idx were read; past the end of the text every
+        # later line matters
+        reach = end_idx if end_idx <= num_lines else self.num_lines + 1 - line_start
+        blocks = chunk_blocks[word_count] = (block_starts, block_last_lines, positions_by_last_word, reach)
+        return blocks
+
+    def find_block(self, search_start_idx, word_count, last_word):
+        # (match, number of rejected blocks), as ParagraphBlockIndex.find_block()
+        if search_start_idx >= self.num_lines:
+            return None, 0
+        last_word = last_word.lower()
+        num_rejected = 0
+        chunk_idx = self._chunk_of(search_start_idx)
+        first_start = search_start_idx - self._line_starts[chunk_idx]
+        for chunk_idx in range(chunk_idx, len(self._chunk_counts)):
+            block_starts, block_last_lines, positions_by_last_word, _ = self._blocks_for_word_count(chunk_idx, word_count)
+            first_pos = bisect_left(block_starts, first_start) if first_start else 0
+            candidate_positions = positions_by_last_word.get(last_word)
+            if candidate_positions:
+                candidate_idx = bisect_left(candidate_positions, first_pos)
+                if candidate_idx < len(candidate_positions):
+                    pos = candidate_positions[candidate_idx]
+                    line_start = self._line_starts[chunk_idx]
+                    return (line_start + block_starts[pos], line_start + block_last_lines[pos]), num_rejected + pos - first_pos
+            num_rejected += len(block_starts) - first_pos
+            first_start = 0
+        return None, num_rejected
+
+    def find_block_near(self, search_start_idx, word_count, last_word, max_lines):
+        # (match, number of rejected blocks) or None, as ParagraphBlockIndex.find_block_near()
+        last_word = last_word.lower()
+        num_rejected = 0
+        end_idx = search_start_idx + 1
+        stop_idx = min(self.num_lines, search_start_idx + max_lines)
+        for start_idx in range(search_start_idx, stop_idx):
+            target = self.prefix(start_idx) + word_count
+            end_idx = self.first_reaching(target, max(end_idx, start_idx + 1))
+            if end_idx > self.num_lines:
+                return None, num_rejected
+            if self.prefix(end_idx) != target:
+                continue
+            if self.value(end_idx - 1).lower() == last_word:
+                return (start_idx, end_idx - 1), num_rejected
+            num_rejected += 1
+        if stop_idx == self.num_lines:
+            return None, num_rejected
+        return None
+
+    def blocks_overlapping(self, word_count, search_start_idx, region_start, region_count):
+        # (first, last) lines of the blocks summing to word_count that start at or
+        # after search_start_idx and overlap lines [region_start, region_start +
+        # region_count), or for an empty region span its position
+        first_start = max(search_start_idx, self.first_reaching(self.prefix(region_start) - word_count + 1))
+        for start_idx in range(first_start, min(region_start + region_count, self.num_lines)):
+            target = self.prefix(start_idx) + word_count
+            end_idx = self.first_reaching(target, start_idx + 1)
+            if end_idx <= self.num_lines and self.prefix(end_idx) == target:
+                yield start_idx, end_idx - 1
+
+
+# --- Fuzzy matching ---
+# Finds blocks whose words are close to a reference paragraph's instead of requiring
+# the exact word count and last word, so a typo or a split contraction no longer
+# leaves the paragraph unmatched.
+#
+# Words are compared as CRC-32 hashes of their cleaned lower-case form. Every
+# bilingual line is indexed by a sample of its word-bigram shingles (those whose hash
+# is a multiple of SHINGLE_SAMPLING); a reference paragraph looks up the
+# FINGERPRINT_SIZE smallest of its sampled shingles (a bottom-k MinHash sketch) and
+# takes the nearest few indexed lines at or after the search start as candidates,
+# which keeps each lookup independent of the file size. Blocks around each candidate
+# line with a word count within the tolerance are scored with an edit distance
+# computed only in a band of that width around the diagonal.
+
+FUZZY_TOLERANCE = 0.1 # Largest share of a paragraph's words that may differ in a fuzzy match
+FINGERPRINT_SIZE = 8
+SHINGLE_SAMPLING = 4
+CANDIDATES_PER_SHINGLE = 4 # Lines taken from each shingle's list, nearest first
+_SHINGLE_MULTIPLIER = 0x9E3779B1
+
+
+class _WordHashes(dict):
+    # word -> CRC-32 of the lower-cased word, filled in on first lookup
+    def __missing__(self, word):
+        token_hash = self[word] = zlib.crc32(word.lower().encode('utf-8'))
+        return token_hash
+
+
+class TokenHasher:
+    # CRC-32 of cleaned, lower-cased words, computed once per distinct word
+    def __init__(self):
+        self._lookup = _WordHashes().__getitem__ # Known words never leave C
+
+    def hash_line(self, line_text):
+        return array('I', map(self._lookup, line_words(line_text)))
+
+    def hash_lines(self, lines):
+        # (tokens per line, hashes of all tokens in order)
+        token_counts = array('I')
+        token_hashes = array('I')
+        for line_text in lines:
+            line_hashes = self.hash_line(line_text)
+            token_counts.append(len(line_hashes))
+            token_hashes.extend(line_hashes)
+        return token_counts, token_hashes
+
+
+def _sampled_shingles(token_hashes):
+    if len(token_hashes) == 1:
+        shingles = token_hashes
+    else:
+        shingles = [(first * _SHINGLE_MULTIPLIER + second) & 0xFFFFFFFF
+                    for first, second in zip(token_hashes, token_hashes[1:])]
+    return [shingle for shingle in shingles if shingle % SHINGLE_SAMPLING == 0]
+
+
+def banded_edit_distance(a, b, max_distance):
+    # Levenshtein distance between two sequences if it is at most max_distance, else
+    # None. Only cells within max_distance of the diagonal are computed.
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if a == b:
+        return 0
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo = max(1, i - max_distance)
+        hi = min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= max_distance else too_far
+        item = a[i - 1]
+        row_best = current[0] if lo == 1 else too_far
+        for j in range(lo, hi + 1):
+            cost = previous[j - 1] + (item != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < row_best:
+                row_best = cost
+        if row_best > max_distance:
+            return None
+        previous = current
+    return previous[len(b)] if previous[len(b)] <= max_distance else None
+
+
+class FuzzyBlockIndex:
+    def __init__(self, line_token_counts, token_hashes, tolerance=FUZZY_TOLERANCE):
+        self.num_lines = len(line_token_counts)
+        self.token_hashes = token_hashes
+        self.tolerance = tolerance
+        self.num_blocks_scored = 0
+
+        self.token_starts = array('Q', [0]) # token_starts[i]: tokens before line i
+        for token_count in line_token_counts:
+            self.token_starts.append(self.token_starts[-1] + token_count)
+
+        self._lines_by_shingle = {} # Sampled shingle -> lines holding it, ascending
+        for line_idx in range(self.num_lines):
+            line_hashes = token_hashes[self.token_starts[line_idx]:self.token_starts[line_idx + 1]]
+            for shingle in _sampled_shingles(line_hashes):
+                lines = self._lines_by_shingle.get(shingle)
+                if lines is None:
+                    self._lines_by_shingle[shingle] = [line_idx]
+                elif lines[-1] != line_idx:
+                    lines.append(line_idx)
+
+    def block_similarity(self, first_line_idx, last_line_idx, ref_hashes):
+        # 1 - edit distance / longer length, or None when more words differ than the tolerance allows
+        block_hashes = self.token_hashes[self.token_starts[first_line_idx]:self.token_starts[last_line_idx + 1]]
+        self.num_blocks_scored += 1
+        distance = banded_edit_distance(ref_hashes, block_hashes, int(self.tolerance * len(ref_hashes)))
+        if distance is None:
+            return None
+        return 1 - distance / max(len(ref_hashes), len(block_hashes), 1)
+
+    def candidate_lines(self, search_start_idx, ref_hashes):
+        lines = {search_start_idx} if search_start_idx < self.num_lines else set()
+        for shingle in nsmallest(FINGERPRINT_SIZE, set(_sampled_shingles(ref_hashes))):
+            shingle_lines = self._lines_by_shingle.get(shingle)
+            if shingle_lines:
+                pos = bisect_left(shingle_lines, search_start_idx)
+                lines.update(shingle_lines[pos:pos + CANDIDATES_PER_SHINGLE])
+        return sorted(lines)
+
+    def find_block(self, search_start_idx, ref_hashes, stop_idx=None):
+        # Returns (first_line_idx, last_line_idx, similarity) or None. Candidate lines
+        # are tried in order; the best-scoring block containing the first one that has
+        # a block within the tolerance wins (similarity = 1 - edit distance / longer
+        # length, ties to the earliest and then shortest block). Blocks start at or
+        # after search_start_idx and, with stop_idx, end before it: the lines from
+        # stop_idx on are left to the block found there.
+        if not ref_hashes:
+            return None
+        token_starts = self.token_starts
+        max_distance = int(self.tolerance * len(ref_hashes))
+        min_tokens = len(ref_hashes) - max_distance
+        max_tokens = len(ref_hashes) + max_distance
+        stop_idx = self.num_lines if stop_idx is None else min(stop_idx, self.num_lines)
+        scored = set()
+        for line_idx in self.candidate_lines(search_start_idx, ref_hashes):
+            if line_idx >= stop_idx:
+                break
+            best = None
+            start_idx = line_idx
+            while start_idx >= search_start_idx and token_starts[line_idx + 1] - token_starts[start_idx] <= max_tokens:
+                end_idx = line_idx
+                while end_idx < stop_idx and token_starts[end_idx + 1] - token_starts[start_idx] <= max_tokens:
+                    num_tokens = token_starts[end_idx + 1] - token_starts[start_idx]
+                    if num_tokens >= min_tokens and (start_idx, end_idx) not in scored:
+                        scored.add((start_idx, end_idx))
+                        similarity = self.block_similarity(start_idx, end_idx, ref_hashes)
+                        if similarity is not None:
+                            if best is None or (similarity, -start_idx, -end_idx) > (best[2], -best[0], -best[1]):
+                                best = (start_idx, end_idx, similarity)
+                    end_idx += 1
+                start_idx -= 1
+            if best is not None:
+                return best
+        return None
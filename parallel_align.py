@@ -0,0 +1,138 @@
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+import word_diff
+
+# Anchor-partitioned alignment: splits the two token sequences at anchors, aligns
+# the segments between anchors separately, in a process pool when jobs > 1, and
+# stitches the edits back together.
+#
+# Tokens are integer ids in array('I') (see token_arrays.py) and token_hashes[token] a hash of the
+# token's text that does not depend on how ids were assigned, so the split points,
+# and with them the edits, are the same in every run.
+#
+# An anchor is an n-gram of ANCHOR_NGRAM tokens that occurs exactly once in each
+# sequence, with the same ANCHOR_CONTEXT tokens before and after it in both. Only the
+# longest chain of them that is in order in both sequences is used (patience
+# sorting), about one per SEGMENT_TOKENS tokens. Unless the text around an anchor
+# was moved, a shortest edit script matches it to itself and never edits across it.
+#
+# Between equally short scripts the Myers search picks one depending on the whole
+# input it is given, so splitting cannot reproduce an unsplit run exactly. The split
+# points therefore depend only on the two sequences, never on jobs: every job count,
+# including 1, gives the same edits.
+
+ANCHOR_NGRAM = 6
+ANCHOR_CONTEXT = 8 # Equal tokens required on each side of an anchor
+# Only n-grams starting with one in this many distinct tokens (by text hash) are
+# considered. Equal n-grams start with equal tokens, so the uniqueness counts stay
+# exact while the tables shrink accordingly.
+ANCHOR_SAMPLING = 16
+SEGMENT_TOKENS = 50000 # Target size of a segment, both sequences together
+
+
+def _unique_ngram_starts(tokens, token_hashes, ngram):
+    # {n-gram hash: start} for the sampled n-grams; None for repeated ones
+    starts = {}
+    for idx in range(len(tokens) - ngram + 1):
+        if token_hashes[tokens[idx]] % ANCHOR_SAMPLING:
+            continue
+        key = hash(tuple(tokens[idx:idx + ngram]))
+        starts[key] = None if key in starts else idx
+    return starts
+
+
+def find_anchors(a, b, token_hashes, ngram=ANCHOR_NGRAM, context=ANCHOR_CONTEXT):
+    # Returns [(a_idx, b_idx)] where the anchor n-grams start, increasing in both sequences
+    starts_b = _unique_ngram_starts(b, token_hashes, ngram)
+    candidates = sorted((a_idx, starts_b[key]) for key, a_idx in _unique_ngram_starts(a, token_hashes, ngram).items()
+                        if a_idx is not None and starts_b.get(key) is not None)
+
+    # Longest chain increasing in b (candidates are sorted by a_idx)
+    tails = [] # tails[k]: b_idx ending the best chain of length k + 1 found so far
+    tail_candidates = []
+    previous = [-1] * len(candidates)
+    for candidate_idx, (_, b_idx) in enumerate(candidates):
+        length = bisect_left(tails, b_idx)
+        if length == len(tails):
+            tails.append(b_idx)
+            tail_candidates.append(candidate_idx)
+        else:
+            tails[length] = b_idx
+            tail_candidates[length] = candidate_idx
+        previous[candidate_idx] = tail_candidates[length - 1] if length else -1
+    chain = []
+    candidate_idx = tail_candidates[-1] if tail_candidates else -1
+    while candidate_idx >= 0:
+        chain.append(candidates[candidate_idx])
+        candidate_idx = previous[candidate_idx]
+    chain.reverse()
+
+    # Also rules out n-grams that only share a hash
+    return [(a_idx, b_idx) for a_idx, b_idx in chain
+            if a_idx >= context and b_idx >= context
+            and a[a_idx - context:a_idx + ngram + context] == b[b_idx - context:b_idx + ngram + context]]
+
+
+def split_points(a, b, token_hashes, segment_tokens=SEGMENT_TOKENS):
+    # Anchors about segment_tokens tokens apart; none for inputs below two segments
+    if len(a) + len(b) < 2 * segment_tokens:
+        return []
+    points = []
+    next_split = segment_tokens
+    for a_idx, b_idx in find_anchors(a, b, token_hashes):
+        if a_idx + b_idx >= next_split:
+            points.append((a_idx, b_idx))
+            next_split = a_idx + b_idx + segment_tokens
+    return points
+
+
+def _align_segment(a, b, checkpoint=None):
+    # Runs in a worker process when jobs > 1. The search indexes tokens over and over;
+    # list items are ready-made ints where array items are new objects on every read.
+    return list(word_diff.diff_ranges(a.tolist(), b.tolist(), checkpoint))
+
+
+def diff_ranges_partitioned(a, b, token_hashes, jobs=1, checkpoint=None):
+    # Same form as word_diff.diff_ranges(a, b, checkpoint), aligning the segments
+    # between anchors in up to jobs worker processes. checkpoint() is called during
+    # in-process alignment and as segments complete.
+    points = split_points(a, b, token_hashes)
+    if not points:
+        yield from _align_segment(a, b, checkpoint)
+        return
+
+    bounds = [(0, 0)] + points + [(len(a), len(b))]
+    segments = list(zip(bounds, bounds[1:]))
+    executor = None
+    try:
+        if jobs > 1:
+            executor = ProcessPoolExecutor(max_workers=min(jobs, len(segments)))
+            segment_edits = executor.map(_align_segment,
+                                         (a[a_lo:a_hi] for (a_lo, _), (a_hi, _) in segments),
+                                         (b[b_lo:b_hi] for (_, b_lo), (_, b_hi) in segments))
+        else:
+            segment_edits = (_align_segment(a[a_lo:a_hi], b[b_lo:b_hi], checkpoint)
+                             for (a_lo, b_lo), (a_hi, b_hi) in segments)
+        current = None
+        for ((a_offset, b_offset), _), edits in zip(segments, segment_edits):
+            if checkpoint is not None:
+                checkpoint()
+            for _, a_lo, a_hi, b_lo, b_hi in edits:
+                a_lo += a_offset
+                a_hi += a_offset
+                b_lo += b_offset
+                b_hi += b_offset
+                # Edits meeting at a segment boundary are merged like within a segment
+                if current is not None and current[1] == a_lo and current[3] == b_lo:
+                    current[1] = a_hi
+                    current[3] = b_hi
+                    continue
+                if current is not None:
+                    yield word_diff.tagged_range(current)
+                current = [a_lo, a_hi, b_lo, b_hi]
+        if current is not None:
+            yield word_diff.tagged_range(current)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
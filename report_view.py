@@ -0,0 +1,171 @@
+import tkinter as tk
+from itertools import accumulate
+from tkinter import filedialog, messagebox, scrolledtext
+
+# Paginated results pane. The full report is kept in memory as a list of text chunks;
+# only one page at a time goes into the Text widget, in a single insert, so display
+# time no longer grows with the size of the report.
+
+PAGE_SIZE_CHUNKS = 2000 # Report chunks shown per page
+HIGHLIGHT_TAG = "report_highlight"
+
+
+# --- Page arithmetic (no widgets involved) ---
+
+def num_pages(num_chunks, page_size=PAGE_SIZE_CHUNKS):
+    # An empty report still has one (empty) page
+    return max(1, (num_chunks + page_size - 1) // page_size)
+
+
+def page_of_chunk(chunk_idx, page_size=PAGE_SIZE_CHUNKS):
+    return chunk_idx // page_size
+
+
+def page_chunks(chunks, page, page_size=PAGE_SIZE_CHUNKS):
+    first_chunk = page * page_size
+    return chunks[first_chunk:first_chunk + page_size]
+
+
+def chunk_start_lines(chunks):
+    # Text widget line (1-based) where each chunk starts once the chunks are inserted
+    # as one text
+    return list(accumulate((chunk.count("\n") for chunk in chunks[:-1]), initial=1)) if chunks else []
+
+
+def find_page_with(chunks, query, current_page, page_size=PAGE_SIZE_CHUNKS):
+    # First page after current_page holding query (case-insensitive), wrapping around
+    # to current_page itself last; None when no page holds it
+    query_lower = query.lower()
+    total_pages = num_pages(len(chunks), page_size)
+    for offset in range(1, total_pages + 1):
+        page = (current_page + offset) % total_pages
+        if any(query_lower in chunk.lower() for chunk in page_chunks(chunks, page, page_size)):
+            return page
+    return None
+
+
+class ReportView:
+    def __init__(self, master):
+        self.frame = tk.Frame(master)
+
+        toolbar = tk.Frame(self.frame)
+        toolbar.pack(fill=tk.X)
+        tk.Button(toolbar, text="< Prev Page", command=self.show_previous_page).pack(side=tk.LEFT, padx=2)
+        tk.Button(toolbar, text="Next Page >", command=self.show_next_page).pack(side=tk.LEFT, padx=2)
+        tk.Button(toolbar, text="Next Difference", command=self.jump_to_next_difference).pack(side=tk.LEFT, padx=2)
+        self.search_text = tk.StringVar()
+        search_entry = tk.Entry(toolbar, textvariable=self.search_text, width=16)
+        search_entry.pack(side=tk.LEFT, padx=2)
+        search_entry.bind("<Return>", lambda event: self.find_next())
+        tk.Button(toolbar, text="Find", command=self.find_next).pack(side=tk.LEFT, padx=2)
+        tk.Button(toolbar, text="Save Full Report...", command=self.save_full_report).pack(side=tk.LEFT, padx=2)
+        self.page_label = tk.Label(toolbar, text="")
+        self.page_label.pack(side=tk.RIGHT, padx=5)
+
+        self.text = scrolledtext.ScrolledText(self.frame, wrap=tk.WORD, height=20, width=80)
+        self.text.pack(fill=tk.BOTH, expand=True)
+        self.text.tag_configure(HIGHLIGHT_TAG, background="yellow")
+        # Timings and counters of the run that produced the report
+        self.footer_label = tk.Label(self.frame, text="", anchor=tk.W, justify=tk.LEFT, wraplength=640, fg="gray30")
+        self.footer_label.pack(fill=tk.X)
+
+        self.chunks = []
+        self.difference_starts = [] # Chunk indices where a difference begins
+        self.next_difference_pos = 0
+        self.page = 0
+        self.chunk_lines = [] # chunk_start_lines() of the chunks on the current page
+
+    def pack(self, **pack_options):
+        self.frame.pack(**pack_options)
+
+    def set_report(self, chunks, difference_starts=()):
+        self.chunks = chunks
+        self.difference_starts = list(difference_starts)
+        self.next_difference_pos = 0
+        self.set_footer("")
+        self._show_page(0)
+
+    def set_footer(self, text):
+        self.footer_label.config(text=text)
+
+    def clear(self):
+        self.set_report([])
+
+    def num_pages(self):
+        return num_pages(len(self.chunks))
+
+    def show_next_page(self):
+        if self.page + 1 < self.num_pages():
+            self._show_page(self.page + 1)
+
+    def show_previous_page(self):
+        if self.page > 0:
+            self._show_page(self.page - 1)
+
+    def _show_page(self, page):
+        self.page = page
+        chunks = page_chunks(self.chunks, page)
+        self.chunk_lines = chunk_start_lines(chunks)
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', "".join(chunks))
+        self.text.mark_set(tk.INSERT, '1.0')
+
+        page_text = f"Page {page + 1} of {self.num_pages()}"
+        if self.difference_starts:
+            page_text += f" ({len(self.difference_starts)} differences)"
+        self.page_label.config(text=page_text)
+
+    def _highlight(self, start_index, end_index):
+        self.text.tag_remove(HIGHLIGHT_TAG, '1.0', tk.END)
+        self.text.tag_add(HIGHLIGHT_TAG, start_index, end_index)
+        self.text.mark_set(tk.INSERT, start_index)
+        self.text.see(start_index)
+
+    def jump_to_next_difference(self):
+        if not self.difference_starts:
+            self.text.bell()
+            return
+        if self.next_difference_pos >= len(self.difference_starts):
+            self.next_difference_pos = 0 # Wrap around to the first difference
+        chunk_idx = self.difference_starts[self.next_difference_pos]
+        self.next_difference_pos += 1
+
+        page = page_of_chunk(chunk_idx)
+        if page != self.page:
+            self._show_page(page)
+        line = self.chunk_lines[chunk_idx - page * PAGE_SIZE_CHUNKS]
+        self._highlight(f"{line}.0", f"{line}.end")
+
+    def find_next(self):
+        query = self.search_text.get()
+        if not query:
+            return
+        match_index = self.text.search(query, f"{tk.INSERT}+1c", stopindex=tk.END, nocase=True)
+        if not match_index:
+            # Look through the following pages in memory, then wrap to the current one
+            page = find_page_with(self.chunks, query, self.page)
+            if page is not None:
+                if page != self.page:
+                    self._show_page(page)
+                match_index = self.text.search(query, '1.0', stopindex=tk.END, nocase=True)
+        if not match_index:
+            self.text.bell()
+            return
+        self._highlight(match_index, f"{match_index}+{len(query)}c")
+
+    def save_full_report(self):
+        if not self.chunks:
+            messagebox.showinfo("Nothing to Save", "There is no report to save yet.")
+            return
+        filepath = filedialog.asksaveasfilename(
+            title="Save Full Report",
+            defaultextension=".txt",
+            filetypes=(("Text files", "*.txt"), ("All files", "*.*"))
+        )
+        if not filepath:
+            return
+        try:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.writelines(self.chunks)
+        except Exception as e:
+            messagebox.showerror("Error Saving Report", f"Could not save report to {filepath}: {e}")
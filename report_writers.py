@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import struct
+import sys
+from array import array
+
+# Machine-readable reports. Difference and tagging records are written to disk one at
+# a time as the engine produces them, either as JSON Lines or in a compact binary
+# format with a trailing index for random access (BinaryReportReader).
+#
+# Every record is a flat dict with a "type" key; the fields of each type are listed in
+# RECORD_FIELDS. Line and column numbers are 1-based, token offsets 0-based; None
+# means "not applicable" (e.g. no line for a word past the end of one text).
+
+RECORD_WORD = "word" # Index-by-index word difference
+RECORD_EDIT = "edit" # Aligned word edit (a range of tokens on each side)
+RECORD_PUNCTUATION = "punctuation" # Punctuation sequence difference
+RECORD_PARAGRAPH = "paragraph" # One step of paragraph tagging
+RECORD_PAIRING = "pairing" # Place where the English/Chinese line pairs of the bilingual file break down
+
+REPORT_JSONL = "jsonl"
+REPORT_BINARY = "binary"
+REPORT_FORMATS = (REPORT_JSONL, REPORT_BINARY)
+REPORT_EXTENSIONS = {REPORT_JSONL: ".jsonl", REPORT_BINARY: ".bin"}
+
+# Field name and type: "I" 32-bit and "Q" 64-bit unsigned integers, "s" UTF-8 string
+RECORD_FIELDS = {
+    RECORD_WORD: (
+        ("index", "Q"),
+        ("bilingual", "s"), ("bilingual_line", "I"), ("bilingual_column", "I"),
+        ("english", "s"), ("english_line", "I"), ("english_column", "I"),
+    ),
+    RECORD_EDIT: (
+        ("tag", "s"),
+        ("bilingual_start", "Q"), ("bilingual_end", "Q"), ("bilingual_line", "I"), ("bilingual_column", "I"),
+        ("english_start", "Q"), ("english_end", "Q"), ("english_line", "I"), ("english_column", "I"),
+        ("bilingual", "s"), ("english", "s"),
+    ),
+    RECORD_PUNCTUATION: (
+        ("occurrence", "Q"), ("reason", "s"),
+        ("bilingual_char", "s"), ("bilingual_line", "I"), ("bilingual_column", "I"),
+        ("english_char", "s"), ("english_line", "I"), ("english_column", "I"),
+    ),
+    RECORD_PARAGRAPH: (
+        ("ref_paragraph", "I"), ("ref_line", "I"), ("word_count", "I"), ("last_word", "s"), ("status", "s"),
+        ("bilingual_first_line", "I"), ("bilingual_last_line", "I"), ("bilingual_last_word", "s"),
+    ),
+    RECORD_PAIRING: (
+        ("kind", "s"), ("line", "I"), ("role", "s"),
+    ),
+}
+RECORD_TYPES = tuple(RECORD_FIELDS) # Position in this tuple is the type code in binary files
+
+# Binary layout: MAGIC, then per record a uint32 payload length and the payload (type
+# code byte, the integer fields packed little-endian, then each string as a uint32
+# byte length and its bytes). After the last record come the uint64 offsets of all
+# records and a trailer with the offset of that index, the record count and MAGIC.
+MAGIC = b"EWCRPT01"
+_LENGTH = struct.Struct("<I")
+_TRAILER = struct.Struct("<QQ8s")
+_NONE_VALUES = {"I": 0xFFFFFFFF, "Q": 0xFFFFFFFFFFFFFFFF} # Integers reserved for None
+_NONE_STRING_LENGTH = 0xFFFFFFFF
+
+
+def _compile_layouts():
+    layouts = {}
+    for type_code, record_type in enumerate(RECORD_TYPES):
+        fields = RECORD_FIELDS[record_type]
+        int_fields = [(name, kind) for name, kind in fields if kind != "s"]
+        string_fields = [name for name, kind in fields if kind == "s"]
+        int_struct = struct.Struct("<B" + "".join(kind for _, kind in int_fields))
+        layouts[record_type] = (type_code, int_struct, int_fields, string_fields)
+    return layouts
+
+
+_LAYOUTS = _compile_layouts()
+
+
+class JsonlReportWriter:
+    def __init__(self, path):
+        self.path = path
+        self.num_records = 0
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.num_records += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class BinaryReportWriter:
+    def __init__(self, path):
+        self.path = path
+        self.num_records = 0
+        self._offsets = array('Q') # 8 bytes per record; the records themselves are not kept
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._position = len(MAGIC)
+
+    def write(self, record):
+        type_code, int_struct, int_fields, string_fields = _LAYOUTS[record["type"]]
+        int_values = [type_code]
+        for name, kind in int_fields:
+            value = record.get(name)
+            int_values.append(_NONE_VALUES[kind] if value is None else value)
+        parts = [int_struct.pack(*int_values)]
+        for name in string_fields:
+            value = record.get(name)
+            if value is None:
+                parts.append(_LENGTH.pack(_NONE_STRING_LENGTH))
+            else:
+                encoded = value.encode('utf-8')
+                parts.append(_LENGTH.pack(len(encoded)))
+                parts.append(encoded)
+        payload = b"".join(parts)
+
+        self._offsets.append(self._position)
+        self._file.write(_LENGTH.pack(len(payload)))
+        self._file.write(payload)
+        self._position += _LENGTH.size + len(payload)
+        self.num_records += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._position
+        self._file.write(self._offsets.tobytes() if sys.byteorder == "little" else _byteswapped(self._offsets).tobytes())
+        self._file.write(_TRAILER.pack(index_offset, self.num_records, MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _byteswapped(values):
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped
+
+
+def _decode_payload(payload):
+    record_type = RECORD_TYPES[payload[0]]
+    _, int_struct, int_fields, string_fields = _LAYOUTS[record_type]
+    record = {"type": record_type}
+    int_values = int_struct.unpack_from(payload, 0)
+    for (name, kind), value in zip(int_fields, int_values[1:]):
+        record[name] = None if value == _NONE_VALUES[kind] else value
+    position = int_struct.size
+    for name in string_fields:
+        (length,) = _LENGTH.unpack_from(payload, position)
+        position += _LENGTH.size
+        if length == _NONE_STRING_LENGTH:
+            record[name] = None
+        else:
+            record[name] = payload[position:position + length].decode('utf-8')
+            position += length
+    # Same key order as the JSONL records
+    return {"type": record_type, **{name: record[name] for name, _ in RECORD_FIELDS[record_type]}}
+
+
+class BinaryReportReader:
+    # Random access to a binary report: len(reader), reader[i], iteration
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a binary report")
+        self._file.seek(-_TRAILER.size, os.SEEK_END)
+        index_offset, self.num_records, trailer_magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+        if trailer_magic != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is incomplete (the writer was not closed)")
+        self._file.seek(index_offset)
+        self._offsets = array('Q')
+        self._offsets.frombytes(self._file.read(8 * self.num_records))
+        if sys.byteorder != "little":
+            self._offsets.byteswap()
+
+    def __len__(self):
+        return self.num_records
+
+    def __getitem__(self, record_idx):
+        if record_idx < 0:
+            record_idx += self.num_records
+        if not 0 <= record_idx < self.num_records:
+            raise IndexError("record index out of range")
+        self._file.seek(self._offsets[record_idx])
+        (length,) = _LENGTH.unpack(self._file.read(_LENGTH.size))
+        return _decode_payload(self._file.read(length))
+
+    def __iter__(self):
+        for record_idx in range(self.num_records):
+            yield self[record_idx]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_report_writer(path, report_format):
+    if report_format == REPORT_JSONL:
+        return JsonlReportWriter(path)
+    if report_format == REPORT_BINARY:
+        return BinaryReportWriter(path)
+    raise ValueError(f"Unknown report format: {report_format!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print records of a binary report as JSON Lines.")
+    parser.add_argument("file", help="Binary report written by BinaryReportWriter")
+    parser.add_argument("--start", type=int, default=0, help="First record to print (default: 0)")
+    parser.add_argument("--count", type=int, help="Number of records to print (default: all)")
+    args = parser.parse_args(argv)
+
+    with BinaryReportReader(args.file) as reader:
+        stop = len(reader) if args.count is None else min(len(reader), args.start + args.count)
+        for record_idx in range(args.start, stop):
+            print(json.dumps(reader[record_idx], ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import comparer_engine as engine
+import parallel_align
+import word_diff
+from document_cache import DOC_BILINGUAL, DocumentCache
+
+# One bilingual file against several revisions of its English reference, to find the
+# revision it was translated from. The bilingual file is extracted and tokenized once;
+# each worker process receives the parsed document when it starts and compares it
+# with one revision at a time, so only the English side is parsed per revision.
+#
+# Revisions are ranked by word edit distance (words inserted, deleted or substituted,
+# case-insensitive; see word_edit_distance()), then by punctuation differences, then
+# by the number of reference paragraphs tagging could match.
+
+# The distance is computed between anchors (see parallel_align.py) about this many
+# tokens apart, both sides together, and the diff of each piece may take this many
+# search steps (a revision with one word in ten substituted stays well within it).
+# A piece over budget counts as entirely replaced, so an unrelated revision costs a
+# few seconds instead of hours.
+DISTANCE_SEGMENT_TOKENS = 2000
+EDIT_SEARCH_STEPS = 3000
+
+EXIT_OK = 0
+EXIT_ERRORS = 2
+
+_worker_cache = None # DocumentCache of a worker, holding the bilingual document
+
+
+def _init_worker(bilingual_document):
+    global _worker_cache
+    _worker_cache = DocumentCache(vocabulary=bilingual_document.vocabulary)
+    _worker_cache.add(bilingual_document)
+
+
+class _SearchTooLong(Exception):
+    pass
+
+
+def _segment_distance(a, b):
+    # (distance, num_edits) of one segment, or None when the search runs over budget
+    steps = [0]
+
+    def checkpoint():
+        steps[0] += 1
+        if steps[0] > EDIT_SEARCH_STEPS:
+            raise _SearchTooLong()
+
+    distance = 0
+    num_edits = 0
+    try:
+        for _, a_lo, a_hi, b_lo, b_hi in word_diff.diff_ranges(a.tolist(), b.tolist(), checkpoint):
+            distance += max(a_hi - a_lo, b_hi - b_lo)
+            num_edits += 1
+    except _SearchTooLong:
+        return None
+    return distance, num_edits
+
+
+def word_edit_distance(bilingual_folded, english_folded, token_hashes):
+    # (distance, num_edits, exact) from the alignment diff, a substituted run costing the
+    # longer of its two sides. Segments whose search runs over budget count as entirely
+    # replaced, so the distance is then an upper bound and exact is False.
+    bounds = [(0, 0)] + parallel_align.split_points(bilingual_folded, english_folded, token_hashes, DISTANCE_SEGMENT_TOKENS) \
+        + [(len(bilingual_folded), len(english_folded))]
+    distance = 0
+    num_edits = 0
+    exact = True
+    for (b_lo, e_lo), (b_hi, e_hi) in zip(bounds, bounds[1:]):
+        segment = _segment_distance(bilingual_folded[b_lo:b_hi], english_folded[e_lo:e_hi])
+        if segment is None:
+            distance += max(b_hi - b_lo, e_hi - e_lo)
+            num_edits += 1
+            exact = False
+        else:
+            distance += segment[0]
+            num_edits += segment[1]
+    return distance, num_edits, exact
+
+
+def compare_revision(bilingual_path, english_path, match_mode=engine.MATCH_EXACT, fuzzy_tolerance=engine.FUZZY_TOLERANCE,
+                     punctuation_class=engine.PUNCTUATION_ASCII, document_cache=None):
+    # Runs in a worker process unless document_cache is given. The revision is dropped
+    # from the cache afterwards; only the bilingual document is worth keeping.
+    document_cache = document_cache if document_cache is not None else _worker_cache
+    start = time.perf_counter()
+    summary = {"english_path": english_path, "error": None}
+    try:
+        bilingual_document, english_document = engine.get_documents(document_cache, bilingual_path, english_path)
+        summary["english_word_count"] = len(english_document.token_ids)
+        summary["edit_distance"], summary["num_edits"], summary["distance_exact"] = word_edit_distance(
+            bilingual_document.folded_ids, english_document.folded_ids, english_document.vocabulary.hashes)
+        longer = max(len(bilingual_document.token_ids), len(english_document.token_ids), 1)
+        summary["similarity"] = 1 - summary["edit_distance"] / longer
+
+        punctuation_result = engine.run_punctuation_comparison(bilingual_path, english_path, document_cache=document_cache,
+                                                               punctuation_class=punctuation_class)
+        summary["punctuation_differences"] = punctuation_result["num_differences"]
+
+        tagging_result = engine.plan_paragraph_tagging(bilingual_path, english_path, document_cache=document_cache,
+                                                       keep_log=False, match_mode=match_mode, fuzzy_tolerance=fuzzy_tolerance)
+        summary["num_ref_paragraphs"] = tagging_result["num_ref_paragraphs"]
+        summary["matched_paragraphs"] = tagging_result["num_successful_matches"]
+        summary["unmatched_paragraphs"] = tagging_result["num_unmatched_ref_paras"]
+    except engine.InputFileError as e:
+        summary["error"] = str(e)
+    finally:
+        document_cache.invalidate(english_path)
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def rank_revisions(summaries):
+    # Best first; revisions that could not be compared go last, in their given order
+    compared = sorted((summary for summary in summaries if summary["error"] is None),
+                      key=lambda summary: (summary["edit_distance"], summary["punctuation_differences"],
+                                           -summary["matched_paragraphs"]))
+    return compared + [summary for summary in summaries if summary["error"] is not None]
+
+
+def compare_revisions(bilingual_path, english_paths, jobs=1, match_mode=engine.MATCH_EXACT,
+                      fuzzy_tolerance=engine.FUZZY_TOLERANCE, punctuation_class=engine.PUNCTUATION_ASCII, on_result=None):
+    # Returns (bilingual_document, ranked summaries); on_result(summary) is called as
+    # each revision completes
+    document_cache = DocumentCache()
+    bilingual_document = engine.get_document(document_cache, bilingual_path, DOC_BILINGUAL)
+    options = (match_mode, fuzzy_tolerance, punctuation_class)
+    summaries = []
+    if jobs > 1 and len(english_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(english_paths)), initializer=_init_worker,
+                                 initargs=(bilingual_document,)) as executor:
+            futures = [executor.submit(compare_revision, bilingual_path, english_path, *options)
+                       for english_path in english_paths]
+            for future in futures:
+                summaries.append(future.result())
+                if on_result is not None:
+                    on_result(summaries[-1])
+    else:
+        for english_path in english_paths:
+            summaries.append(compare_revision(bilingual_path, english_path, *options, document_cache=document_cache))
+            if on_result is not None:
+                on_result(summaries[-1])
+    return bilingual_document, rank_revisions(summaries)
+
+
+def format_ranking(bilingual_document, ranked):
+    report_lines = [f"{bilingual_document.path}: {len(bilingual_document.token_ids)} words\n",
+                    f"{'Rank':>4}  {'Edit distance':>13}  {'Similarity':>10}  {'Matched paragraphs':>18}  {'Punctuation':>11}  Revision\n"]
+    for rank, summary in enumerate(ranked, 1):
+        if summary["error"] is not None:
+            report_lines.append(f"{'-':>4}  {'':>13}  {'':>10}  {'':>18}  {'':>11}  {summary['english_path']}: {summary['error']}\n")
+            continue
+        matched = f"{summary['matched_paragraphs']}/{summary['num_ref_paragraphs']}"
+        distance = f"{'' if summary['distance_exact'] else '<= '}{summary['edit_distance']:,}"
+        report_lines.append(f"{rank:>4}  {distance:>13}  {summary['similarity']:>10.1%}  {matched:>18}  "
+                            f"{summary['punctuation_differences']:>11,}  {summary['english_path']}\n")
+    return report_lines
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Compare one bilingual file against several revisions of the English reference and rank them."
+    )
+    parser.add_argument("bilingual", help="Bilingual text file")
+    parser.add_argument("english", nargs="+", help="English reference revisions")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Revisions compared at the same time, one per process (default: all cores)")
+    parser.add_argument("--match", choices=engine.MATCH_MODES, default=engine.MATCH_EXACT,
+                        help="Paragraph matching used to count matched paragraphs (default: exact)")
+    parser.add_argument("--fuzzy-tolerance", type=float, default=engine.FUZZY_TOLERANCE,
+                        help=f"Share of a paragraph's words that may differ in fuzzy matching (default: {engine.FUZZY_TOLERANCE})")
+    parser.add_argument("--punctuation-class", choices=engine.PUNCTUATION_CLASSES, default=engine.PUNCTUATION_ASCII,
+                        help="Characters treated as punctuation (default: ascii)")
+    parser.add_argument("--json", metavar="FILE", help="Also write the ranked results to FILE as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if not os.path.isfile(args.bilingual):
+        print(f"File not found: {args.bilingual}", file=sys.stderr)
+        return EXIT_ERRORS
+
+    start = time.perf_counter()
+    progress = lambda summary: print(f"  compared {summary['english_path']} ({summary['seconds']:.2f} s)", flush=True)
+    try:
+        bilingual_document, ranked = compare_revisions(args.bilingual, args.english, max(1, args.jobs or 1), args.match,
+                                                       args.fuzzy_tolerance, args.punctuation_class, progress)
+    except engine.InputFileError as e:
+        print(f"{e.title}: {e}", file=sys.stderr)
+        return EXIT_ERRORS
+    print()
+    sys.stdout.writelines(format_ranking(bilingual_document, ranked))
+    print(f"\n{len(ranked)} revisions compared in {time.perf_counter() - start:.2f} s")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"bilingual_path": args.bilingual, "revisions": ranked}, f, indent=2)
+        print(f"Ranking written to {args.json}")
+    return EXIT_ERRORS if any(summary["error"] is not None for summary in ranked) else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
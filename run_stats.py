@@ -0,0 +1,153 @@
+import cProfile
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+# Per-stage timing and counters for one run of an operation. Stages nest: time spent
+# in an inner stage (e.g. reading lines pulled by the extraction generator) is charged
+# to the inner stage only, so the stage times add up to the wall time of the run.
+# Engine functions take an optional stats=RunStats() argument next to progress; with
+# stats=None nothing is measured and no wrappers are added.
+
+STAGE_READ = "read"
+STAGE_EXTRACT = "extract"
+STAGE_LINE_STATS = "line stats" # Per-line word counts and last words
+STAGE_TOKENIZE = "tokenize"
+STAGE_PUNCTUATION_SCAN = "punctuation scan"
+STAGE_COMPARE = "compare"
+STAGE_MATCH = "match"
+STAGE_WRITE = "write"
+STAGE_FORMAT = "format report"
+STAGE_RENDER = "render"
+
+COUNT_BYTES_READ = "bytes read"
+COUNT_LINES_READ = "lines read"
+COUNT_ENGLISH_LINES = "English lines"
+COUNT_TOKENS = "tokens"
+COUNT_PUNCTUATION_MARKS = "punctuation marks"
+COUNT_MATCH_ATTEMPTS = "match attempts" # Reference paragraphs looked up
+COUNT_CANDIDATES_TRIED = "candidates tried" # Blocks with the right word count whose last word was checked
+COUNT_BLOCK_INDEXES = "block indexes built" # Distinct paragraph word counts indexed
+COUNT_FUZZY_BLOCKS_SCORED = "fuzzy blocks scored" # Blocks compared word by word in fuzzy matching
+COUNT_CACHE_HITS = "cache hits"
+COUNT_CACHE_MISSES = "cache misses"
+COUNT_LINES_WRITTEN = "lines written"
+COUNT_BYTES_WRITTEN = "bytes written"
+COUNT_UNCHANGED_OUTPUTS = "unchanged outputs" # Output files left as they were because the content was identical
+
+
+class RunStats:
+    def __init__(self, operation=""):
+        self.operation = operation
+        self.stage_seconds = {} # In order of first use
+        self.counters = {}
+        self.profile_path = None # Set when the run was recorded with profile_call()
+        self._stage_stack = []
+        self._mark = 0.0
+
+    def _charge_current_stage(self):
+        now = time.perf_counter()
+        if self._stage_stack:
+            stage = self._stage_stack[-1]
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + now - self._mark
+        self._mark = now
+
+    def enter(self, stage):
+        self._charge_current_stage()
+        self._stage_stack.append(stage)
+
+    def exit(self):
+        self._charge_current_stage()
+        self._stage_stack.pop()
+
+    @contextmanager
+    def stage(self, stage):
+        self.enter(stage)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def add_stage_seconds(self, stage, seconds):
+        # For stages timed outside the run, e.g. rendering on the Tk main thread
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def add(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def total_seconds(self):
+        return sum(self.stage_seconds.values())
+
+    def as_dict(self):
+        return {
+            "operation": self.operation,
+            "total_seconds": self.total_seconds(),
+            "stages": dict(self.stage_seconds),
+            "counters": dict(self.counters),
+            "profile_path": self.profile_path,
+        }
+
+    def format_footer(self):
+        stage_parts = ", ".join(f"{stage} {seconds:.3f} s" for stage, seconds in self.stage_seconds.items())
+        counter_parts = ", ".join(f"{counter}: {amount:,}" for counter, amount in self.counters.items())
+        footer = f"{self.operation}: {self.total_seconds():.3f} s"
+        if stage_parts:
+            footer += f" ({stage_parts})"
+        if counter_parts:
+            footer += f" | {counter_parts}"
+        if self.profile_path is not None:
+            footer += f" | profile saved to {self.profile_path}"
+        return footer
+
+
+def timed(items, stats, stage, counter=None):
+    # Passes items through, charging the time spent producing each one to stage and
+    # adding the number of items to counter. Returns items unchanged when stats is None.
+    if stats is None:
+        return items
+    return _iter_timed(items, stats, stage, counter)
+
+
+def _iter_timed(items, stats, stage, counter):
+    iterator = iter(items)
+    count = 0
+    try:
+        while True:
+            stats.enter(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                stats.exit()
+            count += 1
+            yield item
+    finally:
+        if counter is not None:
+            stats.add(counter, count)
+
+
+def measure_stage(stats, stage):
+    # stats.stage(stage), or a no-op context when stats is None
+    if stats is None:
+        return nullcontext()
+    return stats.stage(stage)
+
+
+def count_file_bytes(stats, *filepaths):
+    if stats is not None:
+        for filepath in filepaths:
+            stats.add(COUNT_BYTES_READ, os.path.getsize(filepath))
+
+
+def profile_call(profile_path, function, *args, **kwargs):
+    # Runs function under cProfile (in the calling thread) and saves the raw profile
+    # to profile_path, readable with pstats or snakeviz. Returns function's result.
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+
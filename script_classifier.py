@@ -0,0 +1,225 @@
+import argparse
+import re
+import sys
+import time
+
+# Script detection for the lines of a bilingual file. Each line is labelled English,
+# Chinese or mixed from the code points it contains, using one table of code point
+# ranges compiled into regex character classes, so a line costs at most a few scans
+# in C. Which lines are English no longer depends on their position: one missing
+# translation no longer turns every later line into the wrong language.
+#
+# Lines with no letters of either script (numbers, symbols, other scripts) and mixed
+# lines are placed by the old alternation rule: after an English line they count as
+# its translation, otherwise as English. PairingReport follows the English/Chinese
+# pairs and records where they break down.
+
+# Line scripts, also used as the role of a non-blank line (English or Chinese)
+SCRIPT_BLANK = 0
+SCRIPT_NEUTRAL = 1 # No Latin letters and no CJK characters
+SCRIPT_ENGLISH = 2
+SCRIPT_CHINESE = 3
+SCRIPT_MIXED = 4
+SCRIPT_NAMES = {SCRIPT_BLANK: "blank", SCRIPT_NEUTRAL: "neutral", SCRIPT_ENGLISH: "English",
+                SCRIPT_CHINESE: "Chinese", SCRIPT_MIXED: "mixed"}
+
+# (first, last, script) code point ranges. Kana, Hangul and full-width forms count as
+# Chinese: they only appear on the translation side of our files.
+SCRIPT_RANGES = (
+    (0x0041, 0x005A, SCRIPT_ENGLISH), # A-Z
+    (0x0061, 0x007A, SCRIPT_ENGLISH), # a-z
+    (0x00C0, 0x00D6, SCRIPT_ENGLISH), # Latin-1 letters (without × and ÷)
+    (0x00D8, 0x00F6, SCRIPT_ENGLISH),
+    (0x00F8, 0x024F, SCRIPT_ENGLISH), # Latin Extended-A and -B
+    (0x1E00, 0x1EFF, SCRIPT_ENGLISH), # Latin Extended Additional
+    (0x1100, 0x11FF, SCRIPT_CHINESE), # Hangul Jamo
+    (0x2E80, 0x2FDF, SCRIPT_CHINESE), # CJK and Kangxi radicals
+    (0x3001, 0x303F, SCRIPT_CHINESE), # CJK Symbols and Punctuation (not the ideographic space)
+    (0x3040, 0x31FF, SCRIPT_CHINESE), # Kana, Bopomofo, CJK strokes
+    (0x3200, 0x9FFF, SCRIPT_CHINESE), # Enclosed CJK, compatibility, Extension A, Unified Ideographs
+    (0xAC00, 0xD7AF, SCRIPT_CHINESE), # Hangul Syllables
+    (0xF900, 0xFAFF, SCRIPT_CHINESE), # CJK Compatibility Ideographs
+    (0xFE30, 0xFE4F, SCRIPT_CHINESE), # CJK Compatibility Forms
+    (0xFF01, 0xFFEF, SCRIPT_CHINESE), # Halfwidth and Fullwidth Forms
+    (0x20000, 0x3FFFF, SCRIPT_CHINESE), # Supplementary and Tertiary Ideographic Planes
+)
+
+# A line with both scripts is mixed when the smaller one has at least this share of
+# the line, counting Latin words against CJK characters (one character is about one
+# word). Below it the line takes the larger script, so a Chinese line quoting an
+# English name is still Chinese.
+MIXED_MIN_SHARE = 0.3
+
+# Pairing issues
+PAIRING_MISSING_CHINESE = "missing_chinese" # English line not followed by a Chinese line
+PAIRING_MISSING_ENGLISH = "missing_english" # Chinese line with no English line before it
+PAIRING_SWAPPED = "swapped" # Chinese line directly before the English line it translates
+PAIRING_MIXED = "mixed" # Mixed-script line, placed by its position
+PAIRING_ISSUE_KINDS = (PAIRING_MISSING_CHINESE, PAIRING_MISSING_ENGLISH, PAIRING_SWAPPED, PAIRING_MIXED)
+PAIRING_ISSUES_KEPT = 1000 # Issues listed per report; all of them are counted
+
+
+def _character_class(script):
+    return "[" + "".join(f"{re.escape(chr(first))}-{re.escape(chr(last))}"
+                         for first, last, range_script in SCRIPT_RANGES if range_script == script) + "]"
+
+
+_latin_search = re.compile(_character_class(SCRIPT_ENGLISH)).search
+_latin_words = re.compile(_character_class(SCRIPT_ENGLISH) + "+").findall
+_cjk_search = re.compile(_character_class(SCRIPT_CHINESE)).search
+_cjk_runs = re.compile(_character_class(SCRIPT_CHINESE) + "+").findall
+
+
+def classify_line(line_text):
+    # Pure English and pure Chinese lines are settled with one or two searches; only
+    # lines with both scripts are counted
+    if line_text.isascii() or _cjk_search(line_text) is None: # isascii() takes constant time
+        if _latin_search(line_text):
+            return SCRIPT_ENGLISH
+        return SCRIPT_NEUTRAL if line_text.strip() else SCRIPT_BLANK
+    if _latin_search(line_text) is None:
+        return SCRIPT_CHINESE
+    num_cjk = sum(map(len, _cjk_runs(line_text)))
+    num_latin = len(_latin_words(line_text))
+    if min(num_cjk, num_latin) >= MIXED_MIN_SHARE * (num_cjk + num_latin):
+        return SCRIPT_MIXED
+    return SCRIPT_CHINESE if num_cjk > num_latin else SCRIPT_ENGLISH
+
+
+def line_role(script, previous_role):
+    # English or Chinese for a non-blank line, given the role of the non-blank line before it
+    if script == SCRIPT_ENGLISH or script == SCRIPT_CHINESE:
+        return script
+    return SCRIPT_CHINESE if previous_role == SCRIPT_ENGLISH else SCRIPT_ENGLISH
+
+
+def iter_classified_lines(lines):
+    # (original_idx, line_text, script, role) for every non-blank line
+    role = None
+    classify = classify_line
+    for original_idx, line_text in enumerate(lines):
+        script = classify(line_text)
+        if script == SCRIPT_BLANK:
+            continue
+        role = line_role(script, role)
+        yield original_idx, line_text, script, role
+
+
+class PairingReport:
+    # Fed the non-blank lines in order with add(), then finish(). An English line pairs
+    # with the Chinese line after it; a Chinese line just before an otherwise unpaired
+    # English line is taken as its swapped translation.
+    def __init__(self, max_issues=PAIRING_ISSUES_KEPT):
+        self.max_issues = max_issues
+        self.counts = dict.fromkeys(PAIRING_ISSUE_KINDS, 0)
+        self.issues = [] # {"kind", "line" (1-based), "role"} for the first max_issues issues
+        self.num_pairs = 0
+        self.line_counts = dict.fromkeys((SCRIPT_NEUTRAL, SCRIPT_ENGLISH, SCRIPT_CHINESE, SCRIPT_MIXED), 0)
+        self._english_idx = None # Latest English line, still waiting for its translation
+        self._chinese_idx = None # Chinese line that had no English line before it
+
+    def num_issues(self):
+        return sum(self.counts.values())
+
+    def _issue(self, kind, original_idx, role):
+        self.counts[kind] += 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append({"kind": kind, "line": original_idx + 1, "role": role})
+
+    def add(self, original_idx, script, role):
+        self.line_counts[script] += 1
+        if script == SCRIPT_MIXED:
+            self._issue(PAIRING_MIXED, original_idx, role)
+        if role == SCRIPT_ENGLISH:
+            self._close_english()
+            self._english_idx = original_idx
+        elif self._english_idx is not None:
+            if self._chinese_idx is not None:
+                self._issue(PAIRING_MISSING_ENGLISH, self._chinese_idx, SCRIPT_CHINESE)
+                self._chinese_idx = None
+            self._english_idx = None
+            self.num_pairs += 1
+        else:
+            if self._chinese_idx is not None:
+                self._issue(PAIRING_MISSING_ENGLISH, self._chinese_idx, SCRIPT_CHINESE)
+            self._chinese_idx = original_idx
+
+    def _close_english(self):
+        # The pending English line gets no Chinese line after it
+        if self._english_idx is None:
+            return
+        if self._chinese_idx is not None:
+            self._issue(PAIRING_SWAPPED, self._chinese_idx, SCRIPT_CHINESE)
+            self._chinese_idx = None
+            self.num_pairs += 1
+        else:
+            self._issue(PAIRING_MISSING_CHINESE, self._english_idx, SCRIPT_ENGLISH)
+        self._english_idx = None
+
+    def finish(self):
+        self._close_english()
+        if self._chinese_idx is not None:
+            self._issue(PAIRING_MISSING_ENGLISH, self._chinese_idx, SCRIPT_CHINESE)
+            self._chinese_idx = None
+        return self
+
+
+def format_pairing_issue(issue):
+    if issue["kind"] == PAIRING_MISSING_CHINESE:
+        return f"Line {issue['line']}: English line without a Chinese line after it"
+    if issue["kind"] == PAIRING_MISSING_ENGLISH:
+        return f"Line {issue['line']}: Chinese line without an English line before it"
+    if issue["kind"] == PAIRING_SWAPPED:
+        return f"Line {issue['line']}: Chinese line comes before its English line"
+    return f"Line {issue['line']}: mixed English/Chinese line, taken as {SCRIPT_NAMES[issue['role']]} from its position"
+
+
+def check_pairing(lines, max_issues=PAIRING_ISSUES_KEPT):
+    report = PairingReport(max_issues)
+    for original_idx, _, script, role in iter_classified_lines(lines):
+        report.add(original_idx, script, role)
+    return report.finish()
+
+
+def measure_throughput(text, repeat=3):
+    # Returns (megabytes_per_second, report) for classifying and pairing the lines of
+    # text, best of repeat runs, against the UTF-8 size of the text
+    lines = text.splitlines()
+    num_bytes = len(text.encode('utf-8'))
+    best_seconds = None
+    report = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        report = check_pairing(lines)
+        elapsed = time.perf_counter() - start
+        if best_seconds is None or elapsed < best_seconds:
+            best_seconds = elapsed
+    megabytes_per_second = (num_bytes / (1024 * 1024)) / best_seconds if best_seconds else float('inf')
+    return megabytes_per_second, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify the lines of a bilingual file by script and report where the "
+                                                 "English/Chinese pairing breaks down.")
+    parser.add_argument("file", help="UTF-8 bilingual text file")
+    parser.add_argument("--max-issues", type=int, default=PAIRING_ISSUES_KEPT,
+                        help=f"Number of pairing issues listed (default: {PAIRING_ISSUES_KEPT})")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of timed runs; the best is reported")
+    args = parser.parse_args(argv)
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    megabytes_per_second, report = measure_throughput(text, args.repeat)
+    report.issues = report.issues[:args.max_issues]
+    for issue in report.issues:
+        print(format_pairing_issue(issue))
+    line_counts = ", ".join(f"{count} {SCRIPT_NAMES[script]}" for script, count in report.line_counts.items())
+    issue_counts = ", ".join(f"{kind} {count}" for kind, count in report.counts.items() if count)
+    print(f"{args.file}: {line_counts} lines, {report.num_pairs} pairs, "
+          f"{report.num_issues()} pairing issues{' (' + issue_counts + ')' if issue_counts else ''}, "
+          f"{megabytes_per_second:.1f} MB/s")
+    return 1 if report.num_issues() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
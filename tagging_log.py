@@ -0,0 +1,85 @@
+import gzip
+from collections import deque
+from heapq import merge
+
+# Detailed log of paragraph tagging. Messages are recorded as a format template and
+# its arguments and only formatted when shown or spilled, at one of three levels:
+# summary (a few lines per run), paragraph (one attempt and outcome per reference
+# paragraph) and candidate (also every block that was looked at and turned down).
+# Records above the log's level are never built: the matcher checks enabled() once
+# per run, so the candidate trace costs nothing unless it is asked for.
+#
+# Summary records are always kept. Of the others only the latest max_records stay in
+# memory for display; with a spill_path every record is also written, formatted, to a
+# gzip-compressed text file, so the full log survives the ring buffer.
+
+LOG_OFF = -1
+LOG_SUMMARY = 0
+LOG_PARAGRAPH = 1
+LOG_CANDIDATE = 2
+LOG_LEVELS = (LOG_SUMMARY, LOG_PARAGRAPH, LOG_CANDIDATE)
+LOG_LEVEL_NAMES = {LOG_SUMMARY: "summary", LOG_PARAGRAPH: "paragraph", LOG_CANDIDATE: "candidate"}
+LOG_LEVEL_BY_NAME = {name: level for level, name in LOG_LEVEL_NAMES.items()}
+
+LOG_BUFFER_RECORDS = 100000 # Non-summary records kept for display (50 report pages)
+SPILL_BATCH_RECORDS = 4096 # Formatted records joined per write to the spill file
+
+
+class TaggingLog:
+    def __init__(self, level=LOG_PARAGRAPH, max_records=LOG_BUFFER_RECORDS, spill_path=None):
+        self.level = level
+        self.spill_path = spill_path
+        self.num_records = 0 # Everything recorded, kept or not
+        self._summary = [] # (sequence number, level, template, args)
+        self._recent = deque(maxlen=max_records)
+        self._spill_file = gzip.open(spill_path, 'wt', encoding='utf-8') if spill_path is not None else None
+        self._spill_batch = []
+
+    def enabled(self, level):
+        return level <= self.level
+
+    def add(self, level, template, *args):
+        # template is a str.format() template taking args, ending in a newline
+        if level > self.level:
+            return
+        record = (self.num_records, level, template, args)
+        self.num_records += 1
+        if level == LOG_SUMMARY:
+            self._summary.append(record)
+        else:
+            self._recent.append(record)
+        if self._spill_file is not None:
+            self._spill_batch.append(template.format(*args))
+            if len(self._spill_batch) >= SPILL_BATCH_RECORDS:
+                self._flush_spill()
+
+    def num_dropped(self):
+        return self.num_records - len(self._summary) - len(self._recent)
+
+    def messages(self):
+        # Formatted kept records in order, with a note where dropped records were
+        messages = []
+        num_dropped = self.num_dropped()
+        for _, level, template, args in merge(self._summary, self._recent):
+            if num_dropped and level != LOG_SUMMARY:
+                where = f", the full log is in {self.spill_path}" if self.spill_path is not None else ""
+                messages.append(f"... {num_dropped:,} earlier log records not kept{where} ...\n")
+                num_dropped = 0
+            messages.append(template.format(*args))
+        return messages
+
+    def _flush_spill(self):
+        self._spill_file.write("".join(self._spill_batch))
+        self._spill_batch = []
+
+    def close(self):
+        if self._spill_file is not None:
+            self._flush_spill()
+            self._spill_file.close()
+            self._spill_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
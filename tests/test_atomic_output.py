@@ -0,0 +1,76 @@
+import os
+import stat
+
+import pytest
+
+import atomic_output
+from atomic_output import file_digest, write_lines_atomically
+
+LINES = ["<paragraph>\n", "The cat sat on the mat.\n", "猫坐在垫子上。\n", "no final newline"]
+
+
+def _expected_bytes(lines):
+    return "".join(lines).replace("\n", os.linesep).encode('utf-8')
+
+
+def test_writes_lines_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(atomic_output, "WRITE_BATCH_LINES", 3)
+    path = tmp_path / "out.txt"
+    lines = [f"line {line_idx}\n" for line_idx in range(10)]
+    assert write_lines_atomically(str(path), iter(lines)) == (True, len(_expected_bytes(lines)))
+    assert path.read_bytes() == _expected_bytes(lines)
+    assert file_digest(str(path)) is not None and file_digest(str(tmp_path / "missing.txt")) is None
+
+
+def test_unchanged_content_keeps_the_target(tmp_path):
+    path = tmp_path / "out.txt"
+    write_lines_atomically(str(path), LINES)
+    os.utime(path, ns=(10 ** 9, 10 ** 9))
+    before = os.stat(path)
+
+    assert write_lines_atomically(str(path), LINES) == (False, len(_expected_bytes(LINES)))
+    after = os.stat(path)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert os.listdir(tmp_path) == ["out.txt"]
+
+    # Without skip_unchanged, or with other content, the file is replaced
+    assert write_lines_atomically(str(path), LINES, skip_unchanged=False)[0] is True
+    assert os.stat(path).st_mtime_ns != before.st_mtime_ns
+    assert write_lines_atomically(str(path), LINES[:-1])[0] is True
+    assert path.read_bytes() == _expected_bytes(LINES[:-1])
+
+
+def test_failing_line_source_leaves_the_old_target(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_bytes(b"old content\n")
+
+    def failing_lines():
+        yield from LINES
+        raise RuntimeError("parse error")
+    with pytest.raises(RuntimeError):
+        write_lines_atomically(str(path), failing_lines())
+    assert path.read_bytes() == b"old content\n"
+    assert os.listdir(tmp_path) == ["out.txt"] # No .out.txt.PID.N.tmp left behind
+
+
+def test_temporary_file_is_named_after_the_target(tmp_path, monkeypatch):
+    seen = []
+    replace = os.replace
+
+    def recording_replace(source, destination):
+        seen.append(os.path.basename(source))
+        replace(source, destination)
+    monkeypatch.setattr(os, "replace", recording_replace)
+    write_lines_atomically(str(tmp_path / "out.txt"), LINES)
+    (temp_name,) = seen
+    assert temp_name.startswith(f".out.txt.{os.getpid()}.") and temp_name.endswith(".tmp")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permission bits")
+def test_permissions_are_kept_on_replace(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_bytes(b"old content\n")
+    os.chmod(path, 0o640)
+    assert write_lines_atomically(str(path), LINES)[0] is True
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert path.read_bytes() == _expected_bytes(LINES)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from background_tasks import BackgroundTaskRunner
+from comparer_engine import OperationCancelled
+
+
+class _FakeMaster:
+    # Stands in for the Tk root: after() callbacks are run by hand with poll()
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, delay_ms, callback):
+        self.callbacks.append(callback)
+
+    def poll(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+@pytest.fixture
+def master():
+    return _FakeMaster()
+
+
+@pytest.fixture
+def states():
+    return [] # (running_description, num_queued) after every state change
+
+
+@pytest.fixture
+def runner(master, states):
+    return BackgroundTaskRunner(master, on_progress=lambda *args: None,
+                                on_state_change=lambda running, num_queued: states.append((running, num_queued)))
+
+
+def _wait_for(master, outcomes, count):
+    deadline = time.monotonic() + 10
+    while len(outcomes) < count:
+        assert time.monotonic() < deadline
+        master.poll()
+        time.sleep(0.005)
+
+
+def test_cancelling_right_after_submit_stops_the_job_before_it_starts(master, monkeypatch):
+    # The worker thread is started by hand, so the job is cancelled before the worker
+    # can pick it up
+    monkeypatch.setattr(threading.Thread, "start", lambda thread: None)
+    runner = BackgroundTaskRunner(master, on_progress=lambda *args: None, on_state_change=lambda *args: None)
+    monkeypatch.undo()
+    ran = []
+    outcomes = []
+    runner.submit("Compare", lambda progress: ran.append(True), on_done=lambda result: outcomes.append(("done", result)),
+                  on_error=lambda description, error: outcomes.append((description, error)))
+    runner.cancel_current()
+    runner._worker.start()
+    _wait_for(master, outcomes, 1)
+    ((description, error),) = outcomes
+    assert description == "Compare" and isinstance(error, OperationCancelled)
+    assert ran == []
+    assert not runner.is_busy()
+
+
+def test_cancel_reaches_a_running_job_and_later_jobs_still_run(runner, master, states):
+    started = threading.Event()
+    outcomes = []
+
+    def long_work(progress):
+        started.set()
+        while True:
+            progress("words", 1, None)
+            time.sleep(0.001)
+
+    def record_error(description, error):
+        outcomes.append((description, type(error)))
+    runner.submit("Long", long_work, on_done=outcomes.append, on_error=record_error)
+    runner.submit("Short", lambda progress: 42, on_done=lambda result: outcomes.append(("Short", result)), on_error=record_error)
+    assert started.wait(10)
+    runner.cancel_current()
+    _wait_for(master, outcomes, 2)
+    assert outcomes == [("Long", OperationCancelled), ("Short", 42)]
+    assert states[-1] == (None, 0)
@@ -0,0 +1,55 @@
+import os
+
+import batch_compare
+import comparer_engine as engine
+
+CLEAN_PAIR = ("The cat sat.\n猫坐着。\n", "The cat sat.\n")
+DIFFERENT_PAIR = ("The cat sat.\n猫坐着。\n", "The dog sat!\n")
+
+
+def _pair(root, name, bilingual_text, english_text):
+    folder = root / name
+    folder.mkdir()
+    (folder / "BilingualText.txt").write_text(bilingual_text, encoding='utf-8')
+    if isinstance(english_text, bytes):
+        (folder / "EnglishText.txt").write_bytes(english_text)
+    else:
+        (folder / "EnglishText.txt").write_text(english_text, encoding='utf-8')
+    return folder
+
+
+def _run(root, *options):
+    return batch_compare.main([str(root), "-j", "1", *options])
+
+
+def test_clean_pairs_exit_ok(tmp_path):
+    folder = _pair(tmp_path, "book", *CLEAN_PAIR)
+    assert _run(tmp_path) == batch_compare.EXIT_OK
+    output_path, _ = engine.determine_tagged_output_path(str(folder / "BilingualText.txt"))
+    with open(output_path, encoding='utf-8') as f:
+        assert f.read() == "<paragraph>\n" + CLEAN_PAIR[0]
+
+
+def test_differences_exit_with_issues(tmp_path):
+    _pair(tmp_path, "a", *CLEAN_PAIR)
+    _pair(tmp_path, "b", *DIFFERENT_PAIR)
+    assert _run(tmp_path, "--no-tagging") == batch_compare.EXIT_ISSUES_FOUND
+
+
+def test_unreadable_pair_exits_with_errors(tmp_path, capsys):
+    _pair(tmp_path, "a", *DIFFERENT_PAIR)
+    _pair(tmp_path, "b", CLEAN_PAIR[0], b"\xff\xfe not UTF-8\n")
+    assert _run(tmp_path) == batch_compare.EXIT_ERRORS
+    assert "ERROR" in capsys.readouterr().out
+
+
+def test_missing_root_and_empty_tree(tmp_path):
+    assert _run(tmp_path / "missing") == batch_compare.EXIT_ERRORS
+    assert _run(tmp_path) == batch_compare.EXIT_OK
+
+
+def test_find_pairs_walks_in_order(tmp_path):
+    _pair(tmp_path, "b", *CLEAN_PAIR)
+    _pair(tmp_path, "a", *CLEAN_PAIR)
+    (tmp_path / "c").mkdir()
+    assert [os.path.basename(os.path.dirname(bilingual)) for bilingual, _ in batch_compare.find_pairs(str(tmp_path))] == ["a", "b"]
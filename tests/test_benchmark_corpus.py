@@ -0,0 +1,91 @@
+import math
+import os
+
+import pytest
+
+import benchmark_corpus
+import comparer_engine as engine
+from benchmark_corpus import generate_corpus
+
+RATES = {
+    benchmark_corpus.ERROR_SUBSTITUTION: 0.01,
+    benchmark_corpus.ERROR_INSERTION: 0.02,
+    benchmark_corpus.ERROR_PUNCTUATION_SWAP: 0.05,
+    benchmark_corpus.ERROR_MERGED_PARAGRAPHS: 0.1,
+    benchmark_corpus.ERROR_SPLIT_LINE: 0.04,
+}
+
+
+def _read(folder, name):
+    with open(os.path.join(folder, name), 'rb') as f:
+        return f.read()
+
+
+def _files(folder):
+    return [_read(folder, name) for name in (engine.BILINGUAL_DEFAULT_NAME, engine.ENGLISH_DEFAULT_NAME, benchmark_corpus.MANIFEST_NAME)]
+
+
+def _bilingual_english_lines(folder):
+    return list(engine.iter_bilingual_english_text(os.path.join(folder, engine.BILINGUAL_DEFAULT_NAME)))
+
+
+def test_same_seed_gives_identical_files(tmp_path):
+    first = generate_corpus(str(tmp_path / "a"), 50 * 1024, seed=3)
+    second = generate_corpus(str(tmp_path / "b"), 50 * 1024, seed=3)
+    assert first == second
+    assert _files(str(tmp_path / "a")) == _files(str(tmp_path / "b"))
+    assert first["bilingual_bytes"] >= 50 * 1024
+
+    generate_corpus(str(tmp_path / "c"), 50 * 1024, seed=4)
+    assert _read(str(tmp_path / "c"), engine.ENGLISH_DEFAULT_NAME) != _read(str(tmp_path / "a"), engine.ENGLISH_DEFAULT_NAME)
+
+
+def test_ensure_corpus_reuses_matching_corpora(tmp_path):
+    folder = str(tmp_path / "corpus")
+    manifest = benchmark_corpus.ensure_corpus(folder, 10 * 1024)
+    bilingual_path = os.path.join(folder, engine.BILINGUAL_DEFAULT_NAME)
+    os.utime(bilingual_path, ns=(10 ** 9, 10 ** 9))
+    assert benchmark_corpus.ensure_corpus(folder, 10 * 1024) == manifest
+    assert os.stat(bilingual_path).st_mtime_ns == 10 ** 9
+    assert benchmark_corpus.ensure_corpus(folder, 10 * 1024, seed=2)["seed"] == 2
+
+
+def test_injected_errors_come_near_the_requested_rates(tmp_path):
+    folder = str(tmp_path / "corpus")
+    manifest = generate_corpus(folder, 400 * 1024, seed=5, error_rates=RATES)
+    counts = manifest["injected_errors"]
+    english_words = _read(folder, engine.ENGLISH_DEFAULT_NAME).decode('utf-8').split()
+    bilingual_lines = _bilingual_english_lines(folder)
+    bilingual_words = [word for line in bilingual_lines for word in line.split()]
+    assert manifest["english_words"] == len(english_words)
+
+    # Inserted words are the only difference in word count; merging and splitting lines keep every word
+    assert len(bilingual_words) - len(english_words) == counts[benchmark_corpus.ERROR_INSERTION]
+
+    num_marks = sum(1 for word in english_words if word[-1] in benchmark_corpus._SWAP_MARKS)
+    num_sentences = len(bilingual_lines) - counts[benchmark_corpus.ERROR_SPLIT_LINE] + counts[benchmark_corpus.ERROR_MERGED_PARAGRAPHS]
+    opportunities = {
+        benchmark_corpus.ERROR_SUBSTITUTION: len(english_words),
+        benchmark_corpus.ERROR_INSERTION: len(english_words),
+        benchmark_corpus.ERROR_PUNCTUATION_SWAP: num_marks,
+        benchmark_corpus.ERROR_MERGED_PARAGRAPHS: manifest["paragraphs"],
+        benchmark_corpus.ERROR_SPLIT_LINE: num_sentences,
+    }
+    for kind, rate in RATES.items():
+        expected = rate * opportunities[kind]
+        assert expected >= 50, kind
+        # Within four standard deviations of a binomial count
+        assert abs(counts[kind] - expected) <= 4 * math.sqrt(expected * (1 - rate)), kind
+
+
+def test_zero_rates_inject_nothing(tmp_path):
+    folder = str(tmp_path / "corpus")
+    manifest = generate_corpus(folder, 20 * 1024, error_rates=dict.fromkeys(benchmark_corpus.ERROR_KINDS, 0))
+    assert set(manifest["injected_errors"].values()) == {0}
+    bilingual_lines = _bilingual_english_lines(folder)
+    assert [word for line in bilingual_lines for word in line.split()] == _read(folder, engine.ENGLISH_DEFAULT_NAME).decode('utf-8').split()
+
+
+def test_unknown_error_kind_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        generate_corpus(str(tmp_path), 1024, error_rates={"typo": 0.1})
@@ -0,0 +1,95 @@
+import ast
+import os
+import subprocess
+import sys
+
+import pytest
+
+import comparer_engine as engine
+from document_cache import DocumentCache
+
+BILINGUAL = "The cat sat on the mat.\n猫坐在垫子上。\n\nIt was warm!\n天气很暖和。\n"
+ENGLISH = "The cat sat on a mat.\nIt was warm.\n"
+
+
+def _pair(tmp_path):
+    bilingual_path = tmp_path / "BilingualText.txt"
+    english_path = tmp_path / "EnglishText.txt"
+    bilingual_path.write_text(BILINGUAL, encoding='utf-8')
+    english_path.write_text(ENGLISH, encoding='utf-8')
+    return str(bilingual_path), str(english_path)
+
+
+def _engine_names_used(module_path):
+    # Names a module takes from the engine, through engine.NAME or a from-import
+    with open(module_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "engine":
+            names.add(node.attr)
+        elif isinstance(node, ast.ImportFrom) and node.module == "comparer_engine":
+            names.update(alias.name for alias in node.names)
+    return names
+
+
+def test_front_ends_only_use_public_names():
+    # The modules are parsed, not imported, so text_comparer.py needs no display
+    root = os.path.dirname(os.path.abspath(engine.__file__))
+    public_names = set(engine.__all__)
+    assert len(public_names) == len(engine.__all__)
+    for module_name in ("batch_compare", "text_comparer", "comparison_service", "watch_mode", "incremental_compare",
+                        "background_tasks", "revision_compare"):
+        used = _engine_names_used(os.path.join(root, module_name + ".py"))
+        assert used, module_name
+        assert used <= public_names, (module_name, sorted(used - public_names))
+    assert _engine_names_used(os.path.join(root, "batch_compare.py")) >= {"run_word_comparison", "write_tagged_file"}
+    assert _engine_names_used(os.path.join(root, "text_comparer.py")) >= {"format_tagging_summary", "OperationCancelled"}
+
+
+def test_engine_does_not_import_tkinter():
+    code = "import sys, comparer_engine; sys.exit('tkinter' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(engine.__file__))).returncode == 0
+
+
+def test_word_comparison_with_and_without_cache(tmp_path):
+    bilingual_path, english_path = _pair(tmp_path)
+    for document_cache in (None, DocumentCache()):
+        result = engine.run_word_comparison(bilingual_path, english_path, mode=engine.WORD_DIFF_INDEX, document_cache=document_cache)
+        assert (result["bilingual_word_count"], result["english_word_count"]) == (9, 9)
+        assert [(difference["index"], difference["bilingual"], difference["english"]) for difference in result["differences"]] \
+            == [(4, "the", "a")]
+
+
+def test_punctuation_comparison_reports_location(tmp_path):
+    bilingual_path, english_path = _pair(tmp_path)
+    result = engine.run_punctuation_comparison(bilingual_path, english_path)
+    assert result["num_differences"] == 1
+    difference = result["differences"][0]
+    assert (difference["occurrence"], difference["bilingual"], difference["english"]) == (2, ("!", 2, 12), (".", 2, 12))
+
+
+def test_tagging_plans_then_writes(tmp_path):
+    bilingual_path, english_path = _pair(tmp_path)
+    tagging_result = engine.plan_paragraph_tagging(bilingual_path, english_path, keep_log=False)
+    # Paragraphs match on word count and last word, so the changed word does not matter
+    assert tagging_result["tag_indices"] == {0, 3}
+    assert tagging_result["num_unmatched_ref_paras"] == 0
+    assert engine.write_tagged_file(tagging_result)
+    with open(tagging_result["output_filepath"], encoding='utf-8') as f:
+        assert f.read() == "<paragraph>\nThe cat sat on the mat.\n猫坐在垫子上。\n\n<paragraph>\nIt was warm!\n天气很暖和。\n"
+    assert not engine.write_tagged_file(tagging_result) # Same content: left untouched
+
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_tagged_file_is_not_written_when_the_bilingual_file_changed(tmp_path, use_cache):
+    bilingual_path, english_path = _pair(tmp_path)
+    document_cache = DocumentCache() if use_cache else None
+    tagging_result = engine.plan_paragraph_tagging(bilingual_path, english_path, document_cache=document_cache, keep_log=False)
+    # A line inserted at the top would move every tag down by one line
+    with open(bilingual_path, 'w', encoding='utf-8') as f:
+        f.write("Title.\n标题。\n" + BILINGUAL)
+    os.utime(bilingual_path, ns=(10 ** 9, 10 ** 9))
+    with pytest.raises(engine.InputFileError):
+        engine.write_tagged_file(tagging_result)
+    assert not os.path.exists(tagging_result["output_filepath"])
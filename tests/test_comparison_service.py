@@ -0,0 +1,126 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+from urllib.parse import urlsplit
+
+import pytest
+
+import comparer_engine as engine
+from comparison_service import ComparisonService, serve
+
+BILINGUAL = "The cat sat on the mat.\n猫坐在垫子上。\n\nIt was warm!\n天气很暖和。\n"
+ENGLISH = "The cat sat on a mat.\nIt was warm.\n"
+
+
+@pytest.fixture
+def service_port():
+    # The service on a free loopback port, its event loop on a background thread
+    service = ComparisonService(workers=2)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    where = []
+
+    def on_ready(description):
+        where.append(description)
+        ready.set()
+    task = loop.create_task(serve(service, port=0, on_ready=on_ready))
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert ready.wait(10)
+    yield urlsplit(where[0]).port
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(10)
+    service.executor.shutdown()
+
+
+@pytest.fixture
+def folder(tmp_path):
+    (tmp_path / engine.BILINGUAL_DEFAULT_NAME).write_text(BILINGUAL, encoding='utf-8')
+    (tmp_path / engine.ENGLISH_DEFAULT_NAME).write_text(ENGLISH, encoding='utf-8')
+    return str(tmp_path)
+
+
+def _request(port, method, path, params=None, headers=None):
+    # Returns the status and the JSON lines of the response body
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request(method, path, body=None if params is None else json.dumps(params), headers=headers or {})
+        response = connection.getresponse()
+        return response.status, [json.loads(line) for line in response.read().decode('utf-8').splitlines()]
+    finally:
+        connection.close()
+
+
+def test_words_are_streamed_and_documents_cached(service_port, folder):
+    status, lines = _request(service_port, "POST", "/words", {"folder": folder, "mode": engine.WORD_DIFF_INDEX})
+    assert status == 200
+    records = [line for line in lines if line["type"] == "word"]
+    assert [(record["index"], record["bilingual"], record["english"]) for record in records] == [(4, "the", "a")]
+    assert lines[-1]["type"] == "result"
+    assert (lines[-1]["bilingual_word_count"], lines[-1]["english_word_count"], lines[-1]["num_differences"]) == (9, 9, 1)
+
+    _, (status_record,) = _request(service_port, "GET", "/status")
+    assert (status_record["documents"], status_record["cache_misses"], status_record["cache_hits"]) == (2, 2, 0)
+    _request(service_port, "POST", f"/punctuation?folder={folder}&stats=1")
+    _, (status_record,) = _request(service_port, "GET", "/status")
+    assert (status_record["cache_misses"], status_record["cache_hits"], status_record["served"]) == (2, 2, 2)
+
+    status, (invalidated,) = _request(service_port, "POST", "/invalidate", {})
+    assert (status, invalidated["documents"]) == (200, 0)
+
+
+def test_tagging_result_and_punctuation_records(service_port, folder):
+    _, lines = _request(service_port, "POST", "/tag", {"folder": folder, "write": False})
+    result = lines[-1]
+    assert (result["type"], result["num_tags_added"], result["num_successful_matches"], result["written"]) \
+        == ("result", 2, 2, False)
+    assert [line["status"] for line in lines if line["type"] == "paragraph"] == [engine.PARAGRAPH_MATCHED] * 2
+
+    _, lines = _request(service_port, "POST", "/punctuation", {"folder": folder, "stats": True})
+    assert [(line["bilingual_char"], line["english_char"]) for line in lines if line["type"] == "punctuation"] == [("!", ".")]
+    assert "stats" in lines[-1]
+
+
+@pytest.mark.parametrize("method, path, params, headers, expected_status", [
+    ("POST", "/words", {"bilingual": "b.txt"}, {}, 400), # No English file
+    ("POST", "/words", {"folder": ".", "mode": "fast"}, {}, 400),
+    ("POST", "/words", {"folder": 5}, {}, 400),
+    ("POST", "/words", {"bilingual": 0, "english": "e.txt"}, {}, 400), # Not file descriptor 0
+    ("POST", "/punctuation", {"bilingual": "b.txt", "english": ["e.txt"]}, {}, 400),
+    ("POST", "/invalidate", {"path": 1}, {}, 400),
+    ("POST", "/tag", {"folder": ".", "fuzzy_tolerance": "loose"}, {}, 400),
+    ("GET", "/words", None, {}, 405),
+    ("POST", "/compare", {}, {}, 404),
+    ("POST", "/words", {"folder": "."}, {"Origin": "http://example.com"}, 403),
+])
+def test_bad_requests_are_refused_before_streaming(service_port, method, path, params, headers, expected_status):
+    status, (error,) = _request(service_port, method, path, params, headers)
+    assert (status, error["type"]) == (expected_status, "error")
+
+
+def test_unreadable_input_is_reported_in_the_stream(service_port, tmp_path):
+    status, lines = _request(service_port, "POST", "/words", {"folder": str(tmp_path)})
+    assert status == 200
+    assert [line["type"] for line in lines] == ["error"]
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-5"])
+def test_malformed_content_length_is_refused(service_port, content_length):
+    with socket.create_connection(("127.0.0.1", service_port), timeout=10) as connection:
+        connection.sendall(f"POST /words HTTP/1.1\r\nHost: localhost\r\nContent-Length: {content_length}\r\n\r\n".encode('latin-1'))
+        response = b""
+        while chunk := connection.recv(4096):
+            response += chunk
+    head, _, body = response.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 400 ")
+    assert json.loads(body)["type"] == "error"
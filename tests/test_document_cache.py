@@ -0,0 +1,58 @@
+import comparer_engine as engine
+from document_cache import DOC_ENGLISH, DocumentCache
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return str(path)
+
+
+def _distinct_words(count, prefix="word"):
+    return " ".join(f"{prefix}{number}" for number in range(count)) + "\n"
+
+
+def test_vocabulary_counts_against_the_budget(tmp_path):
+    cache = DocumentCache()
+    cache.get(_write(tmp_path / "a.txt", _distinct_words(100)), DOC_ENGLISH)
+    assert cache.vocabulary_bytes() > 0
+    assert cache.total_bytes() > cache.vocabulary_bytes()
+
+
+def test_emptied_cache_starts_a_new_vocabulary(tmp_path):
+    path = _write(tmp_path / "a.txt", _distinct_words(100))
+    cache = DocumentCache()
+    document = cache.get(path, DOC_ENGLISH)
+    cache.invalidate(path)
+    assert len(cache.vocabulary) == 0
+    assert document.vocabulary is not cache.vocabulary
+    assert list(document.words)[:2] == ["word0", "word1"] # Handed-out documents keep theirs
+
+
+def test_outgrown_vocabulary_is_rebuilt(tmp_path):
+    small = _write(tmp_path / "small.txt", "one two\n")
+    large = _write(tmp_path / "large.txt", _distinct_words(3000))
+    cache = DocumentCache(memory_budget_bytes=1024 * 1024)
+    cache.get(small, DOC_ENGLISH)
+    cache.get(large, DOC_ENGLISH)
+    assert cache.num_documents() == 0
+    assert len(cache.vocabulary) == 0
+    assert cache.total_bytes() <= cache.memory_budget_bytes
+
+
+class _InvalidatingCache(DocumentCache):
+    # Empties itself between fetching the bilingual and the English document
+    def get(self, path, kind, *args):
+        if kind == DOC_ENGLISH:
+            self.invalidate()
+        return super().get(path, kind, *args)
+
+
+def test_document_pair_shares_one_vocabulary(tmp_path):
+    bilingual_path = _write(tmp_path / "BilingualText.txt", "The cat sat.\n猫坐着。\n")
+    english_path = _write(tmp_path / "EnglishText.txt", "The dog sat.\n")
+    cache = _InvalidatingCache()
+    bilingual_document, english_document = engine.get_documents(cache, bilingual_path, english_path)
+    assert bilingual_document.vocabulary is english_document.vocabulary
+    result = engine.run_word_comparison(bilingual_path, english_path, mode=engine.WORD_DIFF_INDEX, document_cache=cache)
+    assert [(difference["bilingual"], difference["english"]) for difference in result["differences"]] == [("cat", "dog")]
@@ -0,0 +1,160 @@
+import os
+import random
+
+import pytest
+
+import comparer_engine as engine
+from incremental_compare import IncrementalComparison
+
+ENGLISH = "dog a\n"
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def _full_run_output(bilingual_path, english_path):
+    # Tagged file bytes as a fresh engine run writes them, the watched output put back
+    tagging_result = engine.plan_paragraph_tagging(str(bilingual_path), str(english_path), keep_log=False)
+    output_path = tagging_result["output_filepath"]
+    with open(output_path, 'rb') as f:
+        watched = f.read()
+    os.remove(output_path)
+    engine.write_tagged_file(tagging_result)
+    with open(output_path, 'rb') as f:
+        fresh = f.read()
+    with open(output_path, 'wb') as f:
+        f.write(watched)
+    return fresh
+
+
+@pytest.mark.parametrize("old_text, new_text", [
+    ("dog a", "dog a\n狗狗\n"), # Appending to a file without a final newline
+    ("dog a", "dog a\n狗狗"),
+    ("dog a", "dog a\n"),
+    ("dog a\n", "dog a\n狗狗"),
+    ("dog a\n狗狗", "dog a"),
+    ("dog a\n狗狗\n", "dog a"),
+])
+def test_refresh_rewrites_tagged_file_when_final_newline_changes(tmp_path, old_text, new_text):
+    bilingual_path = tmp_path / "BilingualText.txt"
+    english_path = tmp_path / "EnglishText.txt"
+    _write(bilingual_path, old_text)
+    _write(english_path, ENGLISH)
+    comparison = IncrementalComparison(str(bilingual_path), str(english_path))
+    comparison.load()
+    _write(bilingual_path, new_text)
+    assert comparison.refresh() is not None
+    with open(comparison.output_filepath, 'rb') as f:
+        assert f.read() == _full_run_output(bilingual_path, english_path)
+
+
+def test_interrupted_rewrite_keeps_previous_tagged_file(tmp_path):
+    bilingual_path = tmp_path / "BilingualText.txt"
+    english_path = tmp_path / "EnglishText.txt"
+    _write(bilingual_path, "dog a\n狗狗\n")
+    _write(english_path, ENGLISH)
+    comparison = IncrementalComparison(str(bilingual_path), str(english_path))
+    comparison.load()
+    with open(comparison.output_filepath, 'rb') as f:
+        before = f.read()
+
+    def interrupted():
+        yield "<paragraph>\n"
+        raise KeyboardInterrupt
+    comparison._iter_tagged_lines = interrupted
+    _write(bilingual_path, "dog b\n狗狗\n")
+    with pytest.raises(KeyboardInterrupt):
+        comparison.refresh()
+    with open(comparison.output_filepath, 'rb') as f:
+        assert f.read() == before
+    assert sorted(os.listdir(tmp_path)) == ["BilingualText.txt", "EnglishText.txt", os.path.basename(comparison.output_filepath)]
+
+
+CHINESE_LINE = "猫坐在垫子上。"
+WORDS = ["cat", "mat", "sun", "rain", "tea", "dog", "bark", "hot", "warm", "the", "a", "on", "was", "it", "and"]
+
+
+def _random_sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 8))).capitalize() + rng.choice([".", "!", "?", ";"])
+
+
+def _random_bilingual_lines(rng, num_pairs):
+    lines = []
+    for _ in range(num_pairs):
+        lines += [_random_sentence(rng), CHINESE_LINE]
+        if rng.random() < 0.3:
+            lines.append("")
+    return lines
+
+
+def _random_edit(rng, lines, new_lines):
+    lines = list(lines)
+    start = rng.randint(0, len(lines))
+    end = min(len(lines), start + rng.randint(0, 3))
+    lines[start:end] = new_lines
+    return lines
+
+
+def _rewrite(path, lines, step):
+    _write(path, "\n".join(lines) + "\n")
+    os.utime(path, ns=(step * 10 ** 9, step * 10 ** 9)) # A new mtime even within the clock's resolution
+
+
+@pytest.mark.parametrize("word_diff_mode", [engine.WORD_DIFF_INDEX, engine.WORD_DIFF_ALIGN])
+def test_refresh_matches_full_recompute(tmp_path, word_diff_mode):
+    rng = random.Random(12)
+    bilingual_path = tmp_path / "BilingualText.txt"
+    english_path = tmp_path / "EnglishText.txt"
+    bilingual_lines = _random_bilingual_lines(rng, 20)
+    english_lines = [line for line in bilingual_lines if line and line != CHINESE_LINE]
+    _rewrite(bilingual_path, bilingual_lines, 1)
+    _rewrite(english_path, english_lines, 1)
+    comparison = IncrementalComparison(str(bilingual_path), str(english_path), word_diff_mode=word_diff_mode)
+    comparison.load()
+
+    for step in range(2, 40):
+        with open(comparison.output_filepath, 'rb') as f:
+            old_output = f.read().split(b"\n")
+        if rng.random() < 0.6:
+            bilingual_lines = _random_edit(rng, bilingual_lines, _random_bilingual_lines(rng, rng.randint(0, 2)))
+            _rewrite(bilingual_path, bilingual_lines, step)
+        else:
+            english_lines = _random_edit(rng, english_lines, [_random_sentence(rng) for _ in range(rng.randint(0, 2))])
+            _rewrite(english_path, english_lines, step)
+        update = comparison.refresh()
+        assert update is not None
+        with open(comparison.output_filepath, 'rb') as f:
+            new_output = f.read().split(b"\n")
+        first_changed = next((line_idx + 1 for line_idx, (old_line, new_line) in enumerate(zip(old_output, new_output))
+                              if old_line != new_line), None)
+        if first_changed is None and len(old_output) != len(new_output):
+            first_changed = min(len(old_output), len(new_output))
+        assert update["first_changed_output_line"] == first_changed
+
+        words = engine.run_word_comparison(str(bilingual_path), str(english_path), mode=word_diff_mode)
+        incremental_words = comparison.word_result()
+        assert (incremental_words["bilingual_word_count"], incremental_words["english_word_count"]) \
+            == (words["bilingual_word_count"], words["english_word_count"])
+        if word_diff_mode == engine.WORD_DIFF_INDEX:
+            assert incremental_words["differences"] == words["differences"]
+        else:
+            # Edits are found again only around the change, so equal-cost edits may
+            # be grouped differently, but the alignment is as short as a fresh one
+            assert _edit_distance(incremental_words["differences"]) == _edit_distance(words["differences"])
+        punctuation = engine.run_punctuation_comparison(str(bilingual_path), str(english_path))
+        assert comparison.punctuation_result()["differences"] == punctuation["differences"]
+
+        tagging = comparison.tagging_result()
+        expected_tagging = engine.plan_paragraph_tagging(str(bilingual_path), str(english_path), keep_log=False)
+        for key in ("tag_indices", "num_ref_paragraphs", "num_successful_matches", "num_last_word_mismatches"):
+            assert tagging[key] == expected_tagging[key]
+        with open(comparison.output_filepath, 'rb') as f:
+            assert f.read() == _full_run_output(bilingual_path, english_path)
+
+
+def _edit_distance(differences):
+    # Words deleted plus words inserted
+    return sum(difference["bilingual_end"] - difference["bilingual_start"] + difference["english_end"] - difference["english_start"]
+               for difference in differences)
@@ -0,0 +1,61 @@
+import os
+
+from library_index import LibraryIndex, is_under
+
+BOOK = "".join(f"Paragraph {number} tells of the quiet river town where story {number} begins and ends.\n"
+               for number in range(40))
+OTHER = "".join(f"Chapter {number} is about engines, pistons and the cost of steel in year {number}.\n"
+                for number in range(40))
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def _bilingual(text):
+    return "".join(f"{line}\n中文翻译\n\n" for line in text.splitlines())
+
+
+def _library(tmp_path):
+    library = tmp_path / "library"
+    library.mkdir()
+    _write(library / "book.txt", BOOK)
+    _write(library / "other.txt", OTHER)
+    return library
+
+
+def test_update_is_incremental_and_drops_removed_files(tmp_path):
+    library = _library(tmp_path)
+    with LibraryIndex(str(tmp_path / "library.db")) as index:
+        assert index.update(str(library))["added"] == 2
+        assert index.update(str(library))["unchanged"] == 2
+
+        os.utime(library / "book.txt", ns=(0, 0)) # Touched, same content
+        _write(library / "other.txt", OTHER + "One more closing line about steel.\n")
+        counts = index.update(str(library))
+        assert (counts["touched"], counts["updated"], counts["unchanged"]) == (1, 1, 0)
+
+        os.remove(library / "other.txt")
+        assert index.update(str(library))["removed"] == 1
+        assert index.status()["files"] == 1
+        assert index.connection.execute("SELECT COUNT(DISTINCT file_id) FROM shingles").fetchone()[0] == 1
+
+
+def test_match_ranks_the_source_file_first(tmp_path):
+    library = _library(tmp_path)
+    bilingual_path = tmp_path / "BilingualText.txt"
+    _write(bilingual_path, _bilingual(BOOK))
+    with LibraryIndex(str(tmp_path / "library.db")) as index:
+        index.update(str(library))
+        candidates = index.match(str(bilingual_path))["candidates"]
+    assert candidates[0]["path"] == str(library / "book.txt")
+    assert candidates[0]["shingle_share"] == 1.0
+    assert candidates[0]["paragraph_share"] == 1.0
+    assert all(candidate["path"] != str(library / "other.txt") for candidate in candidates)
+
+
+def test_is_under_handles_the_file_system_root():
+    assert is_under(os.path.join(os.sep, "books", "a.txt"), os.sep)
+    assert is_under(os.path.join(os.sep, "books", "a.txt"), os.path.join(os.sep, "books"))
+    assert not is_under(os.path.join(os.sep, "books2", "a.txt"), os.path.join(os.sep, "books"))
@@ -0,0 +1,115 @@
+import random
+
+import paragraph_matcher
+from paragraph_matcher import EditableBlockIndex, FuzzyBlockIndex, ParagraphBlockIndex, TokenHasher, banded_edit_distance
+
+WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet".split()
+
+
+def _fuzzy_index(lines, tolerance=0.1):
+    token_counts, token_hashes = TokenHasher().hash_lines(lines)
+    return FuzzyBlockIndex(token_counts, token_hashes, tolerance)
+
+
+def _hashes(text):
+    return TokenHasher().hash_line(text)
+
+
+def test_banded_edit_distance_stops_past_the_band():
+    assert banded_edit_distance("kitten", "sitting", 3) == 3
+    assert banded_edit_distance("kitten", "sitting", 2) is None
+    assert banded_edit_distance("abc", "abcdef", 2) is None
+    assert banded_edit_distance("", "", 0) == 0
+
+
+def test_fuzzy_match_accepts_differences_up_to_the_tolerance():
+    ref = " ".join(WORDS * 2) # 20 words, so 10% allows 2 to differ
+    two_changed = ref.replace("alpha", "zulu", 2)
+    three_changed = two_changed.replace("bravo", "yankee", 1)
+    assert _fuzzy_index([two_changed]).find_block(0, _hashes(ref)) == (0, 0, 0.9)
+    assert _fuzzy_index([three_changed]).find_block(0, _hashes(ref)) is None
+    assert _fuzzy_index([three_changed], tolerance=0.15).find_block(0, _hashes(ref))[:2] == (0, 0)
+
+
+def test_fuzzy_block_stays_before_stop_idx():
+    # The whole reference is lines 0-1, but line 1 is reserved for the next match
+    fuzzy_index = _fuzzy_index([" ".join(WORDS), "kilo"])
+    ref_hashes = _hashes(" ".join(WORDS) + " kilo")
+    assert fuzzy_index.find_block(0, ref_hashes) == (0, 1, 1.0)
+    first, last, similarity = fuzzy_index.find_block(0, ref_hashes, 1)
+    assert (first, last) == (0, 0) and similarity < 1
+    assert fuzzy_index.find_block(1, ref_hashes, 1) is None
+
+
+def _linear_scan(line_word_counts, line_last_words, search_start_idx, word_count, last_word):
+    # The tagger's original search: grow a block from every start line in turn
+    rejected = []
+    for start_idx in range(search_start_idx, len(line_word_counts)):
+        block_words = 0
+        for end_idx in range(start_idx, len(line_word_counts)):
+            if block_words + line_word_counts[end_idx] > word_count:
+                break
+            block_words += line_word_counts[end_idx]
+            if block_words == word_count:
+                if line_last_words[end_idx].lower() == last_word.lower():
+                    return (start_idx, end_idx), rejected
+                rejected.append((start_idx, end_idx))
+    return None, rejected
+
+
+def test_block_index_agrees_with_linear_scan():
+    rng = random.Random(3)
+    for _ in range(200):
+        num_lines = rng.randint(0, 25)
+        line_word_counts = [rng.randint(1, 4) for _ in range(num_lines)]
+        line_last_words = [rng.choice(["mat", "Mat", "sun", "rain"]) for _ in range(num_lines)]
+        block_index = ParagraphBlockIndex(line_word_counts, line_last_words)
+        for search_start_idx in range(num_lines + 1):
+            word_count = rng.randint(1, 9)
+            last_word = rng.choice(["mat", "sun", "snow"])
+            expected = _linear_scan(line_word_counts, line_last_words, search_start_idx, word_count, last_word)
+            match, rejected = block_index.find_block(search_start_idx, word_count, last_word)
+            assert (match, rejected) == expected
+            assert block_index.find_block_near(search_start_idx, word_count, last_word, num_lines + 1) == expected
+            near = block_index.find_block_near(search_start_idx, word_count, last_word, 3)
+            assert near is None or near == expected
+
+
+def test_editable_block_index_agrees_after_edits(monkeypatch):
+    monkeypatch.setattr(paragraph_matcher, "CHUNK_LINES", 4) # Many chunks for a few lines
+    rng = random.Random(8)
+    line_word_counts = [rng.randint(1, 4) for _ in range(40)]
+    line_last_words = [rng.choice(["mat", "Mat", "sun", "rain"]) for _ in line_word_counts]
+    editable = EditableBlockIndex(line_word_counts, line_last_words)
+    for _ in range(150):
+        lo = rng.randint(0, len(line_word_counts))
+        hi = min(len(line_word_counts), lo + rng.randint(0, 12))
+        new_counts = [rng.randint(1, 4) for _ in range(rng.randint(0, 12))]
+        new_last_words = [rng.choice(["mat", "sun", "rain"]) for _ in new_counts]
+        before = editable.snapshot()
+        old_counts = list(line_word_counts)
+        line_word_counts[lo:hi] = new_counts
+        line_last_words[lo:hi] = new_last_words
+        editable.replace(lo, hi, new_counts, new_last_words)
+
+        block_index = ParagraphBlockIndex(line_word_counts, line_last_words)
+        assert len(editable) == len(line_word_counts)
+        assert [editable.prefix(line_idx) for line_idx in range(len(line_word_counts) + 1)] == list(block_index.prefix_sums)
+        # A snapshot keeps answering for the lines it was taken of
+        assert [before.prefix(line_idx) for line_idx in range(len(old_counts) + 1)] \
+            == [sum(old_counts[:line_idx]) for line_idx in range(len(old_counts) + 1)]
+        for _ in range(10):
+            search_start_idx = rng.randint(0, len(line_word_counts))
+            word_count = rng.randint(1, 9)
+            last_word = rng.choice(["mat", "sun", "snow"])
+            match, rejected = block_index.find_block(search_start_idx, word_count, last_word)
+            assert editable.find_block(search_start_idx, word_count, last_word) == (match, len(rejected))
+            near = editable.find_block_near(search_start_idx, word_count, last_word, 5)
+            assert near is None or near == (match, len(rejected))
+            region_start = rng.randint(0, len(line_word_counts))
+            region_count = rng.randint(0, 3)
+            expected = [(start_idx, last_idx) for start_idx in range(search_start_idx, len(line_word_counts))
+                        for last_idx in range(start_idx, len(line_word_counts))
+                        if block_index.prefix_sums[last_idx + 1] - block_index.prefix_sums[start_idx] == word_count
+                        and start_idx < region_start + region_count and last_idx >= region_start]
+            assert list(editable.blocks_overlapping(word_count, search_start_idx, region_start, region_count)) == expected
@@ -0,0 +1,81 @@
+import random
+
+import parallel_align
+import word_diff
+from token_arrays import TokenVocabulary
+
+SEGMENT_TOKENS = 1000 # Small segments so that short texts are split too
+
+
+def _texts(seed, num_words=6000, num_edits=40):
+    rng = random.Random(seed)
+    words_a = [f"w{rng.randrange(3000)}" for _ in range(num_words)]
+    words_b = list(words_a)
+    for _ in range(num_edits):
+        start = rng.randrange(len(words_b))
+        words_b[start:start + rng.randint(0, 3)] = [f"x{rng.randrange(50)}" for _ in range(rng.randint(0, 3))]
+    return words_a, words_b
+
+
+def _encode(words_a, words_b, b_first=False):
+    vocabulary = TokenVocabulary()
+    if b_first:
+        b = vocabulary.encode(words_b)
+        a = vocabulary.encode(words_a)
+    else:
+        a = vocabulary.encode(words_a)
+        b = vocabulary.encode(words_b)
+    return a, b, vocabulary.hashes
+
+
+def _small_segments(monkeypatch):
+    split_points = parallel_align.split_points
+    monkeypatch.setattr(parallel_align, "split_points",
+                        lambda a, b, token_hashes: split_points(a, b, token_hashes, SEGMENT_TOKENS))
+
+
+def _cost(edits):
+    return sum(a_hi - a_lo + b_hi - b_lo for _, a_lo, a_hi, b_lo, b_hi in edits)
+
+
+def _apply(edits, a, b):
+    # Rebuilds b from a and the edits, checking that the words between edits are equal
+    result = []
+    a_idx = 0
+    for _, a_lo, a_hi, b_lo, b_hi in edits:
+        assert a[a_idx:a_lo] == b[len(result):b_lo]
+        result += a[a_idx:a_lo]
+        result += b[b_lo:b_hi]
+        a_idx = a_hi
+    return result + a[a_idx:]
+
+
+def test_partitioned_alignment_is_the_same_for_any_number_of_jobs(monkeypatch):
+    _small_segments(monkeypatch)
+    words_a, words_b = _texts(13)
+    a, b, token_hashes = _encode(words_a, words_b)
+    assert len(parallel_align.split_points(a, b, token_hashes)) >= 5
+
+    edits = list(parallel_align.diff_ranges_partitioned(a, b, token_hashes, jobs=1))
+    assert list(parallel_align.diff_ranges_partitioned(a, b, token_hashes, jobs=3)) == edits
+    assert _apply(edits, a.tolist(), b.tolist()) == b.tolist()
+    # Anchors are unique and surrounded by equal words, so splitting costs nothing here
+    assert _cost(edits) == _cost(word_diff.diff_ranges(a.tolist(), b.tolist()))
+
+
+def test_split_points_do_not_depend_on_token_ids(monkeypatch):
+    _small_segments(monkeypatch)
+    words_a, words_b = _texts(14)
+    a, b, token_hashes = _encode(words_a, words_b)
+    a_other, b_other, other_hashes = _encode(words_a, words_b, b_first=True)
+    assert parallel_align.split_points(a, b, token_hashes) == parallel_align.split_points(a_other, b_other, other_hashes)
+    assert [edit[1:] for edit in parallel_align.diff_ranges_partitioned(a, b, token_hashes)] \
+        == [edit[1:] for edit in parallel_align.diff_ranges_partitioned(a_other, b_other, other_hashes)]
+
+
+def test_short_inputs_are_not_split():
+    words_a, words_b = _texts(15, num_words=300, num_edits=5)
+    a, b, token_hashes = _encode(words_a, words_b)
+    assert parallel_align.split_points(a, b, token_hashes) == []
+    assert list(parallel_align.diff_ranges_partitioned(a, b, token_hashes, jobs=2)) \
+        == list(word_diff.diff_ranges(a.tolist(), b.tolist()))
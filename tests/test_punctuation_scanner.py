@@ -0,0 +1,81 @@
+import string
+import unicodedata
+
+import pytest
+
+import punctuation_scanner
+from punctuation_scanner import PUNCTUATION_ASCII, PUNCTUATION_CJK, PUNCTUATION_UNICODE, iter_punctuation_with_location
+from text_streams import iter_lines
+
+SAMPLE = ("\"Well,\" she said -- (quietly) -- 'it's 5:30 [or so]; isn't it?'\n"
+          "Price: $4.50 + tax = ~5 {approx.} @home #1 50% a^b a|b `x` <tag> back\\slash_under*\n"
+          "他说：“你好，世界！”……——《书》、【注】\n"
+          "\n"
+          "“Curly” ‘quotes’ and – dashes — and … ellipsis.\n"
+          "No final newline!")
+
+
+def _baseline_punctuation(text):
+    # The original loop: splitlines() over the whole text, then a membership test per character
+    punctuation_marks = []
+    for line_idx, line_content in enumerate(text.splitlines()):
+        for char_idx, char in enumerate(line_content):
+            if char in string.punctuation:
+                punctuation_marks.append((char, line_idx + 1, char_idx + 1))
+    return punctuation_marks
+
+
+def _is_marked(punctuation_class, char):
+    return punctuation_scanner.get_pattern(punctuation_class).fullmatch(char) is not None
+
+
+def test_ascii_class_matches_the_original_loop():
+    expected = _baseline_punctuation(SAMPLE)
+    assert len(expected) > 40
+    assert list(iter_punctuation_with_location(SAMPLE.splitlines(keepends=True))) == expected
+    assert list(iter_punctuation_with_location(SAMPLE.splitlines(keepends=True), PUNCTUATION_ASCII)) == expected
+
+
+def test_cjk_class_adds_curly_quotes_dashes_and_full_width_marks():
+    for char in "，。“”…—‘’–：！《》、【】":
+        assert _is_marked(PUNCTUATION_CJK, char), char
+        assert not _is_marked(PUNCTUATION_ASCII, char), char
+    for char in string.punctuation:
+        assert _is_marked(PUNCTUATION_CJK, char), char
+    for char in "a猫 5é　":
+        assert not _is_marked(PUNCTUATION_CJK, char), char
+    assert [(char, column) for char, _, column in iter_punctuation_with_location(["他说：“你好，世界！”…—\n"], PUNCTUATION_CJK)] \
+        == [("：", 3), ("“", 4), ("，", 7), ("！", 10), ("”", 11), ("…", 12), ("—", 13)]
+
+
+def test_unicode_class_is_ascii_plus_every_punctuation_category():
+    # Every BMP code point, plus a few beyond it
+    pattern = punctuation_scanner.get_pattern(PUNCTUATION_UNICODE)
+    for codepoint in list(range(0x10000)) + [0x1056F, 0x16FE2, 0x1E95E, 0x1F600, 0x20000]:
+        if 0xD800 <= codepoint <= 0xDFFF:
+            continue # Surrogates
+        char = chr(codepoint)
+        expected = char in string.punctuation or unicodedata.category(char).startswith('P')
+        assert (pattern.fullmatch(char) is not None) == expected, hex(codepoint)
+
+
+def test_unknown_class_is_rejected():
+    with pytest.raises(ValueError):
+        punctuation_scanner.punctuation_codepoints("emoji")
+
+
+@pytest.mark.parametrize("text", [
+    "one, two three; four\nfive.\n",
+    "one,\rtwo.\r\nthree!\n",
+    "line\u2028separator, and\u2029paragraph separator.\n(next)\n",
+    "form\x0cfeed, and\x1cfile separator.\n\n next: line\n",
+    "a.\n\n\nb!",
+])
+def test_line_numbers_follow_splitlines(tmp_path, text):
+    path = tmp_path / "text.txt"
+    path.write_bytes(text.encode('utf-8'))
+    # Text read in universal newlines mode, like the original reader
+    with open(path, encoding='utf-8') as f:
+        expected = _baseline_punctuation(f.read())
+    for use_mmap in (False, True):
+        assert list(iter_punctuation_with_location(iter_lines(str(path), use_mmap=use_mmap))) == expected
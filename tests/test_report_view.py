@@ -0,0 +1,48 @@
+import pytest
+
+import report_view
+from report_view import chunk_start_lines, find_page_with, num_pages, page_chunks, page_of_chunk
+
+PAGE_SIZE = 3
+
+
+@pytest.mark.parametrize("num_chunks, expected", [(0, 1), (1, 1), (3, 1), (4, 2), (6, 2), (7, 3)])
+def test_num_pages(num_chunks, expected):
+    assert num_pages(num_chunks, PAGE_SIZE) == expected
+
+
+def test_default_page_size():
+    assert num_pages(report_view.PAGE_SIZE_CHUNKS) == 1
+    assert num_pages(report_view.PAGE_SIZE_CHUNKS + 1) == 2
+    assert page_of_chunk(report_view.PAGE_SIZE_CHUNKS - 1) == 0
+    assert page_of_chunk(report_view.PAGE_SIZE_CHUNKS) == 1
+
+
+def test_differences_fall_on_their_chunk_page():
+    chunks = [f"chunk {chunk_idx}\n" for chunk_idx in range(8)]
+    for chunk_idx in range(len(chunks)):
+        page = page_of_chunk(chunk_idx, PAGE_SIZE)
+        assert chunks[chunk_idx] in page_chunks(chunks, page, PAGE_SIZE)
+    assert [page_chunks(chunks, page, PAGE_SIZE) for page in range(num_pages(len(chunks), PAGE_SIZE))] \
+        == [chunks[0:3], chunks[3:6], chunks[6:8]]
+
+
+def test_chunk_start_lines_match_counting_newlines():
+    chunks = ["Difference at word index 4:\n  Bilingual: 'the'\n  English: 'a'\n\n", "one line\n", "", "no newline ",
+              "continues\nand ends\n", "\n\n", "last"]
+    expected = [1 + sum(chunk.count("\n") for chunk in chunks[:chunk_idx]) for chunk_idx in range(len(chunks))]
+    assert chunk_start_lines(chunks) == expected == [1, 5, 6, 6, 6, 8, 10]
+    text_lines = "".join(chunks).split("\n")
+    assert text_lines[chunk_start_lines(chunks)[1] - 1] == "one line"
+    assert chunk_start_lines([]) == []
+
+
+def test_find_page_with_searches_later_pages_then_wraps():
+    chunks = ["alpha\n", "beta\n", "gamma\n", "Delta\n", "epsilon\n", "zeta\n", "eta\n", "theta\n"]
+    assert find_page_with(chunks, "delta", 0, PAGE_SIZE) == 1 # Case-insensitive
+    assert find_page_with(chunks, "ETA", 0, PAGE_SIZE) == 1 # "zeta" comes before "eta" and "theta"
+    assert find_page_with(chunks, "eta", 1, PAGE_SIZE) == 2
+    assert find_page_with(chunks, "alpha", 2, PAGE_SIZE) == 0 # Wraps past the last page
+    assert find_page_with(chunks, "beta", 0, PAGE_SIZE) == 0 # Only on the current page, found last
+    assert find_page_with(chunks, "omega", 1, PAGE_SIZE) is None
+    assert find_page_with([], "alpha", 0, PAGE_SIZE) is None
@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+import comparer_engine as engine
+import report_writers
+from document_cache import DocumentCache
+from report_writers import BinaryReportReader, BinaryReportWriter, open_report_writer
+
+RECORDS = [
+    {"type": report_writers.RECORD_WORD, "index": 4, "bilingual": "the", "bilingual_line": 1, "bilingual_column": 13,
+     "english": "a", "english_line": 1, "english_column": 13},
+    {"type": report_writers.RECORD_WORD, "index": 2 ** 40, "bilingual": None, "bilingual_line": None, "bilingual_column": None,
+     "english": "tail", "english_line": 7, "english_column": 1},
+    {"type": report_writers.RECORD_EDIT, "tag": "replace", "bilingual_start": 3, "bilingual_end": 5, "bilingual_line": 2,
+     "bilingual_column": 4, "english_start": 3, "english_end": 4, "english_line": 2, "english_column": 4,
+     "bilingual": "cafe au", "english": "café"},
+    {"type": report_writers.RECORD_PUNCTUATION, "occurrence": 1, "reason": "mismatch", "bilingual_char": "!",
+     "bilingual_line": 2, "bilingual_column": 12, "english_char": ".", "english_line": 2, "english_column": 12},
+    {"type": report_writers.RECORD_PARAGRAPH, "ref_paragraph": 0, "ref_line": 1, "word_count": 6, "last_word": "mat",
+     "status": "matched", "bilingual_first_line": 1, "bilingual_last_line": 1, "bilingual_last_word": "mat"},
+    {"type": report_writers.RECORD_PAIRING, "kind": "unpaired", "line": 9, "role": "english"},
+    {"type": report_writers.RECORD_WORD, "index": 0, "bilingual": "", "bilingual_line": 1, "bilingual_column": 1,
+     "english": "猫", "english_line": 1, "english_column": 1},
+]
+
+
+def _write(path, report_format, records):
+    with open_report_writer(str(path), report_format) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.num_records
+
+
+def test_jsonl_and_binary_reports_round_trip(tmp_path):
+    jsonl_path = tmp_path / "report.jsonl"
+    binary_path = tmp_path / "report.bin"
+    assert _write(jsonl_path, report_writers.REPORT_JSONL, RECORDS) == len(RECORDS)
+    assert _write(binary_path, report_writers.REPORT_BINARY, RECORDS) == len(RECORDS)
+
+    jsonl_records = [json.loads(line) for line in jsonl_path.read_text(encoding='utf-8').splitlines()]
+    with BinaryReportReader(str(binary_path)) as reader:
+        assert len(reader) == len(RECORDS)
+        assert list(reader) == jsonl_records == RECORDS
+        # Same key order as the JSONL records
+        assert [list(record) for record in reader] == [list(record) for record in jsonl_records]
+        assert reader[-1] == RECORDS[-1]
+        assert reader[3] == RECORDS[3]
+        with pytest.raises(IndexError):
+            reader[len(RECORDS)]
+
+
+def test_empty_binary_report(tmp_path):
+    binary_path = tmp_path / "report.bin"
+    assert _write(binary_path, report_writers.REPORT_BINARY, []) == 0
+    with BinaryReportReader(str(binary_path)) as reader:
+        assert len(reader) == 0
+        assert list(reader) == []
+
+
+def test_unclosed_or_foreign_binary_report_is_rejected(tmp_path):
+    binary_path = tmp_path / "report.bin"
+    writer = BinaryReportWriter(str(binary_path))
+    writer.write(RECORDS[0])
+    writer._file.flush()
+    with pytest.raises(ValueError):
+        BinaryReportReader(str(binary_path))
+    writer.close()
+
+    other_path = tmp_path / "report.jsonl"
+    _write(other_path, report_writers.REPORT_JSONL, RECORDS)
+    with pytest.raises(ValueError):
+        BinaryReportReader(str(other_path))
+
+
+def test_reader_command_prints_a_record_range(tmp_path, capsys):
+    binary_path = tmp_path / "report.bin"
+    _write(binary_path, report_writers.REPORT_BINARY, RECORDS)
+    assert report_writers.main([str(binary_path), "--start", "2", "--count", "3"]) == 0
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == RECORDS[2:5]
+
+
+def test_engine_records_match_the_returned_differences(tmp_path):
+    bilingual_path = tmp_path / "BilingualText.txt"
+    english_path = tmp_path / "EnglishText.txt"
+    bilingual_path.write_text("The cat sat on the mat.\n猫坐在垫子上。\n\nIt was warm!\n天气很暖和。\n", encoding='utf-8')
+    english_path.write_text("The cat sat on a mat.\nIt was warm.\n", encoding='utf-8')
+    bilingual_path, english_path = str(bilingual_path), str(english_path)
+
+    expected = engine.run_word_comparison(bilingual_path, english_path, mode=engine.WORD_DIFF_INDEX)["differences"]
+    for report_format in report_writers.REPORT_FORMATS:
+        report_path = str(tmp_path / ("words" + report_writers.REPORT_EXTENSIONS[report_format]))
+        with open_report_writer(report_path, report_format) as writer:
+            result = engine.run_word_comparison(bilingual_path, english_path, mode=engine.WORD_DIFF_INDEX, record_writer=writer)
+        assert result["differences"] is None
+        if report_format == report_writers.REPORT_BINARY:
+            with BinaryReportReader(report_path) as reader:
+                records = list(reader)
+        else:
+            with open(report_path, encoding='utf-8') as report_file:
+                records = [json.loads(line) for line in report_file]
+        assert [(record["index"], record["bilingual"], record["english"]) for record in records] \
+            == [(difference["index"], difference["bilingual"], difference["english"]) for difference in expected]
+        assert (records[0]["bilingual_line"], records[0]["english_line"]) == (1, 1)
+
+
+class _ListWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+def test_cached_alignment_records_use_the_cache_vocabulary(tmp_path, monkeypatch):
+    bilingual_path = tmp_path / "BilingualText.txt"
+    english_path = tmp_path / "EnglishText.txt"
+    bilingual_path.write_text("The cat sat on the mat.\n猫坐在垫子上。\n\nIt was very warm!\n天气很暖和。\n", encoding='utf-8')
+    english_path.write_text("The cat sat on a mat.\nIt was warm.\n", encoding='utf-8')
+    bilingual_path, english_path = str(bilingual_path), str(english_path)
+
+    expected = _ListWriter()
+    engine.run_word_comparison(bilingual_path, english_path, mode=engine.WORD_DIFF_ALIGN, record_writer=expected)
+    assert [record["tag"] for record in expected.records] == ["replace", "delete"]
+
+    document_cache = DocumentCache()
+    engine.get_documents(document_cache, bilingual_path, english_path)
+
+    def no_new_vocabulary():
+        raise AssertionError("cached documents already hold token ids")
+    monkeypatch.setattr(engine, "TokenVocabulary", no_new_vocabulary)
+    cached = _ListWriter()
+    result = engine.run_word_comparison(bilingual_path, english_path, mode=engine.WORD_DIFF_ALIGN, document_cache=document_cache,
+                                        record_writer=cached)
+    assert cached.records == expected.records
+    assert (result["bilingual_word_count"], result["english_word_count"], result["num_differences"]) == (10, 9, 2)
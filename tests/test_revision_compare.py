@@ -0,0 +1,94 @@
+import random
+
+import revision_compare
+from revision_compare import compare_revisions, rank_revisions, word_edit_distance
+from token_arrays import TokenVocabulary
+
+CHINESE_LINE = "猫坐在垫子上。"
+WORDS = ["cat", "mat", "sun", "rain", "tea", "dog", "bark", "hot", "warm", "the", "a", "on", "was", "it", "and"]
+
+
+def _book(seed, num_paragraphs=60):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))).capitalize() + rng.choice([".", "!", "?"])
+            for _ in range(num_paragraphs)]
+
+
+def _revise(paragraphs, seed, num_edits):
+    # Substitutes num_edits words, each in its own paragraph
+    rng = random.Random(seed)
+    revised = list(paragraphs)
+    for paragraph_idx in rng.sample(range(len(revised)), num_edits):
+        words = revised[paragraph_idx].split()
+        words[0] = "Changed"
+        revised[paragraph_idx] = " ".join(words)
+    return revised
+
+
+def _write_book(tmp_path, num_edits_per_revision):
+    paragraphs = _book(1)
+    bilingual_path = tmp_path / "BilingualText.txt"
+    bilingual_path.write_text("".join(f"{paragraph}\n{CHINESE_LINE}\n\n" for paragraph in paragraphs), encoding='utf-8')
+    english_paths = []
+    for revision_idx, num_edits in enumerate(num_edits_per_revision):
+        english_path = tmp_path / f"revision{revision_idx}.txt"
+        english_path.write_text("\n".join(_revise(paragraphs, revision_idx, num_edits)) + "\n", encoding='utf-8')
+        english_paths.append(str(english_path))
+    return str(bilingual_path), english_paths
+
+
+def _ranking(ranked):
+    return [(summary["english_path"], summary["edit_distance"], summary["distance_exact"], summary["punctuation_differences"],
+             summary["matched_paragraphs"], summary["error"]) for summary in ranked]
+
+
+def test_the_source_revision_ranks_first(tmp_path):
+    bilingual_path, english_paths = _write_book(tmp_path, [8, 0, 3])
+    english_paths.append(str(tmp_path / "missing.txt"))
+    seen = []
+    bilingual_document, ranked = compare_revisions(bilingual_path, english_paths, on_result=seen.append)
+    assert len(seen) == 4
+    assert [summary["english_path"] for summary in ranked] == [english_paths[1], english_paths[2], english_paths[0], english_paths[3]]
+    assert [summary["edit_distance"] for summary in ranked[:3]] == [0, 3, 8]
+    assert ranked[0]["similarity"] == 1 and ranked[0]["matched_paragraphs"] == ranked[0]["num_ref_paragraphs"] == 60
+    assert all(summary["distance_exact"] for summary in ranked[:3])
+    assert ranked[3]["error"] is not None
+    assert len(revision_compare.format_ranking(bilingual_document, ranked)) == 2 + len(ranked)
+
+
+def test_ranking_is_the_same_with_several_processes(tmp_path):
+    bilingual_path, english_paths = _write_book(tmp_path, [5, 0, 2])
+    _, ranked_serial = compare_revisions(bilingual_path, english_paths, jobs=1)
+    _, ranked_parallel = compare_revisions(bilingual_path, english_paths, jobs=2)
+    assert _ranking(ranked_parallel) == _ranking(ranked_serial)
+
+
+def _encode(words_a, words_b):
+    vocabulary = TokenVocabulary()
+    return vocabulary.encode(words_a), vocabulary.encode(words_b), vocabulary.hashes
+
+
+def test_over_budget_segments_give_an_upper_bound(monkeypatch):
+    rng = random.Random(7)
+    words_a = [f"w{rng.randrange(500)}" for _ in range(3000)]
+    words_b = list(words_a)
+    for position in rng.sample(range(len(words_b)), 40):
+        words_b[position] = "x"
+    a, b, token_hashes = _encode(words_a, words_b)
+    exact_distance, num_edits, exact = word_edit_distance(a, b, token_hashes)
+    assert (exact_distance, exact) == (40, True) and num_edits <= 40
+
+    monkeypatch.setattr(revision_compare, "EDIT_SEARCH_STEPS", 2)
+    distance, _, exact = word_edit_distance(a, b, token_hashes)
+    assert exact is False
+    assert exact_distance < distance <= max(len(a), len(b))
+
+
+def test_rank_revisions_breaks_ties_by_punctuation_then_matched_paragraphs():
+    def summary(name, distance, punctuation, matched, error=None):
+        return {"english_path": name, "edit_distance": distance, "punctuation_differences": punctuation,
+                "matched_paragraphs": matched, "error": error}
+    summaries = [summary("failed", None, None, None, error="File not found"), summary("far", 9, 0, 10),
+                 summary("fewer matches", 1, 2, 5), summary("more matches", 1, 2, 8), summary("less punctuation", 1, 1, 0)]
+    assert [ranked["english_path"] for ranked in rank_revisions(summaries)] \
+        == ["less punctuation", "more matches", "fewer matches", "far", "failed"]
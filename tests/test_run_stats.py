@@ -0,0 +1,98 @@
+import json
+import pstats
+
+import batch_compare
+import run_stats
+from run_stats import RunStats, measure_stage, timed
+
+
+class _Clock:
+    # Stands in for time.perf_counter(), advanced by hand
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fake_clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(run_stats.time, "perf_counter", clock)
+    return clock
+
+
+def test_nested_stages_charge_only_the_innermost_stage(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    stats = RunStats("words")
+    with measure_stage(stats, run_stats.STAGE_EXTRACT):
+        clock.now += 1
+        with measure_stage(stats, run_stats.STAGE_READ):
+            clock.now += 2
+        clock.now += 3
+    with measure_stage(stats, run_stats.STAGE_READ):
+        clock.now += 4
+    clock.now += 50 # Outside any stage
+    stats.add_stage_seconds(run_stats.STAGE_RENDER, 0.5)
+
+    assert stats.stage_seconds == {run_stats.STAGE_EXTRACT: 4, run_stats.STAGE_READ: 6, run_stats.STAGE_RENDER: 0.5}
+    assert list(stats.stage_seconds) == [run_stats.STAGE_EXTRACT, run_stats.STAGE_READ, run_stats.STAGE_RENDER]
+    assert stats.total_seconds() == 10.5
+
+
+def test_stage_is_closed_when_it_raises(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    stats = RunStats()
+    try:
+        with measure_stage(stats, run_stats.STAGE_COMPARE):
+            clock.now += 2
+            raise ValueError
+    except ValueError:
+        pass
+    with measure_stage(stats, run_stats.STAGE_WRITE):
+        clock.now += 1
+    assert stats.stage_seconds == {run_stats.STAGE_COMPARE: 2, run_stats.STAGE_WRITE: 1}
+
+
+def test_timed_items_are_counted_and_charged(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    stats = RunStats("words")
+
+    def lines():
+        for line_idx in range(3):
+            clock.now += 1 # Producing a line
+            yield line_idx
+    with measure_stage(stats, run_stats.STAGE_TOKENIZE):
+        for _ in timed(lines(), stats, run_stats.STAGE_READ, run_stats.COUNT_LINES_READ):
+            clock.now += 10 # Consuming it
+    stats.add(run_stats.COUNT_LINES_READ, 2)
+    stats.add(run_stats.COUNT_TOKENS)
+    assert stats.stage_seconds == {run_stats.STAGE_TOKENIZE: 30, run_stats.STAGE_READ: 3}
+    assert stats.counters == {run_stats.COUNT_LINES_READ: 5, run_stats.COUNT_TOKENS: 1}
+    assert stats.format_footer() == "words: 33.000 s (tokenize 30.000 s, read 3.000 s) | lines read: 5, tokens: 1"
+
+
+def test_nothing_is_measured_without_stats():
+    items = [1, 2]
+    assert timed(items, None, run_stats.STAGE_READ) is items
+    with measure_stage(None, run_stats.STAGE_READ):
+        pass
+
+
+def test_batch_profile_and_stats_json_are_readable(tmp_path):
+    folder = tmp_path / "book"
+    folder.mkdir()
+    (folder / "BilingualText.txt").write_text("The cat sat.\n猫坐着。\n", encoding='utf-8')
+    (folder / "EnglishText.txt").write_text("The cat sat.\n", encoding='utf-8')
+    profile_path = tmp_path / "run.prof"
+    stats_path = tmp_path / "stats.json"
+    assert batch_compare.main([str(folder), "-j", "1", "--profile", str(profile_path), "--stats-json", str(stats_path)]) \
+        == batch_compare.EXIT_OK
+
+    profile = pstats.Stats(str(profile_path))
+    assert any(function_name == "process_pair" for _, _, function_name in profile.stats)
+    (pair,) = json.loads(stats_path.read_text(encoding='utf-8'))
+    operations = {operation["operation"]: operation for operation in pair["operations"]}
+    assert operations
+    for operation in operations.values():
+        assert operation["total_seconds"] == sum(operation["stages"].values())
+        assert operation["counters"][run_stats.COUNT_BYTES_READ] > 0
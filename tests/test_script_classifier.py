@@ -0,0 +1,71 @@
+import pytest
+
+import script_classifier
+from script_classifier import (PAIRING_MISSING_CHINESE, PAIRING_MISSING_ENGLISH, PAIRING_MIXED, PAIRING_SWAPPED,
+                               SCRIPT_BLANK, SCRIPT_CHINESE, SCRIPT_ENGLISH, SCRIPT_MIXED, SCRIPT_NEUTRAL,
+                               check_pairing, classify_line, line_role)
+
+
+@pytest.mark.parametrize("line_text, script", [
+    ("The cat sat on the mat.", SCRIPT_ENGLISH),
+    ("猫坐在垫子上。", SCRIPT_CHINESE),
+    ("他说：Hello World", SCRIPT_MIXED), # Three CJK characters (with the full-width colon) against two words
+    ("Mr. Wang（王）said hi", SCRIPT_MIXED),
+    ("Mr. Wang said hi to 王", SCRIPT_ENGLISH), # One character is below the mixed share
+    ("他说：Hello", SCRIPT_CHINESE),
+    ("Café au lait", SCRIPT_ENGLISH),
+    ("1. 2. 3.", SCRIPT_NEUTRAL),
+    (" ;:!? -- ...", SCRIPT_NEUTRAL),
+    ("—", SCRIPT_NEUTRAL),
+    ("……！", SCRIPT_CHINESE), # Full-width punctuation only appears on the translation side
+    ("", SCRIPT_BLANK),
+    ("  \t ", SCRIPT_BLANK),
+    ("　", SCRIPT_BLANK), # The ideographic space is white space, not Chinese
+])
+def test_classify_line(line_text, script):
+    assert classify_line(line_text) == script
+
+
+def test_line_role_places_neutral_and_mixed_lines_by_position():
+    assert line_role(SCRIPT_ENGLISH, SCRIPT_ENGLISH) == SCRIPT_ENGLISH
+    assert line_role(SCRIPT_CHINESE, None) == SCRIPT_CHINESE
+    for script in (SCRIPT_NEUTRAL, SCRIPT_MIXED):
+        assert line_role(script, SCRIPT_ENGLISH) == SCRIPT_CHINESE
+        assert line_role(script, SCRIPT_CHINESE) == SCRIPT_ENGLISH
+        assert line_role(script, None) == SCRIPT_ENGLISH
+
+    lines = ["他说：Hello World", "他说了你好。", "", "1. 2. 3.", "Mr. Wang（王）said hi", "1. 2. 3."]
+    assert [(original_idx, role) for original_idx, _, _, role in script_classifier.iter_classified_lines(lines)] \
+        == [(0, SCRIPT_ENGLISH), (1, SCRIPT_CHINESE), (3, SCRIPT_ENGLISH), (4, SCRIPT_CHINESE), (5, SCRIPT_ENGLISH)]
+
+
+def _issues(report):
+    return [(issue["kind"], issue["line"]) for issue in report.issues]
+
+
+def test_well_paired_lines_have_no_issues():
+    report = check_pairing(["The cat sat.", "猫坐着。", "", "It was warm.", "天气很暖和。", "", "1. 2. 3.", "一、二、三。"])
+    assert (report.num_pairs, report.num_issues(), report.issues) == (3, 0, [])
+    assert report.line_counts == {SCRIPT_NEUTRAL: 1, SCRIPT_ENGLISH: 2, SCRIPT_CHINESE: 3, SCRIPT_MIXED: 0}
+
+
+@pytest.mark.parametrize("lines, num_pairs, issues", [
+    (["The cat sat.", "It was warm.", "天气很暖和。"], 1, [(PAIRING_MISSING_CHINESE, 1)]),
+    (["The cat sat.", "猫坐着。", "天气很暖和。", "The sun rose.", "太阳升起。"], 2, [(PAIRING_MISSING_ENGLISH, 3)]),
+    (["猫坐着。"], 0, [(PAIRING_MISSING_ENGLISH, 1)]),
+    (["The cat sat.", "猫坐着。", "天气很暖和。", "It was warm.", "", "The sun rose.", "太阳升起。"], 3, [(PAIRING_SWAPPED, 3)]),
+    (["The cat sat.", "猫坐着。", "他说：Hello World", "他说了你好。"], 2, [(PAIRING_MIXED, 3)]),
+    (["The cat sat."], 0, [(PAIRING_MISSING_CHINESE, 1)]),
+])
+def test_pairing_issues(lines, num_pairs, issues):
+    report = check_pairing(lines)
+    assert report.num_pairs == num_pairs
+    assert _issues(report) == issues
+    for kind in script_classifier.PAIRING_ISSUE_KINDS:
+        assert report.counts[kind] == sum(1 for issue_kind, _ in issues if issue_kind == kind)
+
+
+def test_issues_beyond_the_limit_are_counted_but_not_kept():
+    report = check_pairing(["The cat sat."] * 5, max_issues=2)
+    assert report.counts[PAIRING_MISSING_CHINESE] == 5
+    assert _issues(report) == [(PAIRING_MISSING_CHINESE, 1), (PAIRING_MISSING_CHINESE, 2)]
@@ -0,0 +1,36 @@
+import comparer_engine as engine
+from tagging_log import LOG_CANDIDATE, LOG_PARAGRAPH, LOG_SUMMARY, TaggingLog
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def _plan(tmp_path, **options):
+    # The first block has the paragraph's word count but not its last word
+    _write(tmp_path / "BilingualText.txt", "one two four\n一二四\none two three\n一二三\n")
+    _write(tmp_path / "EnglishText.txt", "one two three\n")
+    return engine.plan_paragraph_tagging(str(tmp_path / "BilingualText.txt"), str(tmp_path / "EnglishText.txt"), **options)
+
+
+def test_default_log_keeps_candidate_lines(tmp_path):
+    messages = "".join(_plan(tmp_path)["log"].messages())
+    assert "LAST WORD MISMATCH" in messages
+    assert "MATCHED: Bilingual block (Original lines 3 to 3)" in messages
+
+
+def test_paragraph_level_leaves_out_candidates(tmp_path):
+    messages = "".join(_plan(tmp_path, log=TaggingLog(LOG_PARAGRAPH))["log"].messages())
+    assert "LAST WORD MISMATCH" not in messages
+    assert "Attempting to match Ref Para 1" in messages
+
+
+def test_bounded_log_keeps_summary_and_latest_records():
+    log = TaggingLog(LOG_CANDIDATE, max_records=2)
+    log.add(LOG_SUMMARY, "start\n")
+    for record_idx in range(5):
+        log.add(LOG_CANDIDATE, "record {}\n", record_idx)
+    log.add(LOG_SUMMARY, "end\n")
+    assert log.num_dropped() == 3
+    assert log.messages() == ["start\n", "... 3 earlier log records not kept ...\n", "record 3\n", "record 4\n", "end\n"]
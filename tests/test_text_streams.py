@@ -0,0 +1,89 @@
+import random
+import string
+
+import pytest
+
+import text_streams
+
+CHINESE_LINE = "猫坐在垫子上。"
+
+
+def _write_bytes(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"one\ntwo\n",
+    b"one\r\ntwo\r\nthree",
+    b"one\rtwo\r\rthree\n",
+    b"no final newline",
+    b"ends with cr\r",
+    b"\n\n\r\n",
+    "café\n猫坐在垫子上。\r\n“quoted”\rlast é".encode('utf-8'),
+])
+def test_mmap_lines_match_text_mode(tmp_path, monkeypatch, data):
+    filepath = _write_bytes(tmp_path / "text.txt", data)
+    expected = list(text_streams.iter_lines(filepath, use_mmap=False))
+    assert "".join(expected) == data.decode('utf-8').replace("\r\n", "\n").replace("\r", "\n")
+    assert list(text_streams.iter_lines(filepath, use_mmap=True)) == expected
+    monkeypatch.setattr(text_streams, "MMAP_THRESHOLD_BYTES", 1)
+    assert text_streams._should_use_mmap(filepath, None) == (len(data) >= 1)
+    assert list(text_streams.iter_lines(filepath)) == expected
+
+
+def test_mmap_lines_with_multibyte_characters_across_page_boundaries(tmp_path, monkeypatch):
+    # Long lines whose three-byte characters straddle every 4 KB page and 64 KB block
+    monkeypatch.setattr(text_streams, "MMAP_THRESHOLD_BYTES", 1)
+    rng = random.Random(3)
+    lines = []
+    for _ in range(20):
+        lines.append("".join(rng.choice(["猫", "é", "a", " ", "“", "\r", "\r\n"]) for _ in range(rng.randint(1000, 30000))) + "\n")
+    data = "".join(lines).encode('utf-8')
+    assert any(0x80 <= data[offset] < 0xC0 for offset in range(4096, len(data), 4096))
+    filepath = _write_bytes(tmp_path / "text.txt", data)
+    assert list(text_streams.iter_lines(filepath)) == list(text_streams.iter_lines(filepath, use_mmap=False))
+
+
+def _baseline_words(text):
+    # The original tokenizer: the whole text, newlines made spaces, punctuation removed
+    translator = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+    return text.replace('\n', ' ').translate(translator).split()
+
+
+def test_words_match_splitting_the_whole_text(tmp_path):
+    text = "The cat's mat--it was (very) warm!\n\n  \t“Quoted,” he said...\r\nend-of-line\nno-final-newline"
+    filepath = _write_bytes(tmp_path / "text.txt", text.encode('utf-8'))
+    expected = _baseline_words(text.replace("\r\n", "\n"))
+    for use_mmap in (False, True):
+        lines = list(text_streams.iter_lines(filepath, use_mmap=use_mmap))
+        assert list(text_streams.iter_words(lines)) == expected
+        assert [word for line_words in text_streams.iter_line_words(lines) for word in line_words] == expected
+        located = list(text_streams.iter_words_with_location(enumerate(lines)))
+        assert [word for word, _, _ in located] == expected
+        for word, line_number, column in located:
+            cleaned_line = lines[line_number - 1].translate(text_streams._PUNCTUATION_TRANSLATOR)
+            assert cleaned_line[column - 1:column - 1 + len(word)] == word
+
+
+def _baseline_english_lines(text):
+    # The original extraction: every other non-blank line, starting with the first
+    content_lines = [line.rstrip('\n') for line in text.splitlines(keepends=True) if line.strip()]
+    return content_lines[0::2]
+
+
+def test_bilingual_english_lines_match_the_baseline_on_well_paired_files(tmp_path):
+    rng = random.Random(5)
+    words = ["the", "cat", "sat", "on", "mat", "it", "was", "warm", "1.", "“Yes,”", "Café"]
+    lines = []
+    for _ in range(200):
+        lines.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 9))).capitalize() + rng.choice([".", "!", ""]))
+        lines.append(CHINESE_LINE)
+        lines.extend([""] * rng.randint(0, 2))
+    text = "\n".join(lines) + "\n"
+    filepath = _write_bytes(tmp_path / "BilingualText.txt", text.encode('utf-8'))
+
+    extracted = list(text_streams.iter_bilingual_english_lines(text_streams.iter_lines(filepath)))
+    assert [line_text for _, line_text in extracted] == _baseline_english_lines(text)
+    assert all(lines[original_idx] == line_text for original_idx, line_text in extracted)
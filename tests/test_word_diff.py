@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from word_diff import EDIT_DELETE, EDIT_INSERT, EDIT_REPLACE, diff_ranges
+
+
+def _lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for item in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if item == other else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def _apply(a, b, edits):
+    # Rebuilds b from a and the edit script, checking that the untouched gaps agree
+    result = []
+    a_pos = b_pos = 0
+    for _, a_lo, a_hi, b_lo, b_hi in edits:
+        assert a[a_pos:a_lo] == b[b_pos:b_lo]
+        result.extend(a[a_pos:a_lo])
+        result.extend(b[b_lo:b_hi])
+        a_pos, b_pos = a_hi, b_hi
+    assert a[a_pos:] == b[b_pos:]
+    return result + a[a_pos:]
+
+
+def test_edit_script_is_minimal():
+    # As many changed tokens as a longest-common-subsequence diff, on random inputs
+    rng = random.Random(1)
+    for _ in range(300):
+        alphabet = "abcd"[:rng.randint(1, 4)]
+        a = [rng.choice(alphabet) for _ in range(rng.randint(0, 30))]
+        b = [rng.choice(alphabet) for _ in range(rng.randint(0, 30))]
+        edits = list(diff_ranges(a, b))
+        assert _apply(a, b, edits) == b
+        num_changed = sum((a_hi - a_lo) + (b_hi - b_lo) for _, a_lo, a_hi, b_lo, b_hi in edits)
+        assert num_changed == len(a) + len(b) - 2 * _lcs_length(a, b), (a, b)
+
+
+def test_single_inserted_word_is_one_edit():
+    a = "the quick brown fox jumps over the lazy dog".split()
+    b = "the quick brown fox quietly jumps over the lazy dog".split()
+    assert list(diff_ranges(a, b)) == [(EDIT_INSERT, 4, 4, 4, 5)]
+
+
+def test_tags_and_merged_ranges():
+    assert list(diff_ranges(list("abcdef"), list("abXYef"))) == [(EDIT_REPLACE, 2, 4, 2, 4)]
+    assert list(diff_ranges(list("abc"), list("c"))) == [(EDIT_DELETE, 0, 2, 0, 0)]
+    assert list(diff_ranges([], [])) == []
+
+
+def test_checkpoint_can_abort():
+    class Abort(Exception):
+        pass
+
+    def checkpoint():
+        raise Abort
+    with pytest.raises(Abort):
+        list(diff_ranges(list("abcdefgh"), list("hgfedcba"), checkpoint))
@@ -1,16 +1,30 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
+from tkinter import filedialog, messagebox, ttk
 import os
-import string # For string.punctuation
+import tempfile
+
+import comparer_engine as engine
+import run_stats
+from background_tasks import BackgroundTaskRunner
+from document_cache import DocumentCache
+from report_view import ReportView
+from tagging_log import LOG_CANDIDATE, LOG_LEVEL_BY_NAME, LOG_LEVEL_NAMES, TaggingLog
 
 class TextComparerApp:
     def __init__(self, master):
         self.master = master
         master.title("Text Difference Finder")
-        master.geometry("700x650") # Increased height for the new button
+        master.geometry("700x700") # Increased height for the progress bar
 
         self.bilingual_file_path = tk.StringVar()
         self.english_file_path = tk.StringVar()
+        self.use_alignment_diff = tk.BooleanVar(value=True)
+        self.use_fuzzy_matching = tk.BooleanVar(value=False)
+        self.punctuation_class = tk.StringVar(value=engine.PUNCTUATION_ASCII)
+        self.log_level = tk.StringVar(value=LOG_LEVEL_NAMES[LOG_CANDIDATE]) # Detail of the tagging log
+        self.profile_next_run = tk.BooleanVar(value=False)
+        # Parsed files are shared by all three actions until they change on disk
+        self.document_cache = DocumentCache()
 
         # --- File Selection Frame ---
         file_frame = tk.Frame(master, pady=10)
@@ -34,22 +48,42 @@ class TextComparerApp:
         tk.Button(action_frame, text="Compare English Words", command=self._compare_texts, pady=5).pack(side=tk.LEFT, padx=5)
         tk.Button(action_frame, text="Compare Punctuation", command=self._compare_punctuation, pady=5).pack(side=tk.LEFT, padx=5)
         tk.Button(action_frame, text="Tag Paragraphs", command=self._tag_paragraphs, pady=5).pack(side=tk.LEFT, padx=5) # New button
+        tk.Checkbutton(action_frame, text="Alignment word diff", variable=self.use_alignment_diff).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(action_frame, text="Fuzzy paragraph matching", variable=self.use_fuzzy_matching).pack(side=tk.LEFT, padx=5)
+        tk.Label(action_frame, text="Punctuation:").pack(side=tk.LEFT)
+        tk.OptionMenu(action_frame, self.punctuation_class, *engine.PUNCTUATION_CLASSES).pack(side=tk.LEFT)
+        tk.Label(action_frame, text="Tagging log:").pack(side=tk.LEFT)
+        tk.OptionMenu(action_frame, self.log_level, *LOG_LEVEL_NAMES.values()).pack(side=tk.LEFT)
+
+        # --- Progress Frame ---
+        # Actions run on a worker thread; clicking another action while one runs queues it
+        progress_frame = tk.Frame(master, pady=5)
+        progress_frame.pack(fill=tk.X)
+
+        self.progress_bar = ttk.Progressbar(progress_frame, mode='determinate', maximum=100)
+        self.progress_bar.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        self.cancel_button = tk.Button(progress_frame, text="Cancel", command=self._cancel_running_action, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(progress_frame, text="Profile next run", variable=self.profile_next_run).pack(side=tk.LEFT, padx=5)
+        self.status_label = tk.Label(master, text="Idle", anchor=tk.W)
+        self.status_label.pack(fill=tk.X, padx=10)
+        self.task_runner = BackgroundTaskRunner(master, self._show_progress, self._show_task_state)
 
         # --- Results Display ---
         tk.Label(master, text="Comparison Results / Log:").pack() # Changed label slightly
-        self.results_text = scrolledtext.ScrolledText(master, wrap=tk.WORD, height=20, width=80)
-        self.results_text.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
+        self.report_view = ReportView(master) # Paginated; see report_view.py
+        self.report_view.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
         
         self._preload_file_paths() # Preload after all UI elements are defined
 
     def _preload_file_paths(self):
-        bilingual_default = "BilingualText.txt"
-        english_default = "EnglishText.txt"
+        bilingual_default = engine.BILINGUAL_DEFAULT_NAME
+        english_default = engine.ENGLISH_DEFAULT_NAME
 
         # Prefer subfolder test files if they exist
         test_folder_name = "TestTaggingFolder"
-        bilingual_test_file_path_sub = os.path.join(test_folder_name, "BilingualText.txt")
-        english_test_file_path_sub = os.path.join(test_folder_name, "EnglishText.txt")
+        bilingual_test_file_path_sub = os.path.join(test_folder_name, bilingual_default)
+        english_test_file_path_sub = os.path.join(test_folder_name, english_default)
 
         if os.path.exists(bilingual_test_file_path_sub):
             self.bilingual_file_path.set(os.path.abspath(bilingual_test_file_path_sub))
@@ -90,403 +124,189 @@ class TextComparerApp:
             self.english_file_path.set("")
             self.english_label.config(text="No English file selected")
 
-    def _extract_english_from_bilingual(self, filepath):
-        english_lines_extracted = []
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-                content_lines = [line.rstrip('\n') for line in all_lines if line.strip()]
-                for i in range(0, len(content_lines), 2):
-                    english_lines_extracted.append(content_lines[i])
-            return "\n".join(english_lines_extracted)
-        except Exception as e:
-            messagebox.showerror("Error Reading Bilingual File", f"Could not read or parse bilingual file: {e}")
-            return None
-
-    def _read_english_text(self, filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            messagebox.showerror("Error Reading English File", f"Could not read English file: {e}")
-            return None
-
-    def _tokenize_and_clean_text(self, text):
-        if not text:
-            return []
-        translator = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
-        text_no_punct_attached = text.translate(translator)
-        words = text_no_punct_attached.split()
-        return words
-
-    def _extract_punctuation_with_location(self, text, text_source_name="Unknown"):
-        if not text:
-            return []
-        punctuation_marks = []
-        lines = text.splitlines() 
-        for line_idx, line_content in enumerate(lines):
-            for char_idx, char in enumerate(line_content):
-                if char in string.punctuation:
-                    punctuation_marks.append((char, line_idx + 1, char_idx + 1))
-        return punctuation_marks
-
-    def _compare_texts(self):
-        self.results_text.delete('1.0', tk.END)
+    def _get_selected_paths(self, warning_message="Please select both text files."):
         bilingual_path = self.bilingual_file_path.get()
         english_path = self.english_file_path.get()
 
         if not bilingual_path or not english_path:
-            messagebox.showwarning("Input Missing", "Please select both text files.")
-            return
-
-        extracted_bilingual_eng_raw_lines = self._extract_english_from_bilingual(bilingual_path)
-        if extracted_bilingual_eng_raw_lines is None: return
-        extracted_bilingual_eng_for_words = extracted_bilingual_eng_raw_lines.replace('\n', ' ')
-
-        pure_english_text_raw = self._read_english_text(english_path)
-        if pure_english_text_raw is None: return
-        pure_english_text_for_words = pure_english_text_raw.replace('\n', ' ')
-
-        bilingual_words = self._tokenize_and_clean_text(extracted_bilingual_eng_for_words)
-        english_words = self._tokenize_and_clean_text(pure_english_text_for_words)
-
-        if not bilingual_words and not english_words:
-            self.results_text.insert(tk.END, "Both texts are empty or contain no valid words after cleaning punctuation.\n")
-            return
-        if not bilingual_words:
-            self.results_text.insert(tk.END, "Extracted English from BilingualText is empty or has no valid words after cleaning punctuation.\n")
-            if english_words:
-                self.results_text.insert(tk.END, f"EnglishText.txt contains {len(english_words)} words after cleaning punctuation.\n")
-            return
-        if not english_words:
-            self.results_text.insert(tk.END, "EnglishText.txt is empty or has no valid words after cleaning punctuation.\n")
-            if bilingual_words:
-                 self.results_text.insert(tk.END, f"Bilingual extract contains {len(bilingual_words)} words after cleaning punctuation.\n")
-            return
-
-        differences_found = False
-        max_len = max(len(bilingual_words), len(english_words))
-
-        for i in range(max_len):
-            word_b = bilingual_words[i] if i < len(bilingual_words) else "<END_OF_BILINGUAL_EXTRACT>"
-            word_e = english_words[i] if i < len(english_words) else "<END_OF_ENGLISHTEXT>"
-
-            if word_b.lower() != word_e.lower():
-                differences_found = True
-                self.results_text.insert(tk.END, f"Difference at word index {i}:\n")
-                self.results_text.insert(tk.END, f"  Bilingual Extracted: '{word_b}'\n")
-                self.results_text.insert(tk.END, f"  EnglishText.txt:     '{word_e}'\n\n")
-
-        if not differences_found:
-            self.results_text.insert(tk.END, "No differences found between the English words (case-insensitive, after cleaning punctuation).\n")
-        
-        if len(bilingual_words) != len(english_words):
-                self.results_text.insert(tk.END, f"(Note: Cleaned word counts differ - Bilingual Extract: {len(bilingual_words)}, EnglishText: {len(english_words)})\n")
+            messagebox.showwarning("Input Missing", warning_message)
+            return None
+        return bilingual_path, english_path
+
+    # --- Background execution ---
+
+    def _run_in_background(self, description, work, on_done, on_error=None):
+        # work(progress, stats) runs on the worker thread; on_done(result, stats) shows
+        # the result and finishes the per-stage timings with the formatting and rendering.
+        stats = engine.RunStats(description)
+        if self.profile_next_run.get():
+            self.profile_next_run.set(False) # Only the next run is profiled
+            stats.profile_path = os.path.join(tempfile.gettempdir(), description.lower().replace(" ", "_") + ".prof")
+
+        def measured_work(progress):
+            if stats.profile_path is not None:
+                return run_stats.profile_call(stats.profile_path, work, progress, stats)
+            return work(progress, stats)
+
+        self.task_runner.submit(description, measured_work, lambda result: on_done(result, stats),
+                                on_error or self._show_task_error)
+
+    def _show_report(self, report_lines, difference_starts, stats):
+        with stats.stage(run_stats.STAGE_RENDER):
+            self.report_view.set_report(report_lines, difference_starts)
+        self.report_view.set_footer(stats.format_footer())
+
+    def _cancel_running_action(self):
+        self.task_runner.cancel_current()
+        self.status_label.config(text="Cancelling...")
+
+    def _show_task_state(self, running_description, num_queued):
+        queued_text = f" ({num_queued} queued)" if num_queued else ""
+        if running_description is None:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode='determinate', value=0)
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_label.config(text=f"Idle{queued_text}")
         else:
-            if not differences_found:
-                 self.results_text.insert(tk.END, f"(Cleaned word counts match: {len(bilingual_words)})\n")
-
-    def _compare_punctuation(self):
-        self.results_text.delete('1.0', tk.END)
-        bilingual_path = self.bilingual_file_path.get()
-        english_path = self.english_file_path.get()
-
-        if not bilingual_path or not english_path:
-            messagebox.showwarning("Input Missing", "Please select both text files.")
-            return
+            self.cancel_button.config(state=tk.NORMAL)
+            self.status_label.config(text=f"Running: {running_description}{queued_text}")
+
+    def _show_progress(self, description, label, done, total):
+        if total:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode='determinate', value=100.0 * done / total)
+            self.status_label.config(text=f"Running: {description} - {label}: {done:,} / {total:,}")
+        else:
+            # Line counts are not known up front while a file is streamed
+            if str(self.progress_bar.cget('mode')) != 'indeterminate':
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_bar.start(10)
+            self.status_label.config(text=f"Running: {description} - {label}: {done:,}")
+
+    def _show_task_error(self, description, error):
+        if isinstance(error, engine.OperationCancelled):
+            self.report_view.set_report([f"{description} was cancelled.\n"])
+        elif isinstance(error, engine.InputFileError):
+            messagebox.showerror(error.title, str(error))
+        else:
+            messagebox.showerror("Error", f"{description} failed: {error}")
 
-        extracted_bilingual_eng_raw = self._extract_english_from_bilingual(bilingual_path)
-        if extracted_bilingual_eng_raw is None: return
+    # --- Actions ---
 
-        pure_english_text_raw = self._read_english_text(english_path)
-        if pure_english_text_raw is None: return
+    def _compare_texts(self):
+        selected_paths = self._get_selected_paths()
+        if selected_paths is None: return
+
+        mode = engine.WORD_DIFF_ALIGN if self.use_alignment_diff.get() else engine.WORD_DIFF_INDEX
+        document_cache = self.document_cache
+        self._run_in_background(
+            "Compare English Words",
+            lambda progress, stats: engine.run_word_comparison(*selected_paths, mode=mode, document_cache=document_cache,
+                                                               progress=progress, stats=stats),
+            self._show_word_comparison,
+        )
 
-        puncts_bilingual = self._extract_punctuation_with_location(extracted_bilingual_eng_raw, "Bilingual Extract")
-        puncts_english = self._extract_punctuation_with_location(pure_english_text_raw, "EnglishText.txt")
+    def _show_word_comparison(self, result, stats):
+        difference_starts = []
+        with stats.stage(run_stats.STAGE_FORMAT):
+            report_lines = engine.format_word_comparison(result, difference_starts)
+        self._show_report(report_lines, difference_starts, stats)
 
-        if not puncts_bilingual and not puncts_english:
-            self.results_text.insert(tk.END, "No punctuation found in either text.\n")
-            return
+    def _compare_punctuation(self):
+        selected_paths = self._get_selected_paths()
+        if selected_paths is None: return
+
+        document_cache = self.document_cache
+        punctuation_class = self.punctuation_class.get()
+        self._run_in_background(
+            "Compare Punctuation",
+            lambda progress, stats: engine.run_punctuation_comparison(*selected_paths, document_cache=document_cache, progress=progress,
+                                                                      punctuation_class=punctuation_class, stats=stats),
+            self._show_punctuation_comparison,
+        )
 
-        self.results_text.insert(tk.END, "Punctuation Comparison:\n\n")
-        differences_found = False
-        max_len = max(len(puncts_bilingual), len(puncts_english))
-
-        for i in range(max_len):
-            p_b_char, p_b_line, p_b_col = (None, None, None)
-            p_e_char, p_e_line, p_e_col = (None, None, None)
-            diff_type = ""
-
-            if i < len(puncts_bilingual):
-                p_b_char, p_b_line, p_b_col = puncts_bilingual[i]
-            else:
-                diff_type = "EnglishText.txt has fewer punctuation marks."
-
-            if i < len(puncts_english):
-                p_e_char, p_e_line, p_e_col = puncts_english[i]
-            else:
-                diff_type = "Bilingual Extract has fewer punctuation marks."
-            
-            if p_b_char is not None and p_e_char is not None:
-                if p_b_char != p_e_char:
-                    diff_type = "Punctuation characters differ."
-            
-            if diff_type: 
-                differences_found = True
-                self.results_text.insert(tk.END, f"Difference in punctuation sequence at occurrence #{i+1}:\n")
-                if p_b_char is not None:
-                    self.results_text.insert(tk.END, f"  Bilingual Extract: '{p_b_char}' (Line {p_b_line}, Char {p_b_col})\n")
-                else:
-                    self.results_text.insert(tk.END, f"  Bilingual Extract: <NO PUNCTUATION AT THIS POSITION>\n")
-
-                if p_e_char is not None:
-                    self.results_text.insert(tk.END, f"  EnglishText.txt:     '{p_e_char}' (Line {p_e_line}, Char {p_e_col})\n")
-                else:
-                    self.results_text.insert(tk.END, f"  EnglishText.txt:     <NO PUNCTUATION AT THIS POSITION>\n")
-                self.results_text.insert(tk.END, f"  Reason: {diff_type}\n\n")
-
-        if not differences_found:
-            self.results_text.insert(tk.END, "No differences found in the sequence of punctuation marks.\n")
-
-        if len(puncts_bilingual) != len(puncts_english):
-            self.results_text.insert(tk.END, f"(Note: Punctuation counts differ - Bilingual Extract: {len(puncts_bilingual)}, EnglishText: {len(puncts_english)})\n")
-        elif not differences_found:
-             self.results_text.insert(tk.END, f"(Punctuation counts match: {len(puncts_bilingual)})\n")
-
-    def _count_words(self, text_line):
-        return len(text_line.strip().split())
-
-    def _get_last_word(self, text_line):
-        words = text_line.strip().split()
-        if words:
-            last_word = words[-1]
-            last_word_cleaned = last_word.rstrip(string.punctuation)
-            return last_word_cleaned
-        return ""
+    def _show_punctuation_comparison(self, result, stats):
+        difference_starts = []
+        with stats.stage(run_stats.STAGE_FORMAT):
+            report_lines = engine.format_punctuation_comparison(result, difference_starts)
+        self._show_report(report_lines, difference_starts, stats)
 
     def _tag_paragraphs(self):
-        self.results_text.delete('1.0', tk.END)
-        detailed_log_messages = ["Starting paragraph tagging process...\n"]
-
         bilingual_input_path = self.bilingual_file_path.get()
         english_ref_path = self.english_file_path.get()
 
         if not bilingual_input_path or not english_ref_path:
             error_msg = "ERROR: Input files missing. Please select both bilingual and English text files.\n"
-            self.results_text.insert(tk.END, error_msg) # Show error directly
+            self.report_view.set_report([error_msg]) # Show error directly
             messagebox.showwarning("Input Missing", "Please select both text files for paragraph tagging.")
             return
 
-        try:
-            with open(bilingual_input_path, 'r', encoding='utf-8') as f:
-                bilingual_lines_raw = f.readlines()
-            with open(english_ref_path, 'r', encoding='utf-8') as f:
-                english_ref_lines_raw = f.readlines()
-        except Exception as e:
-            error_msg = f"Error reading files: {e}"
-            self.results_text.insert(tk.END, f"CRITICAL ERROR: {error_msg}\n") # Show error directly
-            messagebox.showerror("File Error", error_msg)
+        document_cache = self.document_cache
+        match_mode = engine.MATCH_FUZZY if self.use_fuzzy_matching.get() else engine.MATCH_EXACT
+        log_level = LOG_LEVEL_BY_NAME[self.log_level.get()]
+
+        def plan_and_write(progress, stats):
+            tagging_result = engine.plan_paragraph_tagging(bilingual_input_path, english_ref_path,
+                                                           document_cache=document_cache, progress=progress, stats=stats,
+                                                           match_mode=match_mode, log=TaggingLog(log_level))
+            # Formatted here rather than on the Tk thread
+            detailed_log_messages = tagging_result["log"].messages()
+            # A failed write still shows the detailed log, so it is reported with the result
+            try:
+                engine.write_tagged_file(tagging_result, stats)
+            except Exception as e:
+                return tagging_result, detailed_log_messages, e
+            return tagging_result, detailed_log_messages, None
+
+        self._run_in_background("Tag Paragraphs", plan_and_write, self._show_tagging_result, self._show_tagging_error)
+
+    def _show_tagging_error(self, description, error):
+        if isinstance(error, engine.OperationCancelled):
+            self._show_task_error(description, error)
             return
+        error_msg = f"Error reading files: {error}"
+        self.report_view.set_report([f"CRITICAL ERROR: {error_msg}\n"]) # Show error directly
+        messagebox.showerror("File Error", error_msg)
 
-        english_ref_paragraphs_info = []
-        for line_num, line_text in enumerate(english_ref_lines_raw):
-            text = line_text.strip()
-            if not text: continue
-            word_count = self._count_words(text)
-            last_word = self._get_last_word(text)
-            if word_count > 0:
-                english_ref_paragraphs_info.append({
-                    "text": text, "word_count": word_count,
-                    "last_word": last_word, "original_line_num": line_num + 1
-                })
-        # This info is now part of the detailed log, not the matching summary directly
-        # detailed_log_messages.append(f"Processed {len(english_ref_paragraphs_info)} non-blank paragraphs from English reference file.\n")
-
-        potential_bilingual_content_lines_info = []
-        for original_idx, line_text in enumerate(bilingual_lines_raw):
-            if line_text.strip():
-                potential_bilingual_content_lines_info.append({
-                    "text_content_no_newline": line_text.rstrip('\n'),
-                    "original_full_line_text": line_text, "original_idx": original_idx
-                })
-
-        bilingual_eng_lines_with_info = []
-        for i in range(0, len(potential_bilingual_content_lines_info), 2):
-            bilingual_eng_lines_with_info.append(potential_bilingual_content_lines_info[i])
-
-        if not bilingual_eng_lines_with_info:
-            detailed_log_messages.append("WARNING: No potential English lines identified in the bilingual file based on 'every other non-blank line' rule.\n")
-        else:
-            detailed_log_messages.append(f"Identified {len(bilingual_eng_lines_with_info)} potential English lines from bilingual file.\n")
+    def _show_tagging_result(self, result, stats):
+        tagging_result, detailed_log_messages, write_error = result
+        output_filepath = tagging_result["output_filepath"]
+        num_tags_added = tagging_result["num_tags_added"]
 
-        bilingual_filename_itself = os.path.basename(bilingual_input_path)
-        containing_folder_path = os.path.dirname(bilingual_input_path)
-        normalized_containing_folder_path = os.path.normpath(containing_folder_path)
-        folder_name_for_output_file_base = os.path.basename(normalized_containing_folder_path)
-        
-        is_special_case_for_naming = False
-        if not folder_name_for_output_file_base or folder_name_for_output_file_base == ".":
-            is_special_case_for_naming = True
-        elif os.name == 'nt' and len(folder_name_for_output_file_base) == 2 and \
-             folder_name_for_output_file_base[1] == ':' and folder_name_for_output_file_base[0].isalpha():
-            is_special_case_for_naming = True
-        elif os.name != 'nt' and folder_name_for_output_file_base == os.sep: # For root path like '/'
-            is_special_case_for_naming = True
-
-        if is_special_case_for_naming:
-            bilingual_file_name_base, _ = os.path.splitext(bilingual_filename_itself)
-            output_file_basename = bilingual_file_name_base + "_Tagged"
-            detailed_log_messages.append(
-                f"INFO: Bilingual file's containing folder is root, CWD, or ambiguous. Using fallback output name: {output_file_basename}.txt\n"
-            )
-        else:
-            output_file_basename = folder_name_for_output_file_base
-        
-        output_filename = output_file_basename + ".txt"
-        output_dir = containing_folder_path if containing_folder_path else os.getcwd()
-        output_filepath = os.path.join(output_dir, output_filename)
-        # This info is also part of the detailed log
-        # detailed_log_messages.append(f"INFO: Target output file path set to: {output_filepath}\n")
-
-        original_indices_of_lines_to_pre_tag = set()
-        bilingual_search_start_idx = 0
-        num_successful_matches = 0
-        num_last_word_mismatches_for_wc_match = 0
-        num_unmatched_ref_paras = 0
-
-        detailed_log_messages.append("\n--- Matching Process ---\n")
-        for ref_para_idx, ref_para_info in enumerate(english_ref_paragraphs_info):
-            ref_wc = ref_para_info["word_count"]
-            ref_lw_cleaned = ref_para_info["last_word"]
-            detailed_log_messages.append(f"Attempting to match Ref Para {ref_para_idx + 1} (Line {ref_para_info['original_line_num']}, WC: {ref_wc}, Cleaned LW: '{ref_lw_cleaned}')\n")
-
-            found_match_for_this_ref_para = False
-            if bilingual_eng_lines_with_info:
-                for i in range(bilingual_search_start_idx, len(bilingual_eng_lines_with_info)):
-                    current_block_word_count = 0
-                    current_block_lines_info = []
-                    for j in range(i, len(bilingual_eng_lines_with_info)):
-                        bili_eng_line_info = bilingual_eng_lines_with_info[j]
-                        line_text_no_newline = bili_eng_line_info["text_content_no_newline"]
-                        line_word_count = self._count_words(line_text_no_newline)
-
-                        if current_block_word_count + line_word_count > ref_wc: break
-                        current_block_word_count += line_word_count
-                        current_block_lines_info.append(bili_eng_line_info)
-
-                        if current_block_word_count == ref_wc:
-                            block_last_line_text = current_block_lines_info[-1]["text_content_no_newline"]
-                            block_last_word_cleaned = self._get_last_word(block_last_line_text)
-                            if block_last_word_cleaned.lower() == ref_lw_cleaned.lower():
-                                first_line_original_idx = current_block_lines_info[0]["original_idx"]
-                                original_indices_of_lines_to_pre_tag.add(first_line_original_idx)
-                                num_successful_matches += 1
-                                bilingual_search_start_idx = j + 1
-                                found_match_for_this_ref_para = True
-                                detailed_log_messages.append(f"  MATCHED: Bilingual block (Original lines {current_block_lines_info[0]['original_idx']+1} to {bili_eng_line_info['original_idx']+1}) WC: {current_block_word_count}, Cleaned LW: '{block_last_word_cleaned}'.\n")
-                                break
-                            else:
-                                num_last_word_mismatches_for_wc_match +=1
-                                detailed_log_messages.append(f"  LAST WORD MISMATCH: Ref Para (Cleaned LW: '{ref_lw_cleaned}') vs Bilingual block (Cleaned LW '{block_last_word_cleaned}', Original last line idx: {bili_eng_line_info['original_idx']+1}). WC ({ref_wc}) matched. Block not chosen.\n")
-                    if found_match_for_this_ref_para: break
-            
-            if not found_match_for_this_ref_para:
-                num_unmatched_ref_paras +=1
-                detailed_log_messages.append(f"  NO MATCH FOUND for Ref Para {ref_para_idx + 1} in remaining bilingual text.\n")
-        
-        detailed_log_messages.append("--- Matching Process Complete ---\n\n")
-
-        output_lines_for_tagged_file = []
-        for original_idx, original_line_text in enumerate(bilingual_lines_raw):
-            if original_idx in original_indices_of_lines_to_pre_tag:
-                output_lines_for_tagged_file.append("<paragraph>\n")
-            output_lines_for_tagged_file.append(original_line_text)
-        num_tags_added = len(original_indices_of_lines_to_pre_tag)
-
-        # --- Assemble and Display Summaries and Logs ---
-        overall_summary_lines = []
-        matching_summary_lines = []
-        detailed_log_header = []
-
-        try:
-            with open(output_filepath, 'w', encoding='utf-8') as f:
-                f.writelines(output_lines_for_tagged_file)
-
-            # 1. Overall Operation Summary
-            op_summary_title = "Tagging Operation Summary:"
-            op_summary_sep = "-" * len(op_summary_title)
-            overall_summary_lines.extend([
-                f"{op_summary_title}\n",
-                f"{op_summary_sep}\n",
-                f"Output File: {output_filepath}\n",
-                f"Number of <paragraph> tags added: {num_tags_added}\n",
-                f"{op_summary_sep}\n\n"
-            ])
-
-            # 2. Summary of Matching
-            match_summary_title = "Summary of Matching:"
-            match_summary_sep = "-" * len(match_summary_title)
-            matching_summary_lines.extend([
-                f"{match_summary_title}\n",
-                f"{match_summary_sep}\n",
-                f"Total English reference paragraphs processed: {len(english_ref_paragraphs_info)}\n",
-                f"Successfully matched and tagged: {num_successful_matches}\n",
-            ])
-            if num_last_word_mismatches_for_wc_match > 0:
-                matching_summary_lines.append(
-                    f"Word count matches with last word mismatch (not tagged): {num_last_word_mismatches_for_wc_match}\n"
-                )
-            if num_unmatched_ref_paras > 0:
-                matching_summary_lines.append(
-                    f"Reference paragraphs with no suitable block found: {num_unmatched_ref_paras}\n"
-                )
-            if num_tags_added == 0 and len(english_ref_paragraphs_info) > 0 and num_successful_matches == 0:
-                matching_summary_lines.append(
-                    "(No English paragraphs from the reference file could be matched and tagged based on criteria.)\n"
-                )
-            matching_summary_lines.append(f"{match_summary_sep}\n\n")
-
-            # 3. Detailed Log Header
-            log_header_title = "Detailed Log:"
-            log_header_sep = "-" * len(log_header_title)
-            detailed_log_header.extend([
-                f"{log_header_title}\n",
-                f"{log_header_sep}\n"
-            ])
-            
-            # Insert into ScrolledText in desired order
-            self.results_text.insert('1.0', "".join(overall_summary_lines))
-            self.results_text.insert(tk.END, "".join(matching_summary_lines))
-            self.results_text.insert(tk.END, "".join(detailed_log_header))
-            self.results_text.insert(tk.END, "".join(detailed_log_messages)) # The actual step-by-step log
-            
-            if num_successful_matches > 0 :
-                 messagebox.showinfo("Success", f"Tagging complete. {num_tags_added} tags added. Output: {output_filepath}\nSee log for details.")
-            else:
-                 messagebox.showwarning("Tagging Complete (Potential Issues)", f"Tagging process ran. {num_tags_added} tags added. Output: {output_filepath}\nReview 'Summary of Matching' and 'Detailed Log' for details.")
-
-        except Exception as e:
-            error_msg = f"Could not write tagged file to {output_filepath}: {e}"
+        if write_error is not None:
+            error_msg = f"Could not write tagged file to {output_filepath}: {write_error}"
             # Display error prominently if file write fails
-            self.results_text.insert('1.0', f"CRITICAL FILE WRITE ERROR: {error_msg}\n{'-'*20}\n\n")
-            self.results_text.insert(tk.END, "".join(detailed_log_messages))
+            self.report_view.set_report([f"CRITICAL FILE WRITE ERROR: {error_msg}\n{'-'*20}\n\n"] + detailed_log_messages)
             messagebox.showerror("File Write Error", error_msg)
+            return
+
+        # Summaries first, then the step-by-step log; unmatched paragraphs count as differences
+        with stats.stage(run_stats.STAGE_FORMAT):
+            summary_lines = engine.format_tagging_summary(tagging_result)
+            difference_starts = [len(summary_lines) + log_idx for log_idx, message in enumerate(detailed_log_messages)
+                                 if message.startswith("  NO MATCH FOUND")]
+        self._show_report(summary_lines + detailed_log_messages, difference_starts, stats)
+
+        if tagging_result["num_successful_matches"] > 0 :
+             messagebox.showinfo("Success", f"Tagging complete. {num_tags_added} tags added. Output: {output_filepath}\nSee log for details.")
+        else:
+             messagebox.showwarning("Tagging Complete (Potential Issues)", f"Tagging process ran. {num_tags_added} tags added. Output: {output_filepath}\nReview 'Summary of Matching' and 'Detailed Log' for details.")
 
 
 if __name__ == "__main__":
     # Create dummy files for testing all features, including paragraph tagging
     bilingual_test_content = """This is an English sentence.
-Ceci est une phrase française.
+这是一个英文句子。
 It has seven words in total.
-Il a sept mots au total.
+它一共有七个单词。
 This should be the start of another paragraph.
-Cela devrait être le début d'un autre paragraphe.
+这应该是另一个段落的开头。
 And this continues it, having ten words combined.
-Et cela continue, ayant dix mots combinés.
+这句接着上一句，两句合起来有十个单词。
 A short one.
-Un court.
+一个短句。
 Another final English sentence.
-Une autre dernière phrase anglaise.
+另一个最后的英文句子。
 """
     english_test_content = """This is an English sentence. It has seven words in total.
 This should be the start of another paragraph. And this continues it, having ten words combined.
@@ -513,7 +333,7 @@ A different paragraph not matching bilingual exactly.
 
     if not os.path.exists("BilingualText_CWD.txt"):
          with open("BilingualText_CWD.txt", "w", encoding="utf-8") as f:
-            f.write("English line in CWD.\nFrench line in CWD.")
+            f.write("English line in CWD.\n当前目录中的中文行。")
          print("Created dummy file: BilingualText_CWD.txt")
     if not os.path.exists("EnglishText_CWD.txt"):
          with open("EnglishText_CWD.txt", "w", encoding="utf-8") as f:
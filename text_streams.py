@@ -0,0 +1,132 @@
+import mmap
+import os
+import re
+import string # For string.punctuation
+
+from punctuation_scanner import iter_punctuation_with_location
+from script_classifier import SCRIPT_ENGLISH, iter_classified_lines
+
+# Generator-based readers. Files are consumed one line at a time so the comparison
+# and tagging pipelines never hold a whole document (or several copies of it) in memory.
+
+# iter_punctuation_with_location() comes from punctuation_scanner.py
+__all__ = [
+    "MMAP_THRESHOLD_BYTES", "PROGRESS_INTERVAL_LINES", "iter_lines", "iter_with_progress", "count_words",
+    "get_last_word", "iter_bilingual_english_lines", "line_words", "iter_line_words", "iter_words",
+    "iter_words_with_location", "iter_punctuation_with_location"
+]
+
+MMAP_THRESHOLD_BYTES = 256 * 1024 * 1024 # Files at least this large are memory-mapped by default
+PROGRESS_INTERVAL_LINES = 1000
+
+_PUNCTUATION_TRANSLATOR = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+_WORD_RE = re.compile(r"\S+") # Same boundaries as str.split()
+
+
+def _should_use_mmap(filepath, use_mmap):
+    if use_mmap is None:
+        return os.path.getsize(filepath) >= MMAP_THRESHOLD_BYTES
+    return use_mmap
+
+
+def _iter_lines_mmap(filepath):
+    # Splits on b'\n' straight from the page cache and decodes one line at a time.
+    # '\r\n' and lone '\r' are normalized like Python's universal newlines mode.
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            size = len(mapped)
+            position = 0
+            while position < size:
+                newline_pos = mapped.find(b'\n', position)
+                end = size if newline_pos == -1 else newline_pos + 1
+                line = mapped[position:end].decode('utf-8')
+                position = end
+                if '\r' in line:
+                    normalized = line.replace('\r\n', '\n').replace('\r', '\n')
+                    pieces = normalized.split('\n')
+                    for piece in pieces[:-1]:
+                        yield piece + '\n'
+                    if pieces[-1]:
+                        yield pieces[-1]
+                else:
+                    yield line
+
+
+def iter_lines(filepath, use_mmap=None):
+    # Yields the lines of a UTF-8 text file with their line endings (like readlines()).
+    # use_mmap: True/False to force a reader, None to memory-map only very large files.
+    if _should_use_mmap(filepath, use_mmap):
+        yield from _iter_lines_mmap(filepath)
+        return
+    with open(filepath, 'r', encoding='utf-8') as f:
+        yield from f
+
+
+def iter_with_progress(items, progress, label, interval=PROGRESS_INTERVAL_LINES):
+    # Passes items through, calling progress(label, count, None) every interval items
+    # and once at the end. progress may raise to abort the run.
+    if progress is None:
+        yield from items
+        return
+    count = 0
+    for item in items:
+        yield item
+        count += 1
+        if count % interval == 0:
+            progress(label, count, None)
+    progress(label, count, None)
+
+
+def count_words(text_line):
+    return len(text_line.strip().split())
+
+
+def get_last_word(text_line):
+    words = text_line.strip().split()
+    if words:
+        last_word = words[-1]
+        last_word_cleaned = last_word.rstrip(string.punctuation)
+        return last_word_cleaned
+    return ""
+
+
+def iter_bilingual_english_lines(lines, pairing=None):
+    # Yields (original_idx, line_without_newline) for the English lines of a bilingual
+    # file, told apart from the Chinese lines by their script (see script_classifier.py).
+    # Every non-blank line is also passed to pairing, a PairingReport, if given.
+    for original_idx, line_text, script, role in iter_classified_lines(lines):
+        if pairing is not None:
+            pairing.add(original_idx, script, role)
+        if role == SCRIPT_ENGLISH:
+            yield original_idx, line_text.rstrip('\n')
+    if pairing is not None:
+        pairing.finish()
+
+
+def line_words(line_text):
+    # Cleaned words of one line, as produced by iter_words()
+    return line_text.translate(_PUNCTUATION_TRANSLATOR).split()
+
+
+def iter_line_words(lines):
+    # One list of cleaned words per line
+    for line_text in lines:
+        yield line_text.translate(_PUNCTUATION_TRANSLATOR).split()
+
+
+def iter_words(lines):
+    # Tokenizes line by line; words never span lines, so this matches tokenizing
+    # the joined text.
+    for line_text in lines:
+        yield from line_text.translate(_PUNCTUATION_TRANSLATOR).split()
+
+
+def iter_words_with_location(indexed_lines):
+    # Same words as iter_words() as (word, line_number, column) for (original_idx, line)
+    # pairs, both 1-based. Punctuation is replaced one-for-one by spaces, so columns in
+    # the cleaned line are columns in the original one.
+    for original_idx, line_text in indexed_lines:
+        for match in _WORD_RE.finditer(line_text.translate(_PUNCTUATION_TRANSLATOR)):
+            yield match.group(), original_idx + 1, match.start() + 1
@@ -0,0 +1,96 @@
+import zlib
+from array import array
+from itertools import compress
+from operator import ne
+
+try:
+    import numpy # Optional; mismatches are found by comparing blocks of the arrays without it
+except ImportError:
+    numpy = None
+
+# Compact word storage. Every distinct word gets an integer id in a TokenVocabulary
+# and a document is an array('I') of ids, 4 bytes per token. The id of each word's
+# lower-case form is looked up once per distinct word, so case-insensitive equality
+# of two tokens is equality of their folded ids and whole arrays compare at C speed.
+
+COMPARE_BLOCK_TOKENS = 1024 # Equal blocks of this many tokens are skipped with one comparison
+_ID_BYTES = array('I').itemsize
+
+
+class TokenVocabulary:
+    def __init__(self):
+        self.words = [] # id -> word
+        self.folded_ids = array('I') # id -> id of the word in lower case
+        # id -> CRC-32 of the word: unlike hash() of a str, the same in every process,
+        # and unlike the id, independent of the order in which words were interned
+        self.hashes = array('I')
+        self._ids = {} # word -> id
+
+    def __len__(self):
+        return len(self.words)
+
+    def intern(self, word):
+        token_id = self._ids.get(word)
+        if token_id is None:
+            token_id = len(self.words)
+            self._ids[word] = token_id
+            self.words.append(word)
+            self.hashes.append(zlib.crc32(word.encode('utf-8')))
+            self.folded_ids.append(token_id)
+            folded = word.lower()
+            if folded != word:
+                self.folded_ids[token_id] = self.intern(folded)
+        return token_id
+
+    def encode(self, words):
+        words = self._interned(words)
+        return array('I', map(self._ids.__getitem__, words))
+
+    def _interned(self, words):
+        # words as a list, after interning the new ones in order of first occurrence
+        words = words if isinstance(words, list) else list(words)
+        ids = self._ids
+        for word in dict.fromkeys(words):
+            if word not in ids:
+                self.intern(word)
+        return words
+
+    def fold(self, token_ids):
+        return array('I', map(self.folded_ids.__getitem__, token_ids))
+
+
+class TokenWords:
+    # Read-only sequence of the words behind an id array (len, indexing, slicing)
+    def __init__(self, token_ids, vocabulary):
+        self.token_ids = token_ids
+        self.vocabulary = vocabulary
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(map(self.vocabulary.words.__getitem__, self.token_ids[index]))
+        return self.vocabulary.words[self.token_ids[index]]
+
+    def __iter__(self):
+        return map(self.vocabulary.words.__getitem__, self.token_ids)
+
+
+def differing_positions(ids_a, ids_b):
+    # Positions below the shorter length at which two id arrays differ, ascending
+    length = min(len(ids_a), len(ids_b))
+    if numpy is not None:
+        values_a = numpy.frombuffer(ids_a, dtype=numpy.uint32, count=length)
+        values_b = numpy.frombuffer(ids_b, dtype=numpy.uint32, count=length)
+        return numpy.flatnonzero(values_a != values_b).tolist()
+    bytes_a = memoryview(ids_a).cast('B')
+    bytes_b = memoryview(ids_b).cast('B')
+    positions = []
+    for block_start in range(0, length, COMPARE_BLOCK_TOKENS):
+        block_end = min(length, block_start + COMPARE_BLOCK_TOKENS)
+        if bytes_a[block_start * _ID_BYTES:block_end * _ID_BYTES] == bytes_b[block_start * _ID_BYTES:block_end * _ID_BYTES]:
+            continue
+        positions.extend(compress(range(block_start, block_end),
+                                  map(ne, ids_a[block_start:block_end], ids_b[block_start:block_end])))
+    return positions
@@ -0,0 +1,124 @@
+import argparse
+import os
+import sys
+import time
+
+import comparer_engine as engine
+from incremental_compare import IncrementalComparison
+
+# Watch mode: compares one bilingual/English pair, then polls both files and keeps the
+# word differences, punctuation differences and tagged file up to date as they are
+# edited. Only the changed lines are re-parsed and re-compared (incremental_compare.py).
+
+DEFAULT_INTERVAL_SECONDS = 0.5
+EXIT_OK = 0
+EXIT_ERRORS = 2
+
+
+def format_update(comparison, update, previous_counts, seconds):
+    counts = current_counts(comparison)
+    if update["changed_lines"] is None:
+        changed = "loaded"
+    else:
+        changed = ", ".join(f"{os.path.basename(path)} {num_lines} lines changed" for path, num_lines in update["changed_lines"].items())
+    parts = [f"[{time.strftime('%H:%M:%S')}] {changed}"]
+    for label, key in (("word differences", "words"), ("punctuation differences", "punctuation")):
+        part = f"{label}: {counts[key]}"
+        if previous_counts is not None and counts[key] != previous_counts[key]:
+            part += f" ({counts[key] - previous_counts[key]:+d})"
+        parts.append(part)
+    tags = f"tags: {counts['tags']}"
+    if update["changed_tags"]:
+        tags += f" ({update['changed_tags']} changed)"
+    parts.append(tags)
+    if update["first_changed_output_line"] is not None:
+        parts.append(f"tagged file changed from line {update['first_changed_output_line']}")
+    parts.append(f"{seconds * 1000:.1f} ms")
+    return " | ".join(parts)
+
+
+def current_counts(comparison):
+    return {
+        "words": comparison.num_word_differences(),
+        "punctuation": comparison.num_punctuation_differences(),
+        "tags": comparison.num_tags(),
+    }
+
+
+def write_report(comparison, report_path):
+    report_lines = engine.format_word_comparison(comparison.word_result())
+    report_lines.append("\n")
+    report_lines.extend(engine.format_punctuation_comparison(comparison.punctuation_result()))
+    report_lines.append("\n")
+    report_lines.extend(engine.format_tagging_summary(comparison.tagging_result())[:-2]) # Without the detailed log header
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.writelines(report_lines)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Compare a bilingual/English pair and re-compare incrementally whenever either file changes."
+    )
+    parser.add_argument("folder", help="Folder holding the two files")
+    parser.add_argument("--bilingual-name", default=engine.BILINGUAL_DEFAULT_NAME,
+                        help=f"File name of the bilingual text (default: {engine.BILINGUAL_DEFAULT_NAME})")
+    parser.add_argument("--english-name", default=engine.ENGLISH_DEFAULT_NAME,
+                        help=f"File name of the English reference text (default: {engine.ENGLISH_DEFAULT_NAME})")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_SECONDS,
+                        help=f"Seconds between checks for changes (default: {DEFAULT_INTERVAL_SECONDS})")
+    parser.add_argument("--word-diff", choices=engine.WORD_DIFF_MODES, default=engine.WORD_DIFF_ALIGN,
+                        help="Word comparison mode (default: align)")
+    parser.add_argument("--punctuation-class", choices=engine.PUNCTUATION_CLASSES, default=engine.PUNCTUATION_ASCII,
+                        help="Characters treated as punctuation (default: ascii)")
+    parser.add_argument("--no-write", action="store_true", help="Do not write the tagged file")
+    parser.add_argument("--report", metavar="FILE",
+                        help="Rewrite the full word and punctuation report and tagging summary to FILE after every change")
+    parser.add_argument("--stats", action="store_true", help="Print per-stage timings of every update")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    bilingual_path = os.path.join(args.folder, args.bilingual_name)
+    english_path = os.path.join(args.folder, args.english_name)
+    for path in (bilingual_path, english_path):
+        if not os.path.isfile(path):
+            print(f"File not found: {path}", file=sys.stderr)
+            return EXIT_ERRORS
+
+    comparison = IncrementalComparison(bilingual_path, english_path, args.word_diff, args.punctuation_class,
+                                       write_tagged=not args.no_write)
+    if not args.no_write and not comparison.write_tagged:
+        print(f"Not writing the tagged file: {comparison.output_filepath} is the watched bilingual file", file=sys.stderr)
+
+    previous_counts = None
+    update_method = comparison.load
+    print(f"Watching {bilingual_path} and {english_path} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            stats = engine.RunStats("Update") if args.stats else None
+            start = time.perf_counter()
+            try:
+                update = update_method(stats)
+            except (OSError, engine.InputFileError) as e:
+                # Usually a file caught in the middle of being saved; retried on the next check
+                print(f"[{time.strftime('%H:%M:%S')}] {e}", file=sys.stderr, flush=True)
+                update = None
+            else:
+                update_method = comparison.refresh
+            seconds = time.perf_counter() - start
+            if update is not None:
+                print(format_update(comparison, update, previous_counts, seconds), flush=True)
+                if stats is not None:
+                    print(f"  {stats.format_footer()}", flush=True)
+                if args.report:
+                    write_report(comparison, args.report)
+                previous_counts = current_counts(comparison)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# Alignment-based diff for token sequences (Myers' O(ND) shortest edit script).
+#
+# The search uses the linear-space "middle snake" bisection, so memory stays
+# proportional to the number of edits D instead of N*M or N*D, and the work is
+# dominated by the real differences rather than by document length.
+
+EDIT_REPLACE = "replace"
+EDIT_DELETE = "delete" # Tokens only present in sequence a
+EDIT_INSERT = "insert" # Tokens only present in sequence b
+
+
+def _bisect(a, a_lo, a_hi, b, b_lo, b_hi, checkpoint):
+    # Finds the middle snake of the shortest edit script between a[a_lo:a_hi] and
+    # b[b_lo:b_hi] by running the greedy search from both ends at once.
+    # Returns the split point (x, y) relative to a_lo/b_lo, or None if the two
+    # ranges have nothing in common.
+    len_a = a_hi - a_lo
+    len_b = b_hi - b_lo
+    max_d = (len_a + len_b + 1) // 2
+    v_offset = max_d
+    v_length = 2 * max_d + 2
+    v1 = [-1] * v_length
+    v2 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+    delta = len_a - len_b
+    # If the total number of tokens is odd the front path collides with the reverse path
+    front = (delta % 2 != 0)
+    # Offsets for the start and end of k loop, preventing mapping of space beyond the grid
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d):
+        if checkpoint is not None:
+            checkpoint()
+        # Walk the front path one step
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < len_a and y1 < len_b and a[a_lo + x1] == b[b_lo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > len_a:
+                k1end += 2 # Ran off the right of the grid
+            elif y1 > len_b:
+                k1start += 2 # Ran off the bottom of the grid
+            elif front:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and v2[k2_offset] != -1:
+                    x2 = len_a - v2[k2_offset] # Mirror x2 onto top-left coordinate system
+                    if x1 >= x2:
+                        return x1, y1
+
+        # Walk the reverse path one step
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < len_a and y2 < len_b and a[a_hi - x2 - 1] == b[b_hi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > len_a:
+                k2end += 2
+            elif y2 > len_b:
+                k2start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = v_offset + x1 - k1_offset
+                    x2 = len_a - x2 # Mirror x2 onto top-left coordinate system
+                    if x1 >= x2:
+                        return x1, y1
+    return None
+
+
+def _raw_edits(a, b, checkpoint):
+    # Yields (a_lo, a_hi, b_lo, b_hi) for every non-matching region, in order.
+    # An explicit stack replaces recursion; the left half is always processed
+    # before the right half so the edits come out sorted.
+    pending = [(0, len(a), 0, len(b))]
+    while pending:
+        a_lo, a_hi, b_lo, b_hi = pending.pop()
+
+        # Common prefix and suffix never take part in an edit
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+
+        if a_lo == a_hi and b_lo == b_hi:
+            continue
+        if a_lo == a_hi or b_lo == b_hi:
+            yield a_lo, a_hi, b_lo, b_hi
+            continue
+
+        split = _bisect(a, a_lo, a_hi, b, b_lo, b_hi, checkpoint)
+        if split is None:
+            yield a_lo, a_hi, b_lo, b_hi
+            continue
+        x, y = split
+        pending.append((a_lo + x, a_hi, b_lo + y, b_hi))
+        pending.append((a_lo, a_lo + x, b_lo, b_lo + y))
+
+
+def diff_ranges(a, b, checkpoint=None):
+    # Yields the shortest edit script turning a into b as compact ranges:
+    # (tag, a_lo, a_hi, b_lo, b_hi) with half-open ranges. Adjacent edits are
+    # merged, so a run of changed tokens is reported once.
+    # checkpoint(), if given, is called regularly during long searches and may
+    # raise to abort the diff.
+    current = None
+    for a_lo, a_hi, b_lo, b_hi in _raw_edits(a, b, checkpoint):
+        if current is not None and current[1] == a_lo and current[3] == b_lo:
+            current[1] = a_hi
+            current[3] = b_hi
+            continue
+        if current is not None:
+            yield tagged_range(current)
+        current = [a_lo, a_hi, b_lo, b_hi]
+    if current is not None:
+        yield tagged_range(current)
+
+
+def tagged_range(edit_range):
+    a_lo, a_hi, b_lo, b_hi = edit_range
+    if a_lo == a_hi:
+        tag = EDIT_INSERT
+    elif b_lo == b_hi:
+        tag = EDIT_DELETE
+    else:
+        tag = EDIT_REPLACE
+    return tag, a_lo, a_hi, b_lo, b_hi